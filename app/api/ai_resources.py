@@ -11,6 +11,8 @@ from app.schemas.ai_resource_schema import (
     TestConnectionResponse
 )
 from app.services.ai_resource_service import AiResourceService
+from app.services.llm_client_pool import llm_client_pool, normalize_base_url
+from app.services.ai_resource_registry import ai_resource_registry
 
 router = APIRouter()
 
@@ -67,6 +69,7 @@ async def create_resource(
 ):
     service = AiResourceService(session)
     new_resource = await service.create_resource(resource)
+    ai_resource_registry.invalidate()
     return new_resource
 
 @router.put("/{resource_id}", response_model=AiResourceResponse)
@@ -76,9 +79,17 @@ async def update_resource(
     session: AsyncSession = Depends(get_session)
 ):
     service = AiResourceService(session)
+    existing = await service.get_resource(resource_id)
+    previous_transport = (normalize_base_url(existing.endpoint), existing.api_key) if existing else None
+    
     updated_resource = await service.update_resource(resource_id, resource)
     if not updated_resource:
         raise HTTPException(status_code=404, detail="Resource not found")
+    ai_resource_registry.invalidate()
+    
+    # Drop pooled LLM connections bound to the old endpoint/credentials
+    if previous_transport != (normalize_base_url(updated_resource.endpoint), updated_resource.api_key):
+        await llm_client_pool.invalidate(*previous_transport)
     return updated_resource
 
 @router.delete("/{resource_id}")
@@ -87,9 +98,17 @@ async def delete_resource(
     session: AsyncSession = Depends(get_session)
 ):
     service = AiResourceService(session)
+    existing = await service.get_resource(resource_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    previous_transport = (normalize_base_url(existing.endpoint), existing.api_key)
+    
     success = await service.delete_resource(resource_id)
     if not success:
         raise HTTPException(status_code=404, detail="Resource not found")
+    ai_resource_registry.invalidate()
+    
+    await llm_client_pool.invalidate(*previous_transport)
     return {"message": "Resource deleted successfully"}
 
 @router.post("/{resource_id}/test-connection", response_model=TestConnectionResponse)
@@ -130,6 +149,7 @@ async def set_default_resource(
     resource = await service.set_default(resource_id)
     if not resource:
         raise HTTPException(status_code=404, detail="Resource not found")
+    ai_resource_registry.invalidate()
         
     return {"message": "Default resource set successfully"}
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from urllib.parse import quote
@@ -7,14 +7,21 @@ from sqlmodel import select, desc
 import uuid
 import os
 
+from app.core.config import settings
 from app.core.database import get_session
 from app.models.knowledge import KnowledgeBase, Document
 from app.schemas.knowledge import (
     KnowledgeBaseCreate, KnowledgeBaseResponse, KnowledgeBaseListResponse, KnowledgeBaseUpdate,
-    DocumentResponse, SearchRequest, SearchResponse, SearchResult
+    DocumentResponse, SearchRequest, MultiSearchRequest, SearchResponse, SearchResult,
+    BulkUploadResponse, ProcessPendingResponse
 )
-from app.services.document_service import document_service
+from app.services.document_service import document_service, ALLOWED_FILE_TYPES, file_type_of
+from app.services.document_job_queue import document_job_queue
 from app.services.vector_service import vector_service
+from app.services.keyword_index import keyword_index_service
+from app.services.knowledge_search import (
+    search_knowledge, search_knowledge_bases, collection_name_for, build_filter_expr
+)
 from app.services.minio_service import minio_service
 
 router = APIRouter()
@@ -96,6 +103,7 @@ async def get_knowledge_base(
         status=d.status,
         error_message=d.error_message,
         chunk_count=d.chunk_count,
+        progress=d.progress,
         created_at=d.created_at,
         updated_at=d.updated_at
     ) for d in documents]
@@ -146,6 +154,7 @@ async def publish_knowledge_base(
         status=d.status,
         error_message=d.error_message,
         chunk_count=d.chunk_count,
+        progress=d.progress,
         created_at=d.created_at,
         updated_at=d.updated_at
     ) for d in documents]
@@ -186,6 +195,7 @@ async def unpublish_knowledge_base(
         status=d.status,
         error_message=d.error_message,
         chunk_count=d.chunk_count,
+        progress=d.progress,
         created_at=d.created_at,
         updated_at=d.updated_at
     ) for d in documents]
@@ -214,6 +224,7 @@ async def delete_knowledge_base(
     sanitized_kb_id = str(kb_id).replace("-", "_")
     collection_name = f"kb_{sanitized_kb_id}"
     await vector_service.delete_collection(collection_name)
+    keyword_index_service.drop(collection_name)
     
     # Documents will be cascade deleted if configured in DB, but SQLModel/SQLAlchemy default might not be cascade
     # Let's delete documents first manually to be safe or rely on DB.
@@ -234,8 +245,8 @@ async def upload_document(
         raise HTTPException(status_code=404, detail="Knowledge Base not found")
     
     # Validate file type
-    ext = os.path.splitext(file.filename)[1].lower().replace(".", "")
-    if ext not in ["pdf", "txt", "md", "docx"]:
+    ext = file_type_of(file.filename)
+    if ext not in ALLOWED_FILE_TYPES:
         raise HTTPException(status_code=400, detail="Unsupported file type. Allowed: pdf, txt, md, docx")
     
     # Save file
@@ -255,32 +266,79 @@ async def upload_document(
     
     return doc
 
-async def process_document_task(doc_id: uuid.UUID, session_factory):
-    async with session_factory() as session:
-        doc = await session.get(Document, doc_id)
-        if not doc:
-            return
-        
-        doc.status = "processing"
-        session.add(doc)
-        await session.commit()
-        
-        try:
-            chunk_count = await document_service.process_document(doc, session)
-            doc.status = "completed"
-            doc.chunk_count = chunk_count
-        except Exception as e:
-            doc.status = "error"
-            doc.error_message = str(e)
-        
-        session.add(doc)
-        await session.commit()
+@router.post("/{kb_id}/upload/bulk", response_model=BulkUploadResponse)
+async def upload_documents(
+    kb_id: uuid.UUID,
+    files: List[UploadFile] = File(...),
+    process: bool = Form(False),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Upload many files (and/or zip archives) in one request. Files are streamed to
+    MinIO concurrently and their Document rows are inserted in one transaction;
+    with process=true they are also queued for processing right away.
+    Unsupported or failed files are reported in `skipped`.
+    """
+    kb = await session.get(KnowledgeBase, kb_id)
+    if not kb:
+        raise HTTPException(status_code=404, detail="Knowledge Base not found")
+    
+    try:
+        saved, skipped = await document_service.save_files(files, kb_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    docs = [
+        Document(
+            knowledge_base_id=kb_id,
+            filename=entry["filename"],
+            file_path=entry["file_path"],
+            file_type=entry["file_type"],
+            status="pending"
+        )
+        for entry in saved
+    ]
+    session.add_all(docs)
+    await session.commit()
+    
+    queued = 0
+    if process and docs:
+        jobs = await document_job_queue.enqueue_many(session, docs)
+        queued = len(jobs)
+    
+    return BulkUploadResponse(
+        documents=[DocumentResponse(**d.model_dump()) for d in docs],
+        skipped=skipped,
+        queued=queued
+    )
+
+@router.post("/{kb_id}/process-pending", response_model=ProcessPendingResponse)
+async def process_pending_documents(
+    kb_id: uuid.UUID,
+    include_failed: bool = False,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Queue every pending document of the knowledge base (and failed ones with
+    include_failed=true) for processing in one call.
+    """
+    kb = await session.get(KnowledgeBase, kb_id)
+    if not kb:
+        raise HTTPException(status_code=404, detail="Knowledge Base not found")
+    
+    statuses = ["pending", "error"] if include_failed else ["pending"]
+    result = await session.execute(
+        select(Document).where(Document.knowledge_base_id == kb_id, Document.status.in_(statuses))
+    )
+    docs = result.scalars().all()
+    jobs = await document_job_queue.enqueue_many(session, docs) if docs else []
+    
+    return ProcessPendingResponse(message="Processing queued", queued=len(jobs))
 
 @router.post("/{kb_id}/documents/{doc_id}/process")
 async def process_document_endpoint(
     kb_id: uuid.UUID,
     doc_id: uuid.UUID,
-    background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(get_session)
 ):
     doc = await session.get(Document, doc_id)
@@ -290,11 +348,11 @@ async def process_document_endpoint(
     if doc.knowledge_base_id != kb_id:
         raise HTTPException(status_code=400, detail="Document does not belong to this Knowledge Base")
     
-    # We need a new session for background task
-    from app.core.database import async_session_maker
-    background_tasks.add_task(process_document_task, doc_id, async_session_maker)
+    # Persisted job: picked up by the job queue workers, retried on failure
+    # and recovered after a restart
+    job = await document_job_queue.enqueue(session, doc)
     
-    return {"message": "Processing started"}
+    return {"message": "Processing queued", "job_id": job.id, "job_status": job.status}
 
 @router.get("/{kb_id}/documents/{doc_id}/preview")
 async def preview_document(
@@ -474,6 +532,45 @@ async def get_document_chunks(
     # Let's look at VectorService implementation again.
     
     return chunk_results
+@router.post("/search", response_model=SearchResponse)
+async def search_knowledge_bases_endpoint(
+    request: MultiSearchRequest,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Search several knowledge bases at once; results are one merged top-k.
+    """
+    kb_ids = list(dict.fromkeys(request.knowledge_base_ids))
+    if not kb_ids:
+        raise HTTPException(status_code=400, detail="knowledge_base_ids is empty")
+    found = (await session.execute(select(KnowledgeBase.id).where(KnowledgeBase.id.in_(kb_ids)))).scalars().all()
+    missing = set(kb_ids) - set(found)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Knowledge Base not found: {', '.join(sorted(map(str, missing)))}")
+
+    kb_by_collection = {collection_name_for(kb_id): str(kb_id) for kb_id in kb_ids}
+    try:
+        results = await search_knowledge_bases(
+            list(kb_by_collection),
+            request.query,
+            top_k=request.top_k,
+            mode=request.mode or settings.KNOWLEDGE_SEARCH_MODE,
+            score_threshold=request.score_threshold,
+            expr=build_filter_expr(request.filters, request.expr)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SearchResponse(results=[
+        SearchResult(
+            id=doc.metadata.get("document_id", ""),
+            content=doc.page_content,
+            metadata=doc.metadata,
+            score=score,
+            knowledge_base_id=kb_by_collection.get(doc.metadata.get("collection"))
+        )
+        for doc, score in results
+    ])
+
 @router.post("/{kb_id}/search", response_model=SearchResponse)
 async def search_knowledge_base(
     kb_id: uuid.UUID,
@@ -487,12 +584,17 @@ async def search_knowledge_base(
     # Sanitize KB ID for Milvus (replace hyphens with underscores)
     sanitized_kb_id = str(kb_id).replace("-", "_")
     collection_name = f"kb_{sanitized_kb_id}"
-    results = await vector_service.search(
-        collection_name, 
-        request.query, 
-        top_k=request.top_k, 
-        score_threshold=request.score_threshold
-    )
+    try:
+        results = await search_knowledge(
+            collection_name,
+            request.query,
+            top_k=request.top_k,
+            mode=request.mode or settings.KNOWLEDGE_SEARCH_MODE,
+            score_threshold=request.score_threshold,
+            expr=build_filter_expr(request.filters, request.expr)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     search_results = []
     for doc, score in results:
@@ -500,7 +602,8 @@ async def search_knowledge_base(
             id=doc.metadata.get("document_id", ""), # This is doc ID
             content=doc.page_content,
             metadata=doc.metadata,
-            score=score
+            score=score,
+            knowledge_base_id=str(kb_id)
         ))
         
     return SearchResponse(results=search_results)
@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from app.services.workflow_cache import workflow_cache
+from app.services.run_service import run_queue
+from app.services.llm_client_pool import llm_client_pool
+from app.services.ai_resource_registry import ai_resource_registry
+from app.services.llm_response_cache import llm_response_cache
+from app.services.vector_service import vector_service
+from app.services.ingestion_pipeline import ingestion_pipeline
+from app.services.keyword_index import keyword_index_service
+from app.services.search_cache import search_cache
+from app.services.document_job_queue import document_job_queue
+from app.services.ocr_worker_pool import ocr_worker_pool
+
+router = APIRouter()
+
+@router.get("/", response_model=dict)
+async def get_runtime_metrics():
+    """
+    In-process runtime counters (caches, pools) for this API worker.
+    """
+    return {
+        "workflow_cache": workflow_cache.stats(),
+        "run_queue": run_queue.stats(),
+        "llm_client_pool": llm_client_pool.stats(),
+        "ai_resource_registry": ai_resource_registry.stats(),
+        "llm_response_cache": llm_response_cache.stats(),
+        "vector_service": vector_service.stats(),
+        "ingestion": ingestion_pipeline.stats(),
+        "keyword_indexes": keyword_index_service.stats(),
+        "search_cache": search_cache.stats(),
+        "document_jobs": document_job_queue.stats(),
+        "ocr_workers": ocr_worker_pool.stats()
+    }
+
+@router.get("/ocr-workers", response_model=dict)
+async def check_ocr_workers():
+    """
+    Health check of the PaddleOCR worker pool (pings idle workers, drops dead ones).
+    """
+    return await ocr_worker_pool.health()
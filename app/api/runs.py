@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_session
 from app.services.agent_service import AgentService
-from app.services.workflow_engine import WorkflowBuilder
-from app.schemas.agent_schema import AgentGraph
-from langchain_core.messages import HumanMessage
+from app.services.workflow_cache import workflow_cache
+from app.services.state import expand_trace_logs
+from app.services.run_service import RunService, build_initial_state, build_run_config, run_queue
+from datetime import datetime
+import asyncio
 import uuid
+import json
 from typing import Dict, Any
 
 from pydantic import BaseModel
@@ -14,70 +18,169 @@ class AgentRunRequest(BaseModel):
     inputs: Dict[str, Any]
 
 router = APIRouter()
+# Mounted at /runs for polling runs by id
+run_router = APIRouter()
 
-@router.post("/{agent_id}/run")
-async def run_agent(
-    agent_id: uuid.UUID, 
-    request: AgentRunRequest,
-    session: AsyncSession = Depends(get_session)
-):
-    inputs = request.inputs
+async def _prepare_run(agent_id: uuid.UUID, inputs: Dict[str, Any], session: AsyncSession):
+    """
+    Resolve the compiled runnable for the agent's latest version and build the initial state.
+    """
     service = AgentService(session)
-    
+
     # 1. Get Agent Version
     version = await service.get_latest_version(agent_id)
     if not version:
         raise HTTPException(status_code=404, detail="Agent version not found")
-    
-    # 2. Reconstruct Graph Definition
-    # Note: stored as dict, need to parse back to Pydantic
+
+    # 2. Get compiled Runnable
+    # Compiled graphs are cached per (agent_id, version), so only the first run
+    # of a version pays for parsing, parameter mapping and compilation.
     try:
-        graph_def = AgentGraph(**version.flow_json)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Invalid graph definition: {str(e)}")
-    
-    # 3. Build Runnable
-    builder = WorkflowBuilder(graph_def)
-    app = builder.build()
-    
-    # 4. Execute
-    # Convert input string to message if needed
-    user_input = inputs.get("input", "")
-    
-    # Generate IDs if not present
-    if "request_id" not in inputs:
-        inputs["request_id"] = str(uuid.uuid4())
-    if "conversion_id" not in inputs:
-        inputs["conversion_id"] = str(uuid.uuid4())
-        
-    # Initialize node_outputs with start node inputs if possible, 
-    # but strictly start_node function logic handles input mapping.
-    # We pass inputs via 'context' so start_node can pick them up.
-    
-    initial_state = {
-        "messages": [HumanMessage(content=user_input)],
-        "context": inputs,
-        "node_outputs": {},
-        "trace_logs": []
-    }
-    
+        app = workflow_cache.get_or_build(agent_id, version.version, version.flow_json)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    initial_state = build_initial_state(inputs)
+    return app, initial_state
+
+@router.post("/{agent_id}/run")
+async def run_agent(
+    agent_id: uuid.UUID,
+    request: AgentRunRequest,
+    session: AsyncSession = Depends(get_session)
+):
+    app, initial_state = await _prepare_run(agent_id, request.inputs, session)
+
+    # 3. Execute
     try:
-        result = await app.ainvoke(initial_state)
+        result = await app.ainvoke(initial_state, config=build_run_config())
         # Extract last message or some result
         # The result state contains messages log.
         # We can also check node_outputs of the 'end' node or just return the chat response.
-        
+
         last_message = ""
         if result["messages"]:
             last_message = result["messages"][-1].content
-            
+
         return {
-            "status": "success", 
-            "output": last_message, 
+            "status": "success",
+            "output": last_message,
             "full_state": str(result),
-            "trace_logs": result.get("trace_logs", [])
+            "trace_logs": expand_trace_logs(result.get("trace_logs", []), result.get("node_outputs", {}))
         }
     except Exception as e:
          import traceback
          traceback.print_exc()
          raise HTTPException(status_code=500, detail=f"Execution failed: {str(e)}")
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.post("/{agent_id}/run/stream")
+async def run_agent_stream(
+    agent_id: uuid.UUID,
+    request: AgentRunRequest,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Run the workflow and stream progress as Server-Sent Events:
+    - node_started:  {"node_id", "timestamp"}
+    - token:         {"node_id", "content"} for each LLM token
+    - node_finished: the node's trace_logs entry (same shape as /run)
+    - run_finished:  {"status", "output", "trace_logs"}
+    - error:         {"message"}
+    """
+    app, initial_state = await _prepare_run(agent_id, request.inputs, session)
+
+    async def event_stream():
+        trace_logs = []
+        last_message = ""
+        try:
+            async for event in app.astream_events(initial_state, config=build_run_config(), version="v2"):
+                kind = event["event"]
+                node_id = event.get("metadata", {}).get("langgraph_node")
+                # Node-level chain events carry the node id as their name; routers and
+                # other inner runnables share the metadata but not the name.
+                is_node_event = node_id is not None and event.get("name") == node_id
+
+                if kind == "on_chain_start" and is_node_event:
+                    yield _sse("node_started", {"node_id": node_id, "timestamp": str(datetime.now())})
+                elif kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        yield _sse("token", {"node_id": node_id, "content": content})
+                elif kind == "on_chain_end" and is_node_event:
+                    output = event["data"].get("output") or {}
+                    if not isinstance(output, dict):
+                        continue
+                    for log in expand_trace_logs(output.get("trace_logs", []), output.get("node_outputs", {})):
+                        trace_logs.append(log)
+                        yield _sse("node_finished", log)
+                    if output.get("messages"):
+                        last_message = output["messages"][-1].content
+
+            yield _sse("run_finished", {
+                "status": "success",
+                "output": last_message,
+                "trace_logs": trace_logs
+            })
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield _sse("error", {"message": f"Execution failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/{agent_id}/runs", status_code=202)
+async def submit_run(
+    agent_id: uuid.UUID,
+    request: AgentRunRequest,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Queue a run of the agent's latest version and return its id immediately.
+    Poll GET /runs/{run_id} for status, outputs and trace logs.
+    """
+    if run_queue.is_full():
+        raise HTTPException(status_code=503, detail="Run queue is full, retry later")
+
+    version = await AgentService(session).get_latest_version(agent_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Agent version not found")
+
+    service = RunService(session)
+    run = await service.create_run(version, request.inputs)
+    try:
+        run_queue.submit(run.id)
+    except (asyncio.QueueFull, RuntimeError) as e:
+        await service.finish_run(run, "error", outputs={"error": "Run queue unavailable"})
+        raise HTTPException(status_code=503, detail=f"Run queue unavailable: {str(e) or 'queue full'}")
+
+    return {"run_id": run.id, "status": run.status}
+
+@run_router.get("/{run_id}")
+async def get_run(
+    run_id: uuid.UUID,
+    session: AsyncSession = Depends(get_session)
+):
+    run = await RunService(session).get_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    outputs = run.outputs or {}
+    logs = run.logs or {}
+    return {
+        "run_id": run.id,
+        "agent_version_id": run.agent_version_id,
+        "status": run.status,
+        "inputs": run.inputs,
+        "output": outputs.get("output"),
+        "outputs": outputs,
+        "trace_logs": expand_trace_logs(logs.get("trace_logs", []), outputs.get("node_outputs", {})),
+        "started_at": run.started_at,
+        "completed_at": run.completed_at
+    }
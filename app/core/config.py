@@ -15,6 +15,78 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
     OPENAI_API_BASE: str = ""
     
+    # LLM client pool (per AI resource; a resource's config.max_connections overrides)
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_REQUEST_TIMEOUT: float = 120.0
+    LLM_HTTP2: bool = True  # Used only when the optional 'h2' package is installed
+    AI_RESOURCE_CACHE_TTL_SECONDS: float = 60.0  # In-memory resource registry used by nodes
+    
+    # LLM response cache: off | exact | semantic (nodes can override via config.response_cache)
+    LLM_RESPONSE_CACHE: str = "off"
+    LLM_RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    LLM_RESPONSE_CACHE_SQLITE_PATH: str = ""  # e.g. ./cache/llm_responses.db; empty = memory only
+    LLM_RESPONSE_CACHE_TTL_SECONDS: float = 0  # 0 = never expire
+    LLM_RESPONSE_CACHE_MAX_TEMPERATURE: float = 0.0  # Only (near-)deterministic calls are cached
+    LLM_SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    LLM_SEMANTIC_CACHE_MAX_ENTRIES: int = 1000
+    
+    # Vector Store Settings
+    VECTOR_BACKEND: str = "milvus"  # "milvus" (server) or "embedded" (in-process, no Milvus needed)
+    EMBEDDED_VECTOR_PATH: str = "./vector_data"
+    EMBEDDED_VECTOR_ANN_THRESHOLD: int = 20000  # Collections this large are searched through an IVF index
+    EMBEDDED_VECTOR_NPROBE: int = 16  # IVF lists scanned per search; higher = better recall, slower
+    VECTOR_EXECUTOR_WORKERS: int = 8  # Threads for blocking Milvus/embedding calls
+    EMBEDDING_CACHE_ENABLED: bool = True  # Content-hash cache shared by ingestion and search
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10000
+    EMBEDDING_CACHE_SQLITE_PATH: str = ""  # e.g. ./cache/embeddings.db; empty = memory only
+    EMBEDDING_BATCH_SIZE: int = 64  # Chunks per embed + insert batch during ingestion
+    EMBEDDING_CONCURRENCY: int = 4  # Batches in flight; keep below VECTOR_EXECUTOR_WORKERS
+    SPLITTER_WINDOW_CHARS: int = 65536  # Text buffered by the streaming splitter during ingestion
+    
+    # Keyword (BM25) index and hybrid search
+    KEYWORD_INDEX_PATH: str = "./keyword_index"
+    KNOWLEDGE_SEARCH_MODE: str = "vector"  # Default for search requests/nodes: vector | keyword | hybrid
+    HYBRID_RRF_K: int = 60  # Reciprocal rank fusion constant; larger = flatter weighting of ranks
+    HYBRID_CANDIDATE_MULTIPLIER: int = 4  # Each retriever returns top_k * this candidates for fusion
+    SEARCH_CACHE_ENABLED: bool = True  # Knowledge search results, invalidated on every write
+    SEARCH_CACHE_MAX_ENTRIES: int = 2000
+    SEARCH_CACHE_TTL_SECONDS: float = 300  # Bounds staleness from writes in other processes; 0 = never expire
+    
+    # PaddleOCR worker pool (scripts/paddleocr_worker.py)
+    PADDLEOCR_CONDA_ENV: str = "paddleocr_vlm"
+    PADDLEOCR_PYTHON: str = ""  # Interpreter of the paddleocr env; resolved via conda if empty
+    OCR_WORKER_POOL_SIZE: int = 1  # Each worker keeps its own pipeline (and memory) loaded
+    OCR_JOB_TIMEOUT_SECONDS: float = 600
+    OCR_WORKER_STARTUP_TIMEOUT_SECONDS: float = 300
+    OCR_WORKER_MAX_JOBS: int = 200  # Recycle a worker after this many documents
+    OCR_ACQUIRE_TIMEOUT_SECONDS: float = 1800  # Max wait for a free worker before a job fails
+    OCR_PAGES_PER_TASK: int = 10  # PDF pages per OCR job; ranges run in parallel across the pool
+    PDF_PAGES_PER_TASK: int = 20  # Pages per text-extraction task
+    PDF_PARSE_PROCESSES: int = 0  # Process pool for PDF parsing; 0 = CPU count
+    
+    # Bulk document upload
+    UPLOAD_CONCURRENCY: int = 8  # Files streamed to MinIO at once
+    BULK_UPLOAD_MAX_FILES: int = 10000  # Per request, after expanding zip archives
+    
+    # Document processing job queue (document_jobs table)
+    DOC_JOB_WORKERS: int = 2  # 0 = don't process in the API; run `python -m app.worker` instead
+    DOC_JOB_MAX_ATTEMPTS: int = 3
+    DOC_JOB_RETRY_BACKOFF_SECONDS: float = 30.0  # Doubles after each failed attempt
+    DOC_JOB_MAX_PER_KB: int = 0  # Max concurrent jobs per knowledge base; 0 = no cap
+    DOC_JOB_POLL_SECONDS: float = 5.0
+    DOC_JOB_HEARTBEAT_SECONDS: float = 30.0  # Running jobs silent for 3x this are requeued
+    
+    # Workflow Settings
+    WORKFLOW_CACHE_SIZE: int = 128  # Max compiled agent versions kept in memory
+    RUN_WORKERS: int = 4  # Concurrent async runs (POST /agents/{id}/runs)
+    RUN_QUEUE_MAX_SIZE: int = 1000  # Queued runs beyond this are rejected with 503
+    RUN_TIMEOUT_SECONDS: float = 600
+    # "full" copies each node's output into trace_logs; "slim" stores a reference
+    # (output_ref) to node_outputs instead, which API responses expand again
+    TRACE_MODE: str = "full"
+    
     class Config:
         env_file = ".env"
 
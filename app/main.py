@@ -1,12 +1,26 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from app.core.database import init_db
-from app.api import agents, runs, ai_resources, knowledge
+from app.api import agents, runs, ai_resources, knowledge, metrics
+from app.services.run_service import run_queue
+from app.services.document_job_queue import document_job_queue
+from app.services.llm_client_pool import llm_client_pool
+from app.services.vector_service import vector_service
+from app.services.ocr_worker_pool import ocr_worker_pool
+from app.services import pdf_parallel
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await run_queue.start()
+    await document_job_queue.start()
     yield
+    await document_job_queue.stop()
+    await run_queue.stop()
+    await llm_client_pool.aclose()
+    vector_service.shutdown()
+    await ocr_worker_pool.aclose()
+    pdf_parallel.shutdown()
 
 app = FastAPI(
     title="AgentFlow Studio",
@@ -17,8 +31,10 @@ app = FastAPI(
 
 app.include_router(agents.router, prefix="/agents", tags=["agents"])
 app.include_router(runs.router, prefix="/agents", tags=["runs"])
+app.include_router(runs.run_router, prefix="/runs", tags=["runs"])
 app.include_router(ai_resources.router, prefix="/ai-resources", tags=["ai-resources"])
 app.include_router(knowledge.router, prefix="/knowledge-bases", tags=["knowledge-bases"])
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 
 @app.get("/health")
 async def health_check():
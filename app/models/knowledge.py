@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from sqlmodel import SQLModel, Field, Relationship
 from sqlalchemy import Column, String
 from sqlalchemy.dialects.sqlite import JSON as SQLiteJSON
@@ -28,7 +28,26 @@ class Document(SQLModel, table=True):
     status: str = Field(default="pending") # pending, processing, completed, error
     error_message: Optional[str] = None
     chunk_count: int = Field(default=0)
+    # e.g. {"stage": "ocr", "pages_done": 120, "pages_total": 340} while processing
+    progress: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(SQLiteJSON))
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
     knowledge_base: Optional[KnowledgeBase] = Relationship(back_populates="documents")
+
+class DocumentJob(SQLModel, table=True):
+    __tablename__ = "document_jobs"
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    document_id: uuid.UUID = Field(foreign_key="documents.id", index=True)
+    knowledge_base_id: uuid.UUID = Field(index=True)
+    status: str = Field(default="pending", index=True) # pending, running, completed, error
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    last_error: Optional[str] = None
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    heartbeat_at: Optional[datetime] = None # Refreshed while running; stale = worker died
+    claim_token: Optional[str] = None # Set per claim; a worker whose job was reclaimed no longer matches
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
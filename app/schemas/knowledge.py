@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel
 
 class KnowledgeBaseBase(BaseModel):
@@ -22,9 +22,23 @@ class DocumentResponse(BaseModel):
     status: str
     error_message: Optional[str]
     chunk_count: int
+    progress: Optional[Dict[str, Any]] = None
     created_at: datetime
     updated_at: datetime
 
+class SkippedFile(BaseModel):
+    filename: str
+    reason: str
+
+class BulkUploadResponse(BaseModel):
+    documents: List[DocumentResponse]
+    skipped: List[SkippedFile] = []
+    queued: int = 0
+
+class ProcessPendingResponse(BaseModel):
+    message: str
+    queued: int
+
 class KnowledgeBaseResponse(KnowledgeBaseBase):
     id: uuid.UUID
     is_published: bool
@@ -44,13 +58,24 @@ class KnowledgeBaseListResponse(BaseModel):
 class SearchRequest(BaseModel):
     query: str
     top_k: int = 5
-    score_threshold: float = 0.0
+    # Cosine similarity (BM25 score in keyword mode); None = no threshold
+    score_threshold: Optional[float] = None
+    # Metadata equality filters, e.g. {"source": "a.pdf", "document_id": ["id1", "id2"]}
+    filters: Optional[Dict[str, Any]] = None
+    # Raw Milvus filter expression, ANDed with filters
+    expr: Optional[str] = None
+    # vector (dense), keyword (BM25) or hybrid (both, rank-fused); None = settings.KNOWLEDGE_SEARCH_MODE
+    mode: Optional[Literal["vector", "keyword", "hybrid"]] = None
+
+class MultiSearchRequest(SearchRequest):
+    knowledge_base_ids: List[uuid.UUID]
 
 class SearchResult(BaseModel):
     id: str
     content: str
     metadata: Dict[str, Any]
     score: float
+    knowledge_base_id: Optional[str] = None
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
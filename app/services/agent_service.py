@@ -1,7 +1,9 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models.agent import Agent, AgentVersion
+from app.models.workflow import WorkflowRun
 from app.schemas.agent_schema import AgentCreate, AgentUpdate
+from app.services.workflow_cache import workflow_cache
 from typing import Optional
 import uuid
 
@@ -64,10 +66,17 @@ class AgentService:
         result = await self.session.execute(stmt)
         versions = result.scalars().all()
         for version in versions:
+            # Persisted runs reference the version, so they go with it
+            runs_result = await self.session.execute(select(WorkflowRun).where(WorkflowRun.agent_version_id == version.id))
+            for run in runs_result.scalars().all():
+                await self.session.delete(run)
             await self.session.delete(version)
             
         await self.session.delete(agent)
         await self.session.commit()
+        
+        # Drop compiled graphs so a recreated id never runs a stale flow
+        workflow_cache.invalidate(agent_id)
         return True
 
     async def export_agent_yaml(self, agent_id: uuid.UUID) -> Optional[str]:
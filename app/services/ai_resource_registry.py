@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.ai_resource import AiResource
+from app.services.ai_resource_service import AiResourceService
+
+
+class AiResourceRegistry:
+    """
+    In-memory snapshot of AI resources for hot paths such as node execution.
+
+    The whole table is loaded through AiResourceService in one query and indexed by
+    (type, name) and default-per-type, so lookups do no I/O until the TTL expires
+    or the API invalidates the snapshot after a write.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0):
+        self.ttl_seconds = ttl_seconds
+        self._by_name: Dict[Tuple[Optional[str], str], AiResource] = {}
+        self._defaults: Dict[str, AiResource] = {}
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self.hits = 0
+        self.refreshes = 0
+
+    def invalidate(self):
+        """
+        Force the next lookup to reload (call after create/update/delete/set-default).
+        """
+        self._generation += 1
+        self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and (time.monotonic() - self._loaded_at) < self.ttl_seconds
+
+    async def _ensure_loaded(self):
+        if self._is_fresh():
+            self.hits += 1
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another coroutine may have refreshed while we waited
+            if self._is_fresh():
+                self.hits += 1
+                return
+            generation = self._generation
+            started_at = time.monotonic()
+            async with async_session_factory() as session:
+                resources = await AiResourceService(session).list_resources()
+            self._index(resources)
+            self.refreshes += 1
+            # An invalidate() during the query leaves the snapshot stale on purpose
+            if generation == self._generation:
+                self._loaded_at = started_at
+
+    def _index(self, resources: List[AiResource]):
+        by_name = {}
+        defaults = {}
+        # list_resources returns newest first; keep the first match like the old queries did
+        for resource in resources:
+            by_name.setdefault((resource.type, resource.name), resource)
+            by_name.setdefault((None, resource.name), resource)
+            if resource.is_default:
+                defaults.setdefault(resource.type, resource)
+        self._by_name = by_name
+        self._defaults = defaults
+
+    async def get_by_name(self, name: str, type_filter: Optional[str] = None) -> Optional[AiResource]:
+        await self._ensure_loaded()
+        return self._by_name.get((type_filter, name))
+
+    async def get_default(self, resource_type: str) -> Optional[AiResource]:
+        await self._ensure_loaded()
+        return self._defaults.get(resource_type)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "resources": len([k for k in self._by_name if k[0] is not None]),
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "ttl_seconds": self.ttl_seconds,
+            "fresh": self._is_fresh(),
+        }
+
+
+# Singleton instance
+ai_resource_registry = AiResourceRegistry(ttl_seconds=settings.AI_RESOURCE_CACHE_TTL_SECONDS)
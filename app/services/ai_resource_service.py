@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, desc
 from app.models.ai_resource import AiResource
 from app.schemas.ai_resource_schema import AiResourceCreate, AiResourceUpdate
+from app.services.ocr_worker_pool import ocr_worker_pool
 
 class AiResourceService:
     def __init__(self, session: AsyncSession):
@@ -176,8 +177,6 @@ class AiResourceService:
             }
 
     async def _test_paddleocr(self, resource: AiResource, payload: Dict[str, Any]) -> dict:
-        import asyncio
-        import json
         import os
         
         file_path = payload.get("file_path")
@@ -193,46 +192,18 @@ class AiResourceService:
                     "resource_info": {"name": resource.name}
                  }
         
-        cmd = [
-            "conda", "run", "-n", "paddleocr_vlm", "--no-capture-output",
-            "python", "scripts/test_paddleocr_connection.py",
-            "--server_url", resource.endpoint,
-            "--file_path", file_path
-        ]
-        
+        # Same pooled worker as document processing: the pipeline stays loaded
         try:
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                 return {
-                    "status": "error", 
-                    "message": f"Script failed: {stderr.decode()}",
-                    "resource_info": {"name": resource.name}
-                 }
-            
-            try:
-                result = json.loads(stdout.decode())
-                return {
-                    "status": "success" if result.get("status") == "success" else "error",
-                    "response": result,
-                    "resource_info": {
-                        "name": resource.name,
-                        "endpoint": resource.endpoint,
-                        "type": resource.type
-                    }
+            markdown = await ocr_worker_pool.run(resource.endpoint, file_path)
+            return {
+                "status": "success",
+                "response": {"status": "success", "markdown": markdown},
+                "resource_info": {
+                    "name": resource.name,
+                    "endpoint": resource.endpoint,
+                    "type": resource.type
                 }
-            except json.JSONDecodeError:
-                 return {
-                    "status": "error",
-                    "message": f"Invalid JSON output: {stdout.decode()}",
-                    "resource_info": {"name": resource.name}
-                 }
-
+            }
         except Exception as e:
             return {
                 "status": "error", 
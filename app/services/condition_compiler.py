@@ -0,0 +1,152 @@
+import ast
+import operator
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+# Conditions are Python-like boolean expressions over node outputs, e.g.
+#   {{llm_1.text}} == "yes"
+#   "refund" in {{start.rawQuery}} and len({{kb_1.chunks}}) > 0
+#   not {{intent.result}}
+# They are parsed once at build time into plain closures; nothing is eval'd.
+
+# Edge conditions that mean "take this edge when no other condition matched"
+DEFAULT_CONDITIONS = {"default", "else", "otherwise"}
+
+_REF_PATTERN = re.compile(r'\{\{(.*?)\}\}')
+
+_COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+_FUNCTIONS = {
+    "len": len,
+    "str": str,
+    "int": int,
+    "float": float,
+    "lower": lambda v: str(v).lower(),
+    "upper": lambda v: str(v).upper(),
+}
+
+Evaluator = Callable[[Dict[str, Any]], Any]
+
+
+class ConditionError(ValueError):
+    """Raised when an edge condition cannot be compiled."""
+
+
+def is_default_condition(expr: str) -> bool:
+    return expr.strip().lower() in DEFAULT_CONDITIONS
+
+
+@lru_cache(maxsize=1024)
+def compile_condition(expr: str) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Compile a condition expression into a predicate over node_outputs.
+    Runtime errors (missing keys, type mismatches) evaluate to False.
+    """
+    refs = []
+
+    def to_placeholder(match):
+        parts = match.group(1).strip().split('.')
+        refs.append((parts[0], tuple(parts[1:])))
+        return f"__ref{len(refs) - 1}"
+
+    source = _REF_PATTERN.sub(to_placeholder, expr.strip())
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ConditionError(f"Invalid condition '{expr}': {e.msg}")
+
+    evaluator = _compile_node(tree.body, refs, expr)
+
+    def predicate(node_outputs: Dict[str, Any]) -> bool:
+        try:
+            return bool(evaluator(node_outputs))
+        except Exception:
+            return False
+
+    return predicate
+
+
+def _lookup(node_id: str, keys: tuple) -> Evaluator:
+    def evaluate(node_outputs):
+        current = node_outputs.get(node_id)
+        for key in keys:
+            if isinstance(current, dict):
+                current = current.get(key)
+            elif isinstance(current, list) and key.isdigit() and int(key) < len(current):
+                current = current[int(key)]
+            else:
+                return None
+        return current
+    return evaluate
+
+
+def _compile_node(node: ast.AST, refs: list, expr: str) -> Evaluator:
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda _: value
+
+    if isinstance(node, ast.Name):
+        if node.id.startswith("__ref"):
+            node_id, keys = refs[int(node.id[5:])]
+            return _lookup(node_id, keys)
+        literals = {"true": True, "false": False, "null": None, "none": None}
+        if node.id.lower() in literals:
+            value = literals[node.id.lower()]
+            return lambda _: value
+        raise ConditionError(f"Unknown name '{node.id}' in condition '{expr}'. Use {{{{node_id.key}}}} to reference outputs.")
+
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_compile_node(elt, refs, expr) for elt in node.elts]
+        return lambda outputs: [item(outputs) for item in items]
+
+    if isinstance(node, ast.BoolOp):
+        values = [_compile_node(v, refs, expr) for v in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda outputs: all(v(outputs) for v in values)
+        return lambda outputs: any(v(outputs) for v in values)
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_node(node.operand, refs, expr)
+        if isinstance(node.op, ast.Not):
+            return lambda outputs: not operand(outputs)
+        if isinstance(node.op, ast.USub):
+            return lambda outputs: -operand(outputs)
+
+    if isinstance(node, ast.Compare):
+        left = _compile_node(node.left, refs, expr)
+        ops = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARE_OPS:
+                raise ConditionError(f"Unsupported operator in condition '{expr}'")
+            ops.append((_COMPARE_OPS[type(op)], _compile_node(comparator, refs, expr)))
+
+        def compare(outputs):
+            current = left(outputs)
+            for op_func, right in ops:
+                right_value = right(outputs)
+                if not op_func(current, right_value):
+                    return False
+                current = right_value
+            return True
+        return compare
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        func = _FUNCTIONS.get(node.func.id)
+        if func is None:
+            raise ConditionError(f"Unknown function '{node.func.id}' in condition '{expr}'")
+        args = [_compile_node(a, refs, expr) for a in node.args]
+        return lambda outputs: func(*[a(outputs) for a in args])
+
+    raise ConditionError(f"Unsupported expression in condition '{expr}'")
@@ -0,0 +1,349 @@
+import asyncio
+import itertools
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.knowledge import Document, DocumentJob
+from app.services.document_service import document_service
+
+ACTIVE_STATUSES = ["pending", "running"]
+
+
+class DocumentJobQueue:
+    """
+    Durable queue of document-processing jobs, stored in the document_jobs table.
+
+    - A fixed pool of workers claims due jobs with a conditional UPDATE, so several
+      processes (the API and `python -m app.worker`) can share one table.
+    - Failed jobs are retried with exponential backoff up to max_attempts.
+    - Running jobs refresh heartbeat_at; jobs whose heartbeat goes stale (worker
+      crashed or restarted) are put back to pending, and documents left in
+      'processing' without a job get one.
+    - Every claim gets a claim_token. Heartbeats and the final status write only
+      apply while the token still matches, so a worker whose job was reclaimed
+      stops processing and can't overwrite the new owner's result.
+    - Claims are fair across knowledge bases: the KB with the fewest running jobs
+      (then the least recently served one) goes first, optionally capped per KB.
+    """
+
+    def __init__(self, workers: int = 2, max_attempts: int = 3, retry_backoff_seconds: float = 30.0,
+                 max_per_kb: int = 0, poll_interval: float = 5.0, heartbeat_interval: float = 30.0):
+        self.worker_count = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_per_kb = max_per_kb  # 0 = no per-KB cap
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._running_by_kb: Dict[uuid.UUID, int] = {}
+        self._served_at: Dict[uuid.UUID, int] = {}
+        self._ticks = itertools.count(1)
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.recovered = 0
+        self.lost_claims = 0
+
+    async def enqueue(self, session: AsyncSession, document: Document) -> DocumentJob:
+        """
+        Queue processing of a document. A document already queued or running keeps its job.
+        """
+        return (await self.enqueue_many(session, [document]))[0]
+
+    async def enqueue_many(self, session: AsyncSession, documents: List[Document]) -> List[DocumentJob]:
+        """
+        Queue processing of many documents in one transaction. Returns one job per
+        document, in order; documents already queued or running keep their job.
+        """
+        existing: Dict[uuid.UUID, DocumentJob] = {}
+        ids = [document.id for document in documents]
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(ids), 500):
+            result = await session.execute(
+                select(DocumentJob).where(
+                    DocumentJob.document_id.in_(ids[i:i + 500]),
+                    DocumentJob.status.in_(ACTIVE_STATUSES)
+                )
+            )
+            for job in result.scalars().all():
+                existing[job.document_id] = job
+
+        jobs = []
+        for document in documents:
+            job = existing.get(document.id)
+            if job is None:
+                job = DocumentJob(
+                    document_id=document.id,
+                    knowledge_base_id=document.knowledge_base_id,
+                    max_attempts=self.max_attempts
+                )
+                existing[document.id] = job
+                document.status = "pending"
+                document.error_message = None
+                session.add(job)
+                session.add(document)
+            jobs.append(job)
+
+        await session.commit()
+        self._notify()
+        return jobs
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._tasks or self.worker_count <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        await self.recover()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._tasks.append(asyncio.create_task(self._maintenance()))
+        print(f"Document job queue started with {self.worker_count} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def recover(self):
+        """
+        Requeue jobs whose worker stopped heartbeating, and give documents stuck in
+        'processing' (e.g. from a restart mid-run) a new job.
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=self.heartbeat_interval * 3)
+        async with async_session_factory() as session:
+            result = await session.execute(
+                update(DocumentJob)
+                .where(DocumentJob.status == "running", DocumentJob.heartbeat_at < stale_before)
+                .values(status="pending", next_attempt_at=datetime.utcnow(), claim_token=None)
+            )
+            requeued = result.rowcount or 0
+
+            active_docs = select(DocumentJob.document_id).where(DocumentJob.status.in_(ACTIVE_STATUSES))
+            result = await session.execute(
+                select(Document).where(Document.status == "processing", Document.id.not_in(active_docs))
+            )
+            orphaned = result.scalars().all()
+            for document in orphaned:
+                session.add(DocumentJob(
+                    document_id=document.id,
+                    knowledge_base_id=document.knowledge_base_id,
+                    max_attempts=self.max_attempts
+                ))
+            await session.commit()
+
+        if requeued or orphaned:
+            self.recovered += requeued + len(orphaned)
+            print(f"Document job queue recovered {requeued} stale jobs and {len(orphaned)} orphaned documents")
+            self._notify()
+
+    async def _maintenance(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.recover()
+            except Exception as e:
+                print(f"Document job recovery failed: {e}")
+
+    async def _worker(self):
+        while True:
+            try:
+                claimed = await self._claim()
+            except Exception as e:
+                print(f"Document job claim failed: {e}")
+                claimed = None
+
+            if claimed is None:
+                # Nothing due: sleep until an enqueue or the next poll (retries, other processes)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            job_id, kb_id, token = claimed
+            try:
+                await self._execute(job_id, token)
+            except Exception as e:
+                print(f"Document job worker error for {job_id}: {e}")
+            finally:
+                self._running_by_kb[kb_id] -= 1
+                if not self._running_by_kb[kb_id]:
+                    del self._running_by_kb[kb_id]
+
+    async def _claim(self):
+        async with self._claim_lock:
+            async with async_session_factory() as session:
+                now = datetime.utcnow()
+                result = await session.execute(
+                    select(DocumentJob)
+                    .where(DocumentJob.status == "pending", DocumentJob.next_attempt_at <= now)
+                    .order_by(DocumentJob.created_at)
+                    .limit(200)
+                )
+                due = result.scalars().all()
+
+                def fairness(job: DocumentJob):
+                    kb_id = job.knowledge_base_id
+                    return (self._running_by_kb.get(kb_id, 0), self._served_at.get(kb_id, 0), job.created_at)
+
+                for job in sorted(due, key=fairness):
+                    kb_id = job.knowledge_base_id
+                    if self.max_per_kb and self._running_by_kb.get(kb_id, 0) >= self.max_per_kb:
+                        continue
+                    token = uuid.uuid4().hex
+                    claimed = await session.execute(
+                        update(DocumentJob)
+                        .where(DocumentJob.id == job.id, DocumentJob.status == "pending")
+                        .values(status="running", attempts=DocumentJob.attempts + 1,
+                                started_at=now, heartbeat_at=now, claim_token=token)
+                    )
+                    await session.commit()
+                    if claimed.rowcount == 1:
+                        self._running_by_kb[kb_id] = self._running_by_kb.get(kb_id, 0) + 1
+                        self._served_at[kb_id] = next(self._ticks)
+                        return job.id, kb_id, token
+        return None
+
+    async def _heartbeat(self, job_id: uuid.UUID, token: str, lost: asyncio.Event):
+        """
+        Keep the claim alive. Errors (e.g. SQLite "database is locked" during a bulk
+        enqueue) are retried on the next beat; the task only ends when the claim is
+        gone, which sets `lost`.
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with async_session_factory() as session:
+                    result = await session.execute(
+                        update(DocumentJob)
+                        .where(DocumentJob.id == job_id, DocumentJob.claim_token == token)
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    await session.commit()
+            except Exception as e:
+                print(f"Document job heartbeat failed for {job_id}: {e}")
+                continue
+            if result.rowcount != 1:
+                lost.set()
+                return
+
+    async def _finish(self, session: AsyncSession, job_id: uuid.UUID, token: str, **values) -> bool:
+        """
+        Write a job's outcome if this worker still holds the claim.
+        """
+        result = await session.execute(
+            update(DocumentJob)
+            .where(DocumentJob.id == job_id, DocumentJob.claim_token == token)
+            .values(**values)
+        )
+        if result.rowcount != 1:
+            await session.rollback()
+            self.lost_claims += 1
+            print(f"Document job {job_id} was reclaimed by another worker; dropping this result")
+            return False
+        return True
+
+    async def _execute(self, job_id: uuid.UUID, token: str):
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, token, lost))
+        try:
+            async with async_session_factory() as session:
+                job = await session.get(DocumentJob, job_id)
+                if not job:
+                    return
+                doc = await session.get(Document, job.document_id)
+                if not doc:
+                    if await self._finish(session, job_id, token, status="error", last_error="Document not found",
+                                          completed_at=datetime.utcnow(), claim_token=None):
+                        await session.commit()
+                        self.failed += 1
+                    return
+
+                doc.status = "processing"
+                session.add(doc)
+                await session.commit()
+
+                # Processing stops if the claim is lost (heartbeat found it reclaimed),
+                # so two workers never reindex the same document at once
+                processing = asyncio.create_task(document_service.process_document(doc, session))
+                lost_wait = asyncio.create_task(lost.wait())
+                try:
+                    await asyncio.wait({processing, lost_wait}, return_when=asyncio.FIRST_COMPLETED)
+                except asyncio.CancelledError:
+                    # stop(): don't leave processing running on a session being torn down
+                    lost_wait.cancel()
+                    processing.cancel()
+                    await asyncio.gather(processing, return_exceptions=True)
+                    raise
+                lost_wait.cancel()
+                if not processing.done():
+                    processing.cancel()
+                    await asyncio.gather(processing, return_exceptions=True)
+                    self.lost_claims += 1
+                    print(f"Document job {job_id} lost its claim; stopped processing")
+                    return
+
+                try:
+                    chunk_count = processing.result()
+                    values = dict(status="completed", last_error=None, completed_at=datetime.utcnow(),
+                                  claim_token=None)
+                    doc.status = "completed"
+                    doc.chunk_count = chunk_count
+                    doc.error_message = None
+                    outcome = "completed"
+                except Exception as e:
+                    values = dict(last_error=str(e))
+                    if job.attempts < job.max_attempts:
+                        delay = self.retry_backoff_seconds * (2 ** (job.attempts - 1))
+                        values.update(status="pending", claim_token=None,
+                                      next_attempt_at=datetime.utcnow() + timedelta(seconds=delay))
+                        doc.status = "pending"
+                        doc.error_message = f"Attempt {job.attempts}/{job.max_attempts} failed, retrying in {delay:.0f}s: {e}"
+                        outcome = "retried"
+                    else:
+                        values.update(status="error", completed_at=datetime.utcnow(), claim_token=None)
+                        doc.status = "error"
+                        doc.error_message = str(e)
+                        outcome = "failed"
+
+                if await self._finish(session, job_id, token, **values):
+                    session.add(doc)
+                    await session.commit()
+                    setattr(self, outcome, getattr(self, outcome) + 1)
+        finally:
+            heartbeat.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count if self._tasks else 0,
+            "running": sum(self._running_by_kb.values()),
+            "running_by_kb": {str(k): v for k, v in self._running_by_kb.items()},
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "recovered": self.recovered,
+            "lost_claims": self.lost_claims,
+        }
+
+
+# Singleton instance
+document_job_queue = DocumentJobQueue(
+    workers=settings.DOC_JOB_WORKERS,
+    max_attempts=settings.DOC_JOB_MAX_ATTEMPTS,
+    retry_backoff_seconds=settings.DOC_JOB_RETRY_BACKOFF_SECONDS,
+    max_per_kb=settings.DOC_JOB_MAX_PER_KB,
+    poll_interval=settings.DOC_JOB_POLL_SECONDS,
+    heartbeat_interval=settings.DOC_JOB_HEARTBEAT_SECONDS
+)
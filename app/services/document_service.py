@@ -5,16 +5,53 @@ import tempfile
 import io
 import json
 import asyncio
+import time
+import mimetypes
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, nullcontext
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from fastapi import UploadFile
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import async_session_factory
 from app.models.knowledge import Document
-from app.services.vector_service import vector_service
+from app.services.keyword_index import keyword_index_service
+from app.services.ingestion_pipeline import ingestion_pipeline
+from app.services.ocr_worker_pool import ocr_worker_pool
+from app.services import pdf_parallel
 from app.services.minio_service import minio_service
+from app.services.streaming_splitter import StreamingTextSplitter
 from app.services.ai_resource_service import AiResourceService
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import docx
 
+READ_BLOCK_CHARS = 64 * 1024
+
+ALLOWED_FILE_TYPES = ["pdf", "txt", "md", "docx"]
+
+
+def file_type_of(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower().replace(".", "")
+
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    name = info.filename
+    # Archives made without the UTF-8 flag (e.g. by Windows tools) store names in
+    # the local code page, which zipfile decodes as cp437
+    if not info.flag_bits & 0x800:
+        raw = name.encode("cp437")
+        for encoding in ("utf-8", "gbk"):
+            try:
+                name = raw.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+    return "/".join(parts)
+
 class DocumentService:
     def __init__(self):
         pass
@@ -37,6 +74,79 @@ class DocumentService:
         
         return object_name
 
+    async def save_files(self, files: List[UploadFile],
+                         knowledge_base_id: uuid.UUID) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+        """
+        Store many uploads in MinIO at once; zip archives are expanded (folders are
+        kept in the filename). Uploads run concurrently, UPLOAD_CONCURRENCY at a
+        time, streaming each file or archive member without reading it into memory.
+
+        Returns (saved, skipped): saved entries carry filename, file_path and
+        file_type; skipped ones carry filename and reason.
+        """
+        # filename -> (context manager yielding a stream, size, content type)
+        entries: Dict[str, Tuple[Any, int, str]] = {}
+        skipped: List[Dict[str, str]] = []
+        archives: List[zipfile.ZipFile] = []
+
+        def add(filename: str, opener, size: int, content_type: Optional[str]):
+            if file_type_of(filename) not in ALLOWED_FILE_TYPES:
+                skipped.append({"filename": filename, "reason": "Unsupported file type"})
+            elif filename in entries:
+                skipped.append({"filename": filename, "reason": "Duplicate filename in upload"})
+            else:
+                entries[filename] = (opener, size, content_type or "application/octet-stream")
+
+        try:
+            for file in files:
+                if file_type_of(file.filename) == "zip":
+                    try:
+                        archive = zipfile.ZipFile(file.file)
+                    except zipfile.BadZipFile:
+                        skipped.append({"filename": file.filename, "reason": "Invalid zip archive"})
+                        continue
+                    archives.append(archive)
+                    for info in archive.infolist():
+                        name = _zip_member_name(info)
+                        if info.is_dir() or not name or name.startswith("__MACOSX/") \
+                                or os.path.basename(name).startswith("."):
+                            continue
+                        add(name, partial(archive.open, info), info.file_size, mimetypes.guess_type(name)[0])
+                else:
+                    file.file.seek(0, 2)
+                    size = file.file.tell()
+                    file.file.seek(0)
+                    add(file.filename, partial(nullcontext, file.file), size, file.content_type)
+
+            if len(entries) > settings.BULK_UPLOAD_MAX_FILES:
+                raise ValueError(f"Too many files in one upload ({len(entries)} > {settings.BULK_UPLOAD_MAX_FILES})")
+
+            loop = asyncio.get_running_loop()
+
+            def upload(filename: str, opener, size: int, content_type: str) -> str:
+                object_name = f"{str(knowledge_base_id)}/{filename}"
+                with opener() as stream:
+                    minio_service.upload_stream(stream, object_name, size, content_type=content_type)
+                return object_name
+
+            names = list(entries)
+            with ThreadPoolExecutor(max_workers=settings.UPLOAD_CONCURRENCY, thread_name_prefix="upload") as executor:
+                results = await asyncio.gather(
+                    *(loop.run_in_executor(executor, upload, name, *entries[name]) for name in names),
+                    return_exceptions=True
+                )
+        finally:
+            for archive in archives:
+                archive.close()
+
+        saved = []
+        for filename, result in zip(names, results):
+            if isinstance(result, Exception):
+                skipped.append({"filename": filename, "reason": f"Upload failed: {result}"})
+            else:
+                saved.append({"filename": filename, "file_path": result, "file_type": file_type_of(filename)})
+        return saved, skipped
+
     async def process_document(self, document: Document, session: AsyncSession) -> int:
         """
         Load, split, and index document. Returns chunk count.
@@ -47,50 +157,69 @@ class DocumentService:
             ocr_resources = await ai_service.list_resources(type_filter="ocr_paddle", only_enabled=True)
             ocr_resource = ocr_resources[0] if ocr_resources else None
 
-            # 2. Load
-            text = await self._load_file_content(document.file_path, document.file_type, ocr_resource)
-            
-            # Save parsed markdown/text to MinIO
+            # Milvus collection names can only contain numbers, letters and underscores
+            # We must replace hyphens in UUID with underscores
+            sanitized_kb_id = str(document.knowledge_base_id).replace("-", "_")
+            collection_name = f"kb_{sanitized_kb_id}"
+
+            # 2. Load, split and index as a stream: pages/paragraphs flow through the
+            # splitter into embedding batches, and the parsed markdown/text is uploaded
+            # to MinIO as it is produced, so memory is bounded by a window, not the file.
             # We append .md to the original filename to indicate it's the parsed version
-            # Use str(knowledge_base_id)
             parsed_object_name = f"{str(document.knowledge_base_id)}/parsed/{document.filename}.md"
-            text_bytes = text.encode('utf-8')
-            minio_service.upload_stream(
-                io.BytesIO(text_bytes),
-                parsed_object_name,
-                len(text_bytes),
-                content_type="text/markdown"
-            )
 
-            # 3. Split
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
+            splitter = StreamingTextSplitter(
+                RecursiveCharacterTextSplitter(
+                    chunk_size=1000,
+                    chunk_overlap=200,
+                    length_function=len,
+                ),
+                window_chars=settings.SPLITTER_WINDOW_CHARS
             )
-            # We create documents directly from text
-            chunks = splitter.create_documents([text], metadatas=[{"source": document.filename, "document_id": str(document.id)}])
-            
-            # 4. Index
-            if not chunks:
-                return 0
+            metadata = {"source": document.filename, "document_id": str(document.id)}
 
-            texts = [chunk.page_content for chunk in chunks]
-            metadatas = [chunk.metadata for chunk in chunks]
-            ids = [f"{document.id}_{i}" for i in range(len(chunks))]
-            
-            # Milvus collection names can only contain numbers, letters and underscores
-            # We must replace hyphens in UUID with underscores
-            sanitized_kb_id = str(document.knowledge_base_id).replace("-", "_")
-            collection_name = f"kb_{sanitized_kb_id}"
-            
-            # Delete existing chunks for this document before adding new ones
-            # This handles reindexing
-            await vector_service.delete_vectors(collection_name, f'document_id == "{str(document.id)}"')
-            
-            await vector_service.add_texts(collection_name, texts, metadatas, ids)
-            
-            return len(chunks)
+            # 3. Index: chunks are diffed by content hash against what's stored for this
+            # document (this handles reindexing), and only changed ones are embedded
+            # and inserted, in batches with bounded concurrency
+            upload = None
+            try:
+                # The BM25 keyword index (hybrid search) is rebuilt for this document as
+                # chunks stream past; tokenizing is cheap next to embedding
+                keyword_index = keyword_index_service.get(collection_name)
+                keyword_index.remove_document(str(document.id))
+                upload = minio_service.open_stream_upload(parsed_object_name, content_type="text/markdown")
+
+                async def chunks():
+                    index = 0
+                    async for segment in self._iter_file_content(document.file_path, document.file_type,
+                                                                 ocr_resource, document.id):
+                        await upload.write(segment.encode('utf-8'))
+                        for text in splitter.feed(segment):
+                            keyword_index.add(f"{document.id}_{index}", text, str(document.id))
+                            yield text, dict(metadata), f"{document.id}_{index}"
+                            index += 1
+                    for text in splitter.flush():
+                        keyword_index.add(f"{document.id}_{index}", text, str(document.id))
+                        yield text, dict(metadata), f"{document.id}_{index}"
+                        index += 1
+
+                async with aclosing(chunks()) as stream:
+                    throughput = await ingestion_pipeline.reindex_stream(collection_name, str(document.id), stream)
+                await upload.finish()
+            except BaseException as e:
+                # Includes cancellation (lost job claim, shutdown): the upload thread
+                # would otherwise wait on its queue forever and leak the multipart upload
+                if upload is not None:
+                    await asyncio.shield(upload.abort(e))
+                raise
+            finally:
+                await keyword_index_service.flush(collection_name)
+            print(f"Indexed document {document.id}: {throughput['chunks']} chunks "
+                  f"({throughput['embedded']} embedded, {throughput['unchanged']} unchanged, "
+                  f"{throughput['moved']} moved, {throughput['deleted']} deleted) in "
+                  f"{throughput['seconds']}s")
+
+            return throughput["chunks"]
         except Exception as e:
             print(f"Error processing document {document.id}: {e}")
             raise e
@@ -126,32 +255,85 @@ class DocumentService:
                     pass
             
             return "Preview not available. Please process the document first or file type not supported for preview."
-    async def _load_file_content(self, object_name: str, file_type: str, ocr_resource=None) -> str:
+    def _progress_reporter(self, document_id: uuid.UUID, stage: str):
+        """
+        Persist page progress on the Document (throttled; own session so it can be
+        called from concurrently finishing page ranges).
+        """
+        lock = asyncio.Lock()
+        state = {"reported_at": 0.0, "done": -1}
+
+        async def report(done: int, total: int):
+            async with lock:
+                now = time.monotonic()
+                if done <= state["done"] or (done < total and now - state["reported_at"] < 1.0):
+                    return
+                state["reported_at"] = now
+                state["done"] = done
+                try:
+                    async with async_session_factory() as session:
+                        await session.execute(
+                            update(Document).where(Document.id == document_id).values(
+                                progress={"stage": stage, "pages_done": done, "pages_total": total}
+                            )
+                        )
+                        await session.commit()
+                except Exception as e:
+                    print(f"Failed to record progress for document {document_id}: {e}")
+
+        return report
+
+    async def _iter_file_content(self, object_name: str, file_type: str, ocr_resource=None,
+                                 document_id: Optional[uuid.UUID] = None) -> AsyncIterator[str]:
+        """
+        Yield the document's text piece by piece (PDF pages or OCR page ranges, docx
+        paragraphs, text file blocks). Separators are included, so the pieces
+        concatenate to the full parsed text.
+        """
         # Create temp file
         with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_type}") as tmp:
             tmp_path = tmp.name
         
+        # Blocking download/parse calls run off the event loop: with in-process job
+        # workers this loop also serves the API and the job's heartbeat
+        loop = asyncio.get_running_loop()
         try:
-            minio_service.download_file(object_name, tmp_path)
+            await loop.run_in_executor(None, minio_service.download_file, object_name, tmp_path)
             
             # If OCR resource is available and file is PDF, use OCR
+            # Large PDFs are processed as page ranges in parallel
             if ocr_resource and file_type == "pdf":
+                started = False
                 try:
-                    return await self._run_paddleocr(tmp_path, ocr_resource.endpoint)
+                    progress = self._progress_reporter(document_id, "ocr") if document_id else None
+                    async for markdown in pdf_parallel.iter_ocr_pdf(tmp_path, ocr_resource.endpoint, progress):
+                        yield ("\n\n" if started else "") + markdown
+                        started = True
+                    return
                 except Exception as e:
+                    # Output already streamed downstream can't be replaced
+                    if started:
+                        raise
                     print(f"OCR failed, falling back to standard loader: {e}")
                     # Fallback to standard loader if OCR fails
             
             if file_type == "pdf":
-                loader = PyPDFLoader(tmp_path)
-                pages = loader.load()
-                return "\n\n".join([p.page_content for p in pages])
+                progress = self._progress_reporter(document_id, "parsing") if document_id else None
+                first = True
+                async for page in pdf_parallel.iter_pdf_pages(tmp_path, progress):
+                    yield page if first else "\n\n" + page
+                    first = False
             elif file_type == "docx":
-                doc = docx.Document(tmp_path)
-                return "\n".join([para.text for para in doc.paragraphs])
+                doc = await loop.run_in_executor(None, docx.Document, tmp_path)
+                for i, para in enumerate(doc.paragraphs):
+                    yield para.text if i == 0 else "\n" + para.text
             elif file_type in ["txt", "md"]:
                 with open(tmp_path, "r", encoding="utf-8") as f:
-                    return f.read()
+                    while True:
+                        block = f.read(READ_BLOCK_CHARS)
+                        if not block:
+                            break
+                        yield block
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
         finally:
@@ -160,32 +342,8 @@ class DocumentService:
 
     async def _run_paddleocr(self, file_path: str, endpoint: str) -> str:
         """
-        Run PaddleOCR script via subprocess.
+        Run PaddleOCR on a pooled worker process that keeps the pipeline loaded.
         """
-        cmd = [
-            "conda", "run", "-n", "paddleocr_vlm", "--no-capture-output",
-            "python", "scripts/test_paddleocr_connection.py",
-            "--server_url", endpoint,
-            "--file_path", file_path
-        ]
-        
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            raise Exception(f"OCR Script failed: {stderr.decode()}")
-        
-        try:
-            result = json.loads(stdout.decode())
-            if result.get("status") == "success":
-                return result.get("markdown", "")
-            else:
-                raise Exception(result.get("message", "Unknown error"))
-        except json.JSONDecodeError:
-            raise Exception(f"Invalid JSON output from OCR script: {stdout.decode()}")
+        return await ocr_worker_pool.run(endpoint, file_path)
 
 document_service = DocumentService()
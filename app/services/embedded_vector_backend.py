@@ -0,0 +1,476 @@
+import ast
+import io
+import json
+import math
+import operator
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import tokenize
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document as LangchainDocument
+from langchain_core.embeddings import Embeddings
+from app.services.vector_backend import VectorBackend
+
+VECTORS_FILE = "vectors.f32"
+ROWS_FILE = "rows.db"
+
+_COLLECTION_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_COMPARATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+
+def _python_operators(expr: str) -> str:
+    """
+    Rewrite the Milvus operator spellings Python lacks (&&, ||, AND, OR, NOT, IN)
+    token by token, so string literals that contain them are left untouched.
+    """
+    tokens: List[Tuple[int, str]] = []
+    previous = None
+    for token in tokenize.generate_tokens(io.StringIO(expr.strip()).readline):
+        if (token.type == tokenize.OP and token.string in ("&", "|") and previous is not None
+                and previous.string == token.string and previous.end == token.start):
+            tokens[-1] = (tokenize.NAME, "and" if token.string == "&" else "or")
+            previous = None
+            continue
+        if token.type == tokenize.NAME and token.string in ("AND", "OR", "NOT", "IN"):
+            tokens.append((tokenize.NAME, token.string.lower()))
+        else:
+            tokens.append((token.type, token.string))
+        previous = token
+    return tokenize.untokenize(tokens)
+
+
+def compile_expr(expr: str) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Compile a Milvus boolean expression (`document_id == "x" and pk in [1, 2]`)
+    into a predicate over a row's fields. Supports comparisons, in / not in,
+    and / or / not (also && and ||); anything else raises ValueError.
+    """
+    try:
+        tree = ast.parse(_python_operators(expr), mode="eval").body
+    except (SyntaxError, tokenize.TokenError):
+        raise ValueError(f"Unsupported filter expression: {expr}")
+
+    def build(node) -> Callable[[Dict[str, Any]], Any]:
+        if isinstance(node, ast.BoolOp):
+            parts = [build(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda row: all(part(row) for part in parts)
+            return lambda row: any(part(row) for part in parts)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = build(node.operand)
+            return lambda row: not operand(row)
+        if isinstance(node, ast.Compare):
+            left = build(node.left)
+            steps = [(_COMPARATORS[type(op)], build(right)) for op, right in zip(node.ops, node.comparators)
+                     if type(op) in _COMPARATORS]
+            if len(steps) != len(node.ops):
+                raise ValueError(f"Unsupported filter expression: {expr}")
+
+            def compare(row):
+                current = left(row)
+                for compare_op, right in steps:
+                    value = right(row)
+                    try:
+                        if current is None or not compare_op(current, value):
+                            return False
+                    except TypeError:
+                        return False
+                    current = value
+                return True
+            return compare
+        if isinstance(node, ast.Name):
+            return lambda row, name=node.id: row.get(name)
+        if isinstance(node, ast.Constant):
+            return lambda row, value=node.value: value
+        if isinstance(node, (ast.List, ast.Tuple)):
+            if not all(isinstance(element, ast.Constant) for element in node.elts):
+                raise ValueError(f"Unsupported filter expression: {expr}")
+            members = {element.value for element in node.elts}
+            return lambda row: members
+        raise ValueError(f"Unsupported filter expression: {expr}")
+
+    return build(tree)
+
+
+class _IVFIndex:
+    """
+    Inverted-file index: k-means centroids partition the vectors into lists and a
+    search only scans the vectors in the `nprobe` lists closest to the query.
+    """
+
+    def __init__(self, vectors: np.ndarray, slots: np.ndarray, n_slots: int, iterations: int = 8):
+        self.trained_on = len(slots)
+        nlist = int(min(4096, max(16, math.sqrt(len(slots)))))
+        rng = np.random.default_rng(0)
+        sample = slots if len(slots) <= nlist * 40 else rng.choice(slots, nlist * 40, replace=False)
+        data = self._normalize(np.asarray(vectors[np.sort(sample)], dtype=np.float32))
+
+        # Spherical k-means: inner-product assignment, normalized centroids
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            empty = np.bincount(assignment, minlength=nlist) == 0
+            if empty.any():
+                # Reseed empty lists with random points
+                sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+            centroids = self._normalize(sums)
+        self.centroids = centroids
+
+        self.assignment = np.full(n_slots, -1, dtype=np.int32)
+        for start in range(0, len(slots), 65536):
+            block = slots[start:start + 65536]
+            self.assignment[block] = self.assign(np.asarray(vectors[block], dtype=np.float32))
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def add(self, vectors: np.ndarray):
+        self.assignment = np.concatenate([self.assignment, self.assign(vectors)])
+
+    def candidates(self, query: np.ndarray, nprobe: int, assignment: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Slots in the `nprobe` closest lists. Pass an `assignment` snapshot to search
+        without the collection lock: add() grows the live one.
+        """
+        assignment = self.assignment if assignment is None else assignment
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.flatnonzero(np.isin(assignment, lists))
+
+
+class _Collection:
+    """
+    One collection on disk: a float32 matrix file (row = slot) that is memory-mapped
+    for search, and a SQLite table mapping primary keys to slot, text and metadata.
+    Deleted slots are tombstoned and compacted away once they dominate.
+    """
+
+    def __init__(self, directory: str, ann_threshold: int, nprobe: int):
+        self.directory = directory
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        self.vectors_path = os.path.join(directory, VECTORS_FILE)
+        self.db = sqlite3.connect(os.path.join(directory, ROWS_FILE), check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "pk INTEGER PRIMARY KEY AUTOINCREMENT, slot INTEGER NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.db.commit()
+
+        row = self.db.execute("SELECT value FROM info WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self.metadata: Dict[int, Dict[str, Any]] = {}
+        self.slot_of: Dict[int, int] = {}
+        n_slots = 0
+        for pk, slot, metadata in self.db.execute("SELECT pk, slot, metadata FROM rows"):
+            self.metadata[pk] = json.loads(metadata)
+            self.slot_of[pk] = slot
+            n_slots = max(n_slots, slot + 1)
+        self.slot_pks = np.full(n_slots, -1, dtype=np.int64)
+        for pk, slot in self.slot_of.items():
+            self.slot_pks[slot] = pk
+
+        # Vectors appended after the last committed row (crash mid-insert) are dropped
+        if self.dim and os.path.exists(self.vectors_path):
+            if os.path.getsize(self.vectors_path) > n_slots * self.dim * 4:
+                os.truncate(self.vectors_path, n_slots * self.dim * 4)
+        self.vectors: Optional[np.ndarray] = None
+        self.index: Optional[_IVFIndex] = None
+        self._map()
+
+    @property
+    def count(self) -> int:
+        return len(self.slot_of)
+
+    def _map(self):
+        n_slots = len(self.slot_pks)
+        if self.dim and n_slots:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n_slots, self.dim))
+        else:
+            self.vectors = None
+
+    def insert(self, embeddings: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]]) -> List[int]:
+        with self.lock:
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+                self.db.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match collection ({self.dim})")
+
+            start = len(self.slot_pks)
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+            pks = []
+            with self.db:
+                for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+                    cursor = self.db.execute(
+                        "INSERT INTO rows (slot, text, metadata) VALUES (?, ?, ?)",
+                        (start + i, text, json.dumps(metadata, ensure_ascii=False))
+                    )
+                    pks.append(cursor.lastrowid)
+
+            for i, (pk, metadata) in enumerate(zip(pks, metadatas)):
+                self.metadata[pk] = dict(metadata)
+                self.slot_of[pk] = start + i
+            self.slot_pks = np.concatenate([self.slot_pks, np.asarray(pks, dtype=np.int64)])
+            self._map()
+            if self.index is not None:
+                self.index.add(np.asarray(embeddings, dtype=np.float32))
+            return pks
+
+    def delete(self, pks: List[int]):
+        with self.lock:
+            pks = [pk for pk in pks if pk in self.slot_of]
+            if not pks:
+                return
+            with self.db:
+                self.db.executemany("DELETE FROM rows WHERE pk = ?", [(pk,) for pk in pks])
+            # Copy on write: searches scan a snapshot of slot_pks outside the lock
+            slot_pks = self.slot_pks.copy()
+            for pk in pks:
+                slot_pks[self.slot_of.pop(pk)] = -1
+                self.metadata.pop(pk, None)
+            self.slot_pks = slot_pks
+            dead = len(self.slot_pks) - self.count
+            if dead > 1000 and dead > self.count:
+                self._compact()
+
+    def _compact(self):
+        live = np.flatnonzero(self.slot_pks >= 0)
+        tmp_path = self.vectors_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for start in range(0, len(live), 65536):
+                f.write(np.asarray(self.vectors[live[start:start + 65536]], dtype=np.float32).tobytes())
+        pks = self.slot_pks[live]
+        with self.db:
+            self.db.executemany("UPDATE rows SET slot = ? WHERE pk = ?",
+                                [(slot, int(pk)) for slot, pk in enumerate(pks)])
+        self.vectors = None
+        os.replace(tmp_path, self.vectors_path)
+        self.slot_pks = pks.copy()
+        self.slot_of = {int(pk): slot for slot, pk in enumerate(pks)}
+        self.index = None
+        self._map()
+
+    def vectors_of(self, pks: List[int]) -> np.ndarray:
+        with self.lock:
+            return np.asarray(self.vectors[[self.slot_of[pk] for pk in pks]], dtype=np.float32)
+
+    def texts_of(self, pks: List[int]) -> Dict[int, str]:
+        texts = {}
+        with self.lock:
+            for start in range(0, len(pks), 500):
+                batch = pks[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for pk, text in self.db.execute(f"SELECT pk, text FROM rows WHERE pk IN ({placeholders})", batch):
+                    texts[pk] = text
+        return texts
+
+    def match(self, predicate: Callable[[Dict[str, Any]], bool]) -> List[int]:
+        with self.lock:
+            items = list(self.metadata.items())
+        return [pk for pk, metadata in items if predicate({**metadata, "pk": pk})]
+
+    def search(self, query: np.ndarray, top_k: int, pks: Optional[List[int]] = None,
+               min_score: Optional[float] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (pk, score) by inner product, over `pks` only when given (an exact scan
+        of the filtered rows), keeping scores >= min_score.
+        """
+        with self.lock:
+            if self.vectors is None or not self.count:
+                return []
+            if pks is not None:
+                slots = np.sort(np.fromiter((self.slot_of[pk] for pk in pks if pk in self.slot_of), dtype=np.int64))
+                return self._top_k(slots, np.asarray(self.vectors[slots]) @ query, top_k, min_score)
+            if self.count >= self.ann_threshold and (
+                    self.index is None or len(self.slot_pks) > 2 * self.index.trained_on):
+                # Built on first search past the threshold, rebuilt as the collection doubles
+                self.index = _IVFIndex(self.vectors, np.flatnonzero(self.slot_pks >= 0), len(self.slot_pks))
+            # Snapshot: writes replace these arrays rather than modify them, so the
+            # scan below stays consistent without holding the lock
+            vectors, slot_pks = self.vectors, self.slot_pks
+            index = self.index if self.count >= self.ann_threshold else None
+            assignment = index.assignment if index is not None else None
+
+        if index is not None:
+            slots = index.candidates(query, self.nprobe, assignment)
+            slots = slots[slot_pks[slots] >= 0]
+            scores = np.asarray(vectors[slots]) @ query
+        else:
+            slots = np.flatnonzero(slot_pks >= 0)
+            scores = np.asarray(vectors @ query)[slots]
+        return self._top_k(slots, scores, top_k, min_score, slot_pks)
+
+    def _top_k(self, slots: np.ndarray, scores: np.ndarray, top_k: int, min_score: Optional[float],
+               slot_pks: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        slot_pks = self.slot_pks if slot_pks is None else slot_pks
+        if min_score is not None:
+            keep = scores >= min_score
+            slots, scores = slots[keep], scores[keep]
+        if not len(slots):
+            return []
+        top_k = min(top_k, len(slots))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(slot_pks[slots[i]]), float(scores[i])) for i in best]
+
+    def close(self):
+        with self.lock:
+            self.vectors = None
+            self.db.close()
+
+
+class EmbeddedVectorBackend(VectorBackend):
+    """
+    In-process vector store for edge deployments and tests: no Milvus, no network
+    hop. Each collection is a directory under `path` holding a memory-mapped float32
+    matrix and a SQLite table of texts and metadata. Search is an exact batched
+    inner product below `ann_threshold` vectors and an IVF index above it.
+    """
+
+    name = "embedded"
+
+    def __init__(self, embedding_function: Embeddings, path: str = "./vector_data",
+                 ann_threshold: int = 20000, nprobe: int = 16):
+        super().__init__(embedding_function)
+        self.path = path
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        os.makedirs(path, exist_ok=True)
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.search_seconds = 0.0
+        print(f"Using embedded vector store at {os.path.abspath(path)}")
+
+    def _get(self, collection_name: str, create: bool = False) -> Optional[_Collection]:
+        if not _COLLECTION_NAME.match(collection_name):
+            raise ValueError(f"Invalid collection name: {collection_name}")
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                directory = os.path.join(self.path, collection_name)
+                if not os.path.isdir(directory):
+                    if not create:
+                        return None
+                    os.makedirs(directory)
+                collection = _Collection(directory, self.ann_threshold, self.nprobe)
+                self._collections[collection_name] = collection
+            return collection
+
+    def add_texts(self, collection_name: str, texts: List[str], metadatas: List[Dict[str, Any]]):
+        if not texts:
+            return
+        embeddings = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        self._get(collection_name, create=True).insert(embeddings, texts, metadatas)
+
+    def search(self, collection_name: str, query: str, top_k: int, expr: Optional[str] = None,
+               score_threshold: Optional[float] = None) -> List[Tuple[LangchainDocument, float]]:
+        collection = self._get(collection_name)
+        if collection is None:
+            return []
+        # Filters select the candidate rows before scoring
+        pks = collection.match(compile_expr(expr)) if expr else None
+        vector = np.asarray(self.embedding_function.embed_query(query), dtype=np.float32)
+        started = time.perf_counter()
+        hits = collection.search(vector, top_k, pks=pks, min_score=score_threshold)
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+
+        texts = collection.texts_of([pk for pk, _ in hits])
+        results = []
+        for pk, score in hits:
+            metadata = collection.metadata.get(pk)
+            if metadata is None or pk not in texts:
+                continue  # Deleted meanwhile
+            results.append((LangchainDocument(page_content=texts[pk], metadata={**metadata, "pk": pk}), score))
+        return results
+
+    def query(self, collection_name: str, expr: str) -> List[Dict[str, Any]]:
+        collection = self._get(collection_name)
+        if collection is None:
+            return []
+        pks = collection.match(compile_expr(expr))
+        texts = collection.texts_of(pks)
+        return [
+            {"text": texts[pk], **collection.metadata[pk], "pk": pk}
+            for pk in pks if pk in texts and pk in collection.metadata
+        ]
+
+    def delete(self, collection_name: str, expr: str):
+        collection = self._get(collection_name)
+        if collection is None:
+            return
+        pks = collection.match(compile_expr(expr))
+        collection.delete(pks)
+        print(f"Deleted {len(pks)} vectors in {collection_name} matching {expr}")
+
+    def delete_collection(self, collection_name: str):
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+        if collection is not None:
+            collection.close()
+        directory = os.path.join(self.path, collection_name)
+        if _COLLECTION_NAME.match(collection_name) and os.path.isdir(directory):
+            shutil.rmtree(directory)
+            print(f"Dropped collection {collection_name}")
+
+    def get_chunk_index(self, collection_name: str, document_id: str) -> Optional[List[Dict[str, Any]]]:
+        collection = self._get(collection_name)
+        if collection is None:
+            return None
+        rows = []
+        for pk in collection.match(lambda row: row.get("document_id") == document_id):
+            metadata = collection.metadata.get(pk, {})
+            if "content_hash" not in metadata:
+                return None
+            rows.append({"pk": pk, "chunk_id": metadata.get("chunk_id"), "content_hash": metadata["content_hash"]})
+        return rows
+
+    def move_chunks(self, collection_name: str, pks: List[int], texts: List[str],
+                    metadatas: List[Dict[str, Any]]):
+        collection = self._get(collection_name)
+        collection.insert(collection.vectors_of(pks), texts, metadatas)
+        collection.delete(pks)
+
+    def delete_chunks(self, collection_name: str, pks: List[int]):
+        collection = self._get(collection_name)
+        if collection is not None:
+            collection.delete(pks)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            collections = list(self._collections.values())
+        return {
+            "loaded_collections": len(collections),
+            "vectors": sum(collection.count for collection in collections),
+            "indexed_collections": sum(1 for collection in collections if collection.index is not None),
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 3) if self.searches else 0.0,
+        }
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+
+
+def embedding_model_id(embeddings: Embeddings) -> str:
+    """
+    Identity of an embedding model for cache keys: vectors from different models
+    (or dimensions) must never be mixed up.
+    """
+    parts = [type(embeddings).__name__]
+    for attr in ("model", "model_name", "size", "dimensions", "openai_api_base"):
+        value = getattr(embeddings, attr, None)
+        if value:
+            parts.append(f"{attr}={value}")
+    return "|".join(parts)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches vectors by a hash of (model identity, text).
+
+    Used for both ingestion and queries, so reprocessing a document only embeds
+    chunks whose text changed and repeated queries skip the model. Vectors live
+    in a bounded in-memory LRU, optionally backed by a SQLite file of float32 blobs
+    so they survive restarts. The lock only guards the LRU; SQLite I/O runs outside
+    it on a per-thread connection, so concurrent embedding threads don't queue
+    behind each other's disk reads and writes.
+    """
+
+    def __init__(self, underlying: Embeddings, model_id: Optional[str] = None,
+                 max_entries: int = 10000, sqlite_path: Optional[str] = None):
+        self.underlying = underlying
+        self.model_id = model_id or embedding_model_id(underlying)
+        self.max_entries = max_entries
+        self.sqlite_path = sqlite_path
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\x00{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors = self._get_many(keys)
+
+        # Embed each distinct missing text once, in a single call
+        missing = {}
+        for i, key in enumerate(keys):
+            if vectors[i] is None:
+                missing.setdefault(key, texts[i])
+        if missing:
+            self.misses += len(missing)
+            embedded = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), embedded))
+            self._put_many(fresh)
+            vectors = [v if v is not None else fresh[k] for k, v in zip(keys, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self._get_many([key])[0]
+        if vector is None:
+            self.misses += 1
+            vector = self.underlying.embed_query(text)
+            self._put_many({key: vector})
+        return vector
+
+    # --- storage ---
+
+    def _get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        results: List[Optional[List[float]]] = []
+        disk_keys = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                else:
+                    disk_keys.append(key)
+                results.append(vector)
+
+        if disk_keys and self.sqlite_path:
+            found = self._sqlite_get(disk_keys)
+            if found:
+                for i, key in enumerate(keys):
+                    if results[i] is None and key in found:
+                        results[i] = found[key]
+                with self._lock:
+                    self.disk_hits += len(found)
+                    self._remember(found)
+        return results
+
+    def _put_many(self, vectors: Dict[str, List[float]]):
+        with self._lock:
+            self._remember(vectors)
+        if self.sqlite_path:
+            db = self._connect()
+            db.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in vectors.items()]
+            )
+            db.commit()
+
+    def _remember(self, vectors: Dict[str, List[float]]):
+        for key, vector in vectors.items():
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread (embedding runs on several executor threads)
+        db = getattr(self._local, "db", None)
+        if db is None:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    directory = os.path.dirname(self.sqlite_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    setup = sqlite3.connect(self.sqlite_path)
+                    # WAL lets readers proceed while another thread writes
+                    setup.execute("PRAGMA journal_mode=WAL")
+                    setup.execute("CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+                    setup.commit()
+                    setup.close()
+                    self._schema_ready = True
+            db = self._local.db = sqlite3.connect(self.sqlite_path, timeout=30)
+        return db
+
+    def _sqlite_get(self, keys: List[str]) -> Dict[str, List[float]]:
+        db = self._connect()
+        found = {}
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = db.execute(
+                f"SELECT key, vector FROM embedding_cache WHERE key IN ({','.join('?' * len(batch))})",
+                batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_id,
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "sqlite_enabled": bool(self.sqlite_path),
+        }
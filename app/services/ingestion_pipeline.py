@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from app.core.config import settings
+from app.services.vector_service import vector_service
+
+
+def content_hash(text: str) -> str:
+    """
+    Stable hash of a chunk's text, stored with it for incremental reindexing.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestionPipeline:
+    """
+    Embeds and inserts document chunks in fixed-size batches.
+
+    Up to `concurrency` batches are embedded and inserted at once, so the embedding
+    server (e.g. the Qwen3 embed server from scripts/deploy_qwen3_embed.sh) stays
+    busy without being flooded, and chunks land in Milvus as soon as their batch is
+    done instead of after one giant call for the whole document.
+    """
+
+    def __init__(self, batch_size: int = 64, concurrency: int = 4):
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.documents = 0
+        self.chunks = 0
+        self.seconds = 0.0
+        self.last_chunks_per_sec = 0.0
+        self.unchanged = 0
+        self.moved = 0
+        self.deleted = 0
+
+    async def index(self, collection_name: str, texts: List[str], metadatas: List[Dict[str, Any]],
+                    ids: List[str]) -> Dict[str, Any]:
+        """
+        Index chunks into the collection. Returns throughput stats for this call.
+        """
+        async def chunks():
+            for i, text in enumerate(texts):
+                yield text, metadatas[i], ids[i]
+
+        return await self.index_stream(collection_name, chunks())
+
+    async def index_stream(self, collection_name: str,
+                           chunks: AsyncIterator[Tuple[str, Dict[str, Any], str]]) -> Dict[str, Any]:
+        """
+        Index (text, metadata, chunk_id) tuples as they are produced. At most
+        `concurrency` batches are in flight, so a slow embedding server applies
+        backpressure to the producer instead of chunks piling up in memory.
+        """
+        started = time.perf_counter()
+        in_flight = set()
+        batch_texts: List[str] = []
+        batch_metadatas: List[Dict[str, Any]] = []
+        total = 0
+        batches = 0
+
+        async def submit():
+            nonlocal batches, batch_texts, batch_metadatas
+            texts, metadatas = batch_texts, batch_metadatas
+            batch_texts, batch_metadatas = [], []
+            batches += 1
+            if batches == 1:
+                await vector_service.prepare_collection(collection_name)
+                # The first batch creates the collection (and its schema) if needed
+                await vector_service.insert_batch(collection_name, texts, metadatas)
+                return
+            while len(in_flight) >= self.concurrency:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                in_flight.difference_update(done)
+                for task in done:
+                    task.result()
+            in_flight.add(asyncio.ensure_future(vector_service.insert_batch(collection_name, texts, metadatas)))
+
+        try:
+            async for text, metadata, chunk_id in chunks:
+                # Our chunk ids are kept in metadata; Milvus generates the primary keys
+                metadata["chunk_id"] = chunk_id
+                metadata.setdefault("content_hash", content_hash(text))
+                batch_texts.append(text)
+                batch_metadatas.append(metadata)
+                total += 1
+                if len(batch_texts) >= self.batch_size:
+                    await submit()
+            if batch_texts:
+                await submit()
+        finally:
+            results = await asyncio.gather(*in_flight, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
+
+        if not total:
+            return {"chunks": 0, "batches": 0, "seconds": 0.0, "chunks_per_sec": 0.0}
+
+        elapsed = time.perf_counter() - started
+        chunks_per_sec = total / elapsed if elapsed > 0 else 0.0
+        self.documents += 1
+        self.chunks += total
+        self.seconds += elapsed
+        self.last_chunks_per_sec = chunks_per_sec
+        return {
+            "chunks": total,
+            "batches": batches,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(chunks_per_sec, 2),
+        }
+
+    async def reindex_stream(self, collection_name: str, document_id: str,
+                             chunks: AsyncIterator[Tuple[str, Dict[str, Any], str]]) -> Dict[str, Any]:
+        """
+        (Re)index a document, touching only chunks that changed since it was last
+        indexed. Stored chunks are matched by content hash:
+
+        - same text at the same chunk_id: kept as is
+        - same text at a new position: re-inserted with its stored vector
+        - new text: embedded and inserted
+        - stored chunks no longer produced: deleted at the end
+
+        Falls back to deleting everything and indexing from scratch when the
+        collection has no content hashes yet.
+        """
+        existing = await vector_service.get_chunk_index(collection_name, document_id)
+        if existing is None:
+            await vector_service.delete_vectors(collection_name, f'document_id == "{document_id}"')
+            result = await self.index_stream(collection_name, chunks)
+            return {**result, "embedded": result["chunks"], "unchanged": 0, "moved": 0, "deleted": 0}
+
+        by_chunk_id = {row["chunk_id"]: row for row in existing}
+        by_hash: Dict[str, List[Dict[str, Any]]] = {}
+        for row in existing:
+            by_hash.setdefault(row["content_hash"], []).append(row)
+        claimed = set()
+        counts = {"chunks": 0, "unchanged": 0, "moved": 0}
+        moves: List[Tuple[int, str, Dict[str, Any]]] = []
+
+        async def flush_moves():
+            if moves:
+                pks, texts, metadatas = zip(*moves)
+                await vector_service.move_chunks(collection_name, list(pks), list(texts), list(metadatas))
+                moves.clear()
+
+        async def changed():
+            async for text, metadata, chunk_id in chunks:
+                counts["chunks"] += 1
+                digest = content_hash(text)
+                metadata["chunk_id"] = chunk_id
+                metadata["content_hash"] = digest
+
+                row = by_chunk_id.get(chunk_id)
+                if row is not None and row["content_hash"] == digest and row["pk"] not in claimed:
+                    claimed.add(row["pk"])
+                    counts["unchanged"] += 1
+                    continue
+
+                row = next((r for r in by_hash.get(digest, []) if r["pk"] not in claimed), None)
+                if row is not None:
+                    claimed.add(row["pk"])
+                    counts["moved"] += 1
+                    moves.append((row["pk"], text, metadata))
+                    if len(moves) >= self.batch_size:
+                        await flush_moves()
+                    continue
+
+                yield text, metadata, chunk_id
+            await flush_moves()
+
+        started = time.perf_counter()
+        result = await self.index_stream(collection_name, changed())
+        stale = [row["pk"] for row in existing if row["pk"] not in claimed]
+        await vector_service.delete_chunks(collection_name, stale)
+
+        self.unchanged += counts["unchanged"]
+        self.moved += counts["moved"]
+        self.deleted += len(stale)
+        return {
+            **result,
+            "chunks": counts["chunks"],
+            "embedded": result["chunks"],
+            "unchanged": counts["unchanged"],
+            "moved": counts["moved"],
+            "deleted": len(stale),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "chunks_per_sec": round(self.chunks / self.seconds, 2) if self.seconds else 0.0,
+            "last_chunks_per_sec": round(self.last_chunks_per_sec, 2),
+            "unchanged": self.unchanged,
+            "moved": self.moved,
+            "deleted": self.deleted,
+        }
+
+
+# Singleton instance
+ingestion_pipeline = IngestionPipeline(
+    batch_size=settings.EMBEDDING_BATCH_SIZE,
+    concurrency=settings.EMBEDDING_CONCURRENCY
+)
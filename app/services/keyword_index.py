@@ -0,0 +1,483 @@
+import asyncio
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.search_cache import search_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single process
+    fcntl = None
+
+SNAPSHOT_FILE = "snapshot.npz"
+META_FILE = "snapshot.json"
+LOG_FILE = "log.jsonl"
+LOCK_FILE = "lock"
+
+# Words, numbers and codes; joined codes like "ERR-4012" or "v2.3.1" are kept
+# whole and also indexed by their parts
+_WORD = re.compile(r"[a-z0-9_]+(?:[-.:/#][a-z0-9_]+)*")
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+_COLLECTION_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased words and codes (plus their parts), and CJK character bigrams.
+    """
+    text = text.lower()
+    tokens = []
+    for match in _WORD.finditer(text):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-.:/#_]", token) if part)
+    for match in _CJK.finditer(text):
+        run = match.group()
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class KeywordIndex:
+    """
+    BM25 inverted index of one knowledge base's chunks, keyed by chunk_id.
+
+    Postings are array-backed: a CSR segment (per-term offsets into flat uint32
+    doc-slot and uint16 term-frequency arrays) plus small append-only arrays for
+    chunks added since the last merge. Removed chunks are tombstoned and dropped
+    when the segment is rebuilt. Changes are appended to a log on flush() and
+    folded into a snapshot now and then, so nothing is rewritten per document.
+
+    Several processes (the API and standalone workers) may share a directory:
+    writers hold an exclusive file lock while they append or snapshot, and
+    every process catches up with the log (or reloads after another process's
+    snapshot) before it searches or flushes.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, directory: str, merge_threshold: int = 50000, snapshot_every: int = 100000):
+        self.directory = directory
+        self.merge_threshold = merge_threshold
+        self.snapshot_every = snapshot_every
+        self.lock = threading.RLock()
+        self._log: List[Dict[str, Any]] = []
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.terms: Dict[str, int] = {}
+        self.term_list: List[str] = []
+        # Merged segment
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.uint32)
+        self.post_tfs = np.zeros(0, dtype=np.uint16)
+        # term id -> (doc slots, term frequencies) added since the last merge
+        self.pending: Dict[int, Tuple[array, array]] = {}
+        self.pending_postings = 0
+
+        # Per doc slot
+        self.doc_keys: List[Optional[str]] = []
+        self.doc_len = array("I")
+        self.alive = bytearray()
+        self.slot_of: Dict[str, int] = {}
+        self.doc_slots: Dict[str, List[int]] = {}
+        self.live_count = 0
+        self.total_len = 0
+
+        self._logged_ops = 0
+        # What of the files on disk is reflected in memory
+        self._snapshot_id: Optional[Tuple[int, int, int]] = None
+        self._log_id: Optional[int] = None
+        self._log_offset = 0
+
+    # -- Updates --
+
+    def add(self, chunk_id: str, text: str, document_id: str):
+        with self.lock:
+            self._add(chunk_id, document_id, Counter(tokenize(text)))
+
+    def _add(self, chunk_id: str, document_id: str, counts: Dict[str, int], log: bool = True):
+        if chunk_id in self.slot_of:
+            self._remove_slot(self.slot_of[chunk_id])
+        slot = len(self.doc_keys)
+        self.doc_keys.append(chunk_id)
+        length = sum(counts.values())
+        self.doc_len.append(length)
+        self.alive.append(1)
+        self.slot_of[chunk_id] = slot
+        self.doc_slots.setdefault(document_id, []).append(slot)
+        self.live_count += 1
+        self.total_len += length
+
+        for term, tf in counts.items():
+            term_id = self.terms.get(term)
+            if term_id is None:
+                term_id = self.terms[term] = len(self.term_list)
+                self.term_list.append(term)
+            postings = self.pending.get(term_id)
+            if postings is None:
+                postings = self.pending[term_id] = (array("I"), array("H"))
+            postings[0].append(slot)
+            postings[1].append(min(tf, 65535))
+        self.pending_postings += len(counts)
+        if log:
+            self._log.append({"add": [chunk_id, document_id, counts]})
+
+    def _remove_slot(self, slot: int):
+        if self.alive[slot]:
+            self.alive[slot] = 0
+            self.live_count -= 1
+            self.total_len -= self.doc_len[slot]
+            self.slot_of.pop(self.doc_keys[slot], None)
+
+    def remove_document(self, document_id: str, log: bool = True):
+        with self.lock:
+            for slot in self.doc_slots.pop(document_id, []):
+                self._remove_slot(slot)
+            if log:
+                self._log.append({"remove": document_id})
+
+    def _apply(self, op: Dict[str, Any]):
+        if "add" in op:
+            chunk_id, document_id, counts = op["add"]
+            self._add(chunk_id, document_id, counts, log=False)
+        elif "remove" in op:
+            self.remove_document(op["remove"], log=False)
+
+    def flush(self):
+        """
+        Persist changes since the last flush; merge and snapshot when due.
+        """
+        with self.lock:
+            if not self._log and self._logged_ops < self.snapshot_every:
+                # Nothing to write; still pick up what other processes flushed
+                self.refresh()
+                if self.pending_postings >= self.merge_threshold:
+                    self._merge()
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with self._file_lock(exclusive=True):
+                # Ops other processes appended meanwhile go in before ours
+                self._catch_up()
+                if self.pending_postings >= self.merge_threshold:
+                    self._merge()
+                if self._log:
+                    with open(os.path.join(self.directory, LOG_FILE), "ab") as f:
+                        for op in self._log:
+                            f.write((json.dumps(op, ensure_ascii=False) + "\n").encode("utf-8"))
+                        self._log_offset = f.tell()
+                        self._log_id = os.fstat(f.fileno()).st_ino
+                    self._logged_ops += len(self._log)
+                    self._log = []
+                if self._logged_ops >= self.snapshot_every:
+                    self._snapshot()
+
+    def _merge(self):
+        """
+        Fold pending postings into the CSR segment, renumbering slots to drop
+        removed chunks when they make up most of the index.
+        """
+        n_terms = len(self.term_list)
+        counts = np.zeros(n_terms, dtype=np.int64)
+        counts[:len(self.offsets) - 1] = np.diff(self.offsets)
+        for term_id, (docs, _) in self.pending.items():
+            counts[term_id] += len(docs)
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        post_docs = np.empty(offsets[-1], dtype=np.uint32)
+        post_tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for term_id in range(n_terms):
+            start = offsets[term_id]
+            if term_id < len(self.offsets) - 1:
+                old_start, old_end = self.offsets[term_id], self.offsets[term_id + 1]
+                post_docs[start:start + old_end - old_start] = self.post_docs[old_start:old_end]
+                post_tfs[start:start + old_end - old_start] = self.post_tfs[old_start:old_end]
+                start += old_end - old_start
+            pending = self.pending.get(term_id)
+            if pending is not None:
+                post_docs[start:start + len(pending[0])] = np.frombuffer(pending[0], dtype=np.uint32)
+                post_tfs[start:start + len(pending[1])] = np.frombuffer(pending[1], dtype=np.uint16)
+        self.offsets, self.post_docs, self.post_tfs = offsets, post_docs, post_tfs
+        self.pending = {}
+        self.pending_postings = 0
+
+        dead = len(self.doc_keys) - self.live_count
+        if dead > 1000 and dead > self.live_count:
+            self._drop_dead()
+
+    def _drop_dead(self):
+        alive = np.frombuffer(bytes(self.alive), dtype=np.uint8).astype(bool)
+        new_slot = np.cumsum(alive) - 1
+        keep = alive[self.post_docs]
+        counts = np.add.reduceat(keep.astype(np.int64), self.offsets[:-1]) if len(keep) else np.zeros(0, np.int64)
+        # reduceat repeats the next value for empty ranges
+        counts[np.diff(self.offsets) == 0] = 0
+        offsets = np.zeros(len(self.offsets), dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        self.post_docs = new_slot[self.post_docs[keep]].astype(np.uint32)
+        self.post_tfs = self.post_tfs[keep]
+        self.offsets = offsets
+
+        live_slots = np.flatnonzero(alive)
+        self.doc_keys = [self.doc_keys[slot] for slot in live_slots]
+        self.doc_len = array("I", (self.doc_len[slot] for slot in live_slots))
+        self.alive = bytearray(b"\x01" * len(live_slots))
+        self.slot_of = {key: slot for slot, key in enumerate(self.doc_keys)}
+        self.doc_slots = {
+            document_id: [int(new_slot[slot]) for slot in slots if alive[slot]]
+            for document_id, slots in self.doc_slots.items()
+        }
+
+    # -- Search --
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        BM25 top-k as (chunk_id, score).
+        """
+        self.refresh()
+        with self.lock:
+            if not self.live_count:
+                return []
+            n_docs = len(self.doc_keys)
+            alive = np.frombuffer(self.alive, dtype=np.uint8)
+            doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)
+            avg_len = self.total_len / self.live_count or 1.0
+            scores = np.zeros(n_docs, dtype=np.float32)
+            for term in set(tokenize(query)):
+                term_id = self.terms.get(term)
+                if term_id is None:
+                    continue
+                docs, tfs = self._postings(term_id)
+                live = alive[docs] == 1
+                docs, tfs = docs[live], tfs[live].astype(np.float32)
+                if not len(docs):
+                    continue
+                idf = math.log(1 + (self.live_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * doc_len[docs] / avg_len)
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+            hits = np.flatnonzero(scores)
+            if not len(hits):
+                return []
+            top_k = min(top_k, len(hits))
+            best = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            best = best[np.argsort(-scores[best])]
+            return [(self.doc_keys[slot], float(scores[slot])) for slot in best]
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        parts_docs, parts_tfs = [], []
+        if term_id < len(self.offsets) - 1:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            parts_docs.append(self.post_docs[start:end])
+            parts_tfs.append(self.post_tfs[start:end])
+        pending = self.pending.get(term_id)
+        if pending is not None:
+            parts_docs.append(np.frombuffer(pending[0], dtype=np.uint32))
+            parts_tfs.append(np.frombuffer(pending[1], dtype=np.uint16))
+        if len(parts_docs) == 1:
+            return parts_docs[0], parts_tfs[0]
+        return np.concatenate(parts_docs), np.concatenate(parts_tfs)
+
+    # -- Persistence --
+
+    def _snapshot(self):
+        self._merge()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, SNAPSHOT_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                offsets=self.offsets,
+                post_docs=self.post_docs,
+                post_tfs=self.post_tfs,
+                doc_len=np.frombuffer(self.doc_len, dtype=np.uint32),
+                alive=np.frombuffer(bytes(self.alive), dtype=np.uint8)
+            )
+        meta_tmp = os.path.join(self.directory, META_FILE + ".tmp")
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump({"terms": self.term_list, "doc_keys": self.doc_keys, "doc_slots": self.doc_slots}, f,
+                      ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.directory, SNAPSHOT_FILE))
+        os.replace(meta_tmp, os.path.join(self.directory, META_FILE))
+        # Replaying ops already in the snapshot is harmless (adds replace, removes repeat)
+        open(os.path.join(self.directory, LOG_FILE), "w").close()
+        self._logged_ops = 0
+        self._snapshot_id = self._file_id(META_FILE)
+        self._log_id = self._file_id(LOG_FILE)[0]
+        self._log_offset = 0
+
+    def _load(self):
+        self._snapshot_id = self._file_id(META_FILE)
+        snapshot = os.path.join(self.directory, SNAPSHOT_FILE)
+        meta = os.path.join(self.directory, META_FILE)
+        if os.path.exists(snapshot) and os.path.exists(meta):
+            with open(meta, encoding="utf-8") as f:
+                data = json.load(f)
+            arrays = np.load(snapshot)
+            self.term_list = data["terms"]
+            self.terms = {term: i for i, term in enumerate(self.term_list)}
+            self.doc_keys = data["doc_keys"]
+            self.doc_slots = data["doc_slots"]
+            self.offsets = arrays["offsets"]
+            self.post_docs = arrays["post_docs"]
+            self.post_tfs = arrays["post_tfs"]
+            self.doc_len = array("I", arrays["doc_len"].tobytes())
+            self.alive = bytearray(arrays["alive"].tobytes())
+            for slot, key in enumerate(self.doc_keys):
+                if self.alive[slot]:
+                    self.slot_of[key] = slot
+                    self.live_count += 1
+                    self.total_len += self.doc_len[slot]
+        self._read_log()
+
+    def _read_log(self):
+        """
+        Replay log ops past the offset already applied. A torn last line (a
+        writer mid-append) is left for the next read.
+        """
+        log_path = os.path.join(self.directory, LOG_FILE)
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, "rb") as f:
+            self._log_id = os.fstat(f.fileno()).st_ino
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._apply(op)
+                self._logged_ops += 1
+                self._log_offset += len(line)
+
+    def _file_id(self, name: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _is_current(self) -> bool:
+        log = self._file_id(LOG_FILE)
+        if log is None:
+            return self._log_id is None
+        return log[0] == self._log_id and log[2] == self._log_offset
+
+    def refresh(self):
+        """
+        Pick up what other processes flushed since this index last looked.
+        Cheap (two stats) when nothing changed.
+        """
+        if self._file_id(META_FILE) == self._snapshot_id and self._is_current():
+            return
+        with self.lock:
+            if not os.path.isdir(self.directory):
+                self._catch_up()
+                return
+            with self._file_lock(exclusive=False):
+                self._catch_up()
+
+    def _catch_up(self):
+        """
+        Replay the new log tail, or reload everything when another process
+        snapshotted (or dropped the index). Unflushed local ops are kept on top.
+        Call with the file lock held.
+        """
+        log = self._file_id(LOG_FILE)
+        reload = (self._file_id(META_FILE) != self._snapshot_id
+                  or (log is None and self._log_id is not None)
+                  or (log is not None and self._log_id is not None
+                      and (log[0] != self._log_id or log[2] < self._log_offset)))
+        if not reload:
+            self._read_log()
+            return
+        local = self._log
+        self._reset()
+        self._load()
+        for op in local:
+            self._apply(op)
+        self._log = local
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": self.live_count,
+            "terms": len(self.term_list),
+            "postings": int(len(self.post_docs) + self.pending_postings),
+        }
+
+
+class KeywordIndexService:
+    """
+    Keyword indexes per collection, loaded lazily from KEYWORD_INDEX_PATH.
+    """
+
+    def __init__(self, path: str = "./keyword_index"):
+        self.path = path
+        self._indexes: Dict[str, KeywordIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, collection_name: str) -> KeywordIndex:
+        if not _COLLECTION_NAME.match(collection_name):
+            raise ValueError(f"Invalid collection name: {collection_name}")
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is None:
+                index = self._indexes[collection_name] = KeywordIndex(os.path.join(self.path, collection_name))
+            return index
+
+    async def search(self, collection_name: str, query: str, top_k: int) -> List[Tuple[str, float]]:
+        # Scoring a large index takes a few ms of numpy work; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.get(collection_name).search(query, top_k))
+
+    async def flush(self, collection_name: str):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.get(collection_name).flush)
+        finally:
+            search_cache.invalidate(collection_name)
+
+    def drop(self, collection_name: str):
+        with self._lock:
+            self._indexes.pop(collection_name, None)
+        directory = os.path.join(self.path, collection_name)
+        if _COLLECTION_NAME.match(collection_name) and os.path.isdir(directory):
+            shutil.rmtree(directory)
+        search_cache.invalidate(collection_name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            indexes = dict(self._indexes)
+        return {name: index.stats() for name, index in indexes.items()}
+
+
+# Singleton instance
+keyword_index_service = KeywordIndexService(path=settings.KEYWORD_INDEX_PATH)
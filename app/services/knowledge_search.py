@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document as LangchainDocument
+from app.core.config import settings
+from app.services.keyword_index import keyword_index_service
+from app.services.search_cache import search_cache
+from app.services.vector_service import vector_service
+
+SEARCH_MODES = ("vector", "keyword", "hybrid")
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def collection_name_for(kb_id) -> str:
+    # Milvus collection names can only contain numbers, letters and underscores
+    return f"kb_{str(kb_id).replace('-', '_')}"
+
+
+def to_similarity(score: float, metric_type: str) -> float:
+    """
+    Put dense scores on one scale (cosine similarity, higher is closer) so results
+    from IP and legacy L2 collections can be compared. Embeddings are unit
+    vectors, for which squared L2 distance d = 2 - 2 * cos.
+    """
+    if metric_type == "L2":
+        return 1.0 - score / 2.0
+    return score
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge ranked chunk_id lists: each list contributes 1 / (k + rank) per chunk.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def build_filter_expr(filters: Optional[Dict[str, Any]] = None, expr: Optional[str] = None) -> Optional[str]:
+    """
+    Milvus filter expression from metadata equality filters ({"source": "a.pdf",
+    "document_id": ["id1", "id2"]}, lists meaning "any of") and/or a raw expression.
+    """
+    clauses = []
+    for field, value in (filters or {}).items():
+        if not _FIELD_NAME.match(field):
+            raise ValueError(f"Invalid filter field: {field}")
+        if isinstance(value, (list, tuple)):
+            clauses.append(f"{field} in [{', '.join(_literal(v) for v in value)}]")
+        else:
+            clauses.append(f"{field} == {_literal(value)}")
+    if expr and expr.strip():
+        clauses.append(f"({expr.strip()})")
+    return " and ".join(clauses) or None
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, bool):
+        return "True" if value else "False"
+    if isinstance(value, (int, float, str)):
+        return json.dumps(value, ensure_ascii=False)
+    raise ValueError(f"Unsupported filter value: {value!r}")
+
+
+async def _keyword_documents(collection_name: str, chunk_ids: List[str],
+                             expr: Optional[str] = None) -> Dict[str, LangchainDocument]:
+    """
+    Fetch the text of keyword hits from the vector store (the keyword index only
+    keeps postings), keeping those that match `expr`.
+    """
+    if not chunk_ids:
+        return {}
+    query_expr = f"chunk_id in {json.dumps(chunk_ids, ensure_ascii=False)}"
+    if expr:
+        query_expr = f"{query_expr} and ({expr})"
+    rows = await vector_service.query(collection_name, query_expr)
+    documents = {}
+    for row in rows:
+        metadata = {key: value for key, value in row.items() if key not in ("text", "vector")}
+        documents[row.get("chunk_id")] = LangchainDocument(page_content=row.get("text", ""), metadata=metadata)
+    return documents
+
+
+async def search_knowledge(collection_name: str, query: str, top_k: int = 5, mode: str = "vector",
+                           score_threshold: Optional[float] = None,
+                           expr: Optional[str] = None) -> List[Tuple[LangchainDocument, float]]:
+    """
+    Search a knowledge base collection, through the search result cache.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    if not settings.SEARCH_CACHE_ENABLED:
+        return await _search_knowledge(collection_name, query, top_k, mode, score_threshold, expr)
+
+    key = search_cache.make_key(collection_name, query, top_k=top_k, mode=mode,
+                                score_threshold=score_threshold, expr=expr)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+    started = time.perf_counter()
+    results = await _search_knowledge(collection_name, query, top_k, mode, score_threshold, expr)
+    # Backends report failures as empty results; don't pin those
+    if results:
+        search_cache.put(key, results, time.perf_counter() - started)
+    return results
+
+
+async def _search_knowledge(collection_name: str, query: str, top_k: int, mode: str,
+                            score_threshold: Optional[float],
+                            expr: Optional[str]) -> List[Tuple[LangchainDocument, float]]:
+    """
+    Search a knowledge base collection.
+
+    - vector: dense similarity (score = cosine similarity)
+    - keyword: BM25 over the keyword index (score = BM25)
+    - hybrid: both, merged by reciprocal rank fusion (score = RRF), so exact
+      terms like product codes and error strings surface even when embeddings
+      miss them
+
+    `expr` filters every retriever: the vector engine applies it during search,
+    and keyword hits are resolved through it. `score_threshold` is in the units
+    of the retriever it applies to: cosine similarity for dense results (in
+    hybrid mode, the dense candidates), BM25 in keyword mode.
+    """
+    if mode == "vector":
+        results, metric_type = await asyncio.gather(
+            vector_service.search(collection_name, query, top_k=top_k, score_threshold=score_threshold, expr=expr),
+            vector_service.metric_type(collection_name)
+        )
+        return [(doc, to_similarity(score, metric_type)) for doc, score in results]
+
+    candidates = max(top_k, top_k * settings.HYBRID_CANDIDATE_MULTIPLIER)
+    if mode == "keyword":
+        # Filtered-out hits are dropped while resolving, so look a bit deeper
+        hits = await keyword_index_service.search(collection_name, query, candidates if expr else top_k)
+        if score_threshold is not None:
+            hits = [(chunk_id, score) for chunk_id, score in hits if score >= score_threshold]
+        documents = await _keyword_documents(collection_name, [chunk_id for chunk_id, _ in hits], expr)
+        return [(documents[chunk_id], score) for chunk_id, score in hits if chunk_id in documents][:top_k]
+
+    dense, sparse = await asyncio.gather(
+        vector_service.search(collection_name, query, top_k=candidates, score_threshold=score_threshold, expr=expr),
+        keyword_index_service.search(collection_name, query, candidates)
+    )
+    documents = {doc.metadata.get("chunk_id"): doc for doc, _ in dense}
+    sparse_ids = [chunk_id for chunk_id, _ in sparse]
+    if expr:
+        # Keyword candidates must pass the filter before they can take part in fusion
+        documents.update(await _keyword_documents(
+            collection_name, [chunk_id for chunk_id in sparse_ids if chunk_id not in documents], expr
+        ))
+        sparse_ids = [chunk_id for chunk_id in sparse_ids if chunk_id in documents]
+    fused = reciprocal_rank_fusion(
+        [[doc.metadata.get("chunk_id") for doc, _ in dense], sparse_ids],
+        k=settings.HYBRID_RRF_K
+    )[:top_k]
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in documents]
+    documents.update(await _keyword_documents(collection_name, missing))
+    return [(documents[chunk_id], score) for chunk_id, score in fused if chunk_id in documents]
+
+
+async def search_knowledge_bases(collection_names: List[str], query: str, top_k: int = 5, mode: str = "vector",
+                                 score_threshold: Optional[float] = None,
+                                 expr: Optional[str] = None) -> List[Tuple[LangchainDocument, float]]:
+    """
+    Search several collections concurrently and merge them into one global top-k.
+    Each hit's metadata gets the collection it came from. Scores are comparable
+    across collections: cosine similarity for vector, rank-based RRF for hybrid
+    (BM25 for keyword is only roughly so, as idf is per collection).
+    """
+    per_collection = await asyncio.gather(*[
+        search_knowledge(collection_name, query, top_k=top_k, mode=mode, score_threshold=score_threshold, expr=expr)
+        for collection_name in collection_names
+    ])
+    for collection_name, results in zip(collection_names, per_collection):
+        for doc, _ in results:
+            doc.metadata["collection"] = collection_name
+    return heapq.nlargest(top_k, (hit for results in per_collection for hit in results), key=lambda hit: hit[1])
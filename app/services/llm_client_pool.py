@@ -0,0 +1,130 @@
+import importlib.util
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from langchain_openai import ChatOpenAI
+from app.core.config import settings
+
+# HTTP/2 needs the optional 'h2' package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def normalize_base_url(endpoint: Optional[str]) -> Optional[str]:
+    """
+    ChatOpenAI appends /chat/completions itself, so strip it from stored endpoints.
+    """
+    base_url = endpoint
+    if base_url and base_url.endswith("/chat/completions"):
+        base_url = base_url.replace("/chat/completions", "")
+        # Also strip trailing slash if present after replacement
+        if base_url.endswith("/"):
+            base_url = base_url.rstrip("/")
+    return base_url
+
+
+class LLMClientPool:
+    """
+    Reuses ChatOpenAI instances and their underlying httpx connection pools.
+
+    One httpx.AsyncClient is kept per (endpoint, api_key) so every model served by
+    the same resource shares keep-alive (and HTTP/2, when available) connections.
+    Chat model wrappers are keyed by (endpoint, api_key, model, temperature) and
+    kept in a small LRU since they are cheap once the transport is shared.
+    """
+
+    def __init__(self, max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 60.0, timeout: float = 120.0,
+                 http2: bool = True, max_models: int = 64):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.max_models = max_models
+        self._http_clients: Dict[Tuple[Optional[str], Optional[str]], httpx.AsyncClient] = {}
+        self._models: "OrderedDict[Tuple, ChatOpenAI]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_http_client(self, base_url: Optional[str], api_key: Optional[str],
+                         max_connections: Optional[int] = None) -> httpx.AsyncClient:
+        key = (base_url, api_key)
+        client = self._http_clients.get(key)
+        if client is None or client.is_closed:
+            limit = max_connections or self.max_connections
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=limit,
+                    max_keepalive_connections=min(self.max_keepalive_connections, limit),
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+            self._http_clients[key] = client
+        return client
+
+    def get_chat_model(self, model: str, api_key: Optional[str], base_url: Optional[str],
+                       temperature: float, max_connections: Optional[int] = None) -> ChatOpenAI:
+        """
+        Return a pooled ChatOpenAI for these settings. max_connections overrides the
+        pool-wide limit for the resource (e.g. AiResource.config["max_connections"]);
+        it only applies when the resource's transport is first created.
+        """
+        key = (base_url, api_key, model, temperature)
+        llm = self._models.get(key)
+        if llm is not None:
+            self._models.move_to_end(key)
+            self.hits += 1
+            return llm
+
+        self.misses += 1
+        # Note: ChatOpenAI uses openai_api_key and openai_api_base params
+        llm = ChatOpenAI(
+            model=model,
+            openai_api_key=api_key,
+            openai_api_base=base_url,
+            temperature=temperature,
+            http_async_client=self._get_http_client(base_url, api_key, max_connections)
+        )
+        self._models[key] = llm
+        while len(self._models) > self.max_models:
+            self._models.popitem(last=False)
+        return llm
+
+    async def invalidate(self, base_url: Optional[str], api_key: Optional[str]):
+        """
+        Close the transport of a resource whose endpoint or credentials changed.
+        """
+        client = self._http_clients.pop((base_url, api_key), None)
+        for key in [k for k in self._models if k[0] == base_url and k[1] == api_key]:
+            del self._models[key]
+        if client is not None:
+            await client.aclose()
+
+    async def aclose(self):
+        clients = list(self._http_clients.values())
+        self._http_clients.clear()
+        self._models.clear()
+        for client in clients:
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http_clients": len(self._http_clients),
+            "models": len(self._models),
+            "hits": self.hits,
+            "misses": self.misses,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+        }
+
+
+# Singleton instance
+llm_client_pool = LLMClientPool(
+    max_connections=settings.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    timeout=settings.LLM_REQUEST_TIMEOUT,
+    http2=settings.LLM_HTTP2
+)
@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+
+# Cache modes accepted in node config (response_cache) and LLM_RESPONSE_CACHE
+CACHE_MODES = ("off", "exact", "semantic")
+
+
+def resolve_cache_mode(node_setting: Any) -> str:
+    """
+    Node config wins over the global default: True -> 'exact', False -> 'off'.
+    """
+    if node_setting is None or node_setting == "":
+        mode = settings.LLM_RESPONSE_CACHE
+    elif node_setting is True:
+        mode = "exact"
+    elif node_setting is False:
+        mode = "off"
+    else:
+        mode = str(node_setting).lower()
+    return mode if mode in CACHE_MODES else "off"
+
+
+class LLMResponseCache:
+    """
+    Opt-in cache of LLM completions.
+
+    - exact:    key is a hash of model, endpoint, messages and sampling params.
+                A size-bounded in-memory LRU is backed by an optional SQLite file
+                so hits survive restarts and are shared between workers.
+    - semantic: additionally embeds the user prompt (with vector_service's embedding
+                function) and serves a cached answer when a prompt with the same
+                model/system prompt/params is above the similarity threshold.
+
+    Only deterministic calls are cached (temperature <= max_temperature, 0 by
+    default); sampled answers would otherwise be replayed as if they were fixed.
+    """
+
+    def __init__(self, max_entries: int = 1000, sqlite_path: Optional[str] = None,
+                 ttl_seconds: float = 0, semantic_threshold: float = 0.95,
+                 semantic_max_entries: int = 1000, max_temperature: float = 0.0):
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+        self.sqlite_path = sqlite_path
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.semantic_max_entries = semantic_max_entries
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # scope -> (float32 matrix of unit vectors, one row per key, keys);
+        # scope = everything but the user prompt. One matmul scores a whole scope.
+        self._semantic: Dict[str, Tuple[np.ndarray, List[str]]] = {}
+        self._semantic_size = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.stats_counters = {"exact_hits": 0, "sqlite_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+
+    def is_cacheable(self, temperature: Any) -> bool:
+        try:
+            return float(temperature) <= self.max_temperature
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def make_key(model: str, base_url: Optional[str], messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"model": model, "base_url": base_url, "messages": messages, "params": params},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_scope(model: str, base_url: Optional[str], system_prompt: str, params: Dict[str, Any]) -> str:
+        return LLMResponseCache.make_key(model, base_url, [{"role": "system", "content": system_prompt}], params)
+
+    # --- exact tier ---
+
+    async def get(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        Return (cached value, tier) where tier is 'memory' or 'sqlite'.
+        """
+        cached = await self._lookup(key)
+        if cached is not None:
+            self.stats_counters["exact_hits" if cached[1] == "memory" else "sqlite_hits"] += 1
+        return cached
+
+    async def _lookup(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        entry = self._memory.get(key)
+        if entry is not None and not self._expired(entry[0]):
+            self._memory.move_to_end(key)
+            return entry[1], "memory"
+
+        if self.sqlite_path:
+            row = await asyncio.to_thread(self._sqlite_get, key)
+            if row is not None and not self._expired(row[0]):
+                value = json.loads(row[1])
+                self._remember(key, value, created_at=row[0])
+                return value, "sqlite"
+        return None
+
+    async def put(self, key: str, value: Dict[str, Any]):
+        created_at = time.time()
+        self._remember(key, value, created_at)
+        self.stats_counters["stores"] += 1
+        if self.sqlite_path:
+            await asyncio.to_thread(self._sqlite_put, key, value, created_at)
+
+    def record_miss(self):
+        self.stats_counters["misses"] += 1
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and (time.time() - created_at) > self.ttl_seconds
+
+    def _remember(self, key: str, value: Dict[str, Any], created_at: float):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_response_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _sqlite_get(self, key: str):
+        with self._db_lock:
+            cur = self._connect().execute("SELECT created_at, value FROM llm_response_cache WHERE key = ?", (key,))
+            return cur.fetchone()
+
+    def _sqlite_put(self, key: str, value: Dict[str, Any], created_at: float):
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), created_at)
+            )
+            db.commit()
+
+    # --- semantic tier ---
+
+    async def _embed(self, text: str) -> np.ndarray:
+        # Imported lazily: vector_service pulls in the vector store stack
+        from app.services.vector_service import vector_service
+        vector = np.asarray(await vector_service.embed_query(text), dtype=np.float32)
+        norm = float(np.linalg.norm(vector)) or 1.0
+        return vector / norm
+
+    async def get_semantic(self, scope: str, prompt: str) -> Tuple[Optional[Dict[str, Any]], float, np.ndarray]:
+        """
+        Return (cached value, similarity, prompt vector) for the closest prompt in scope,
+        or (None, best similarity, prompt vector) below the threshold.
+        The vector is handed back so a later put_semantic doesn't embed twice.
+        """
+        vector = await self._embed(prompt)
+        best_key, best_score = self.closest(scope, vector)
+
+        if best_key is not None and best_score >= self.semantic_threshold:
+            cached = await self._lookup(best_key)
+            if cached is not None:
+                self.stats_counters["semantic_hits"] += 1
+                return cached[0], best_score, vector
+        return None, best_score, vector
+
+    def closest(self, scope: str, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        entries = self._semantic.get(scope)
+        if entries is None or entries[0].shape[1] != len(vector):
+            return None, -1.0
+        scores = entries[0] @ vector
+        best = int(np.argmax(scores))
+        return entries[1][best], float(scores[best])
+
+    def put_semantic(self, scope: str, vector: np.ndarray, key: str):
+        row = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        entries = self._semantic.get(scope)
+        if entries is None or entries[0].shape[1] != row.shape[1]:
+            # New scope (or the embedding model changed size): start over
+            self._semantic_size -= len(entries[1]) if entries else 0
+            entries = (np.empty((0, row.shape[1]), dtype=np.float32), [])
+        self._semantic[scope] = (np.vstack([entries[0], row]), entries[1] + [key])
+        self._semantic_size += 1
+        # Evict oldest vectors from the largest scope once over budget
+        while self._semantic_size > self.semantic_max_entries:
+            largest = max(self._semantic, key=lambda s: len(self._semantic[s][1]))
+            matrix, keys = self._semantic[largest]
+            self._semantic_size -= 1
+            if len(keys) <= 1:
+                del self._semantic[largest]
+            else:
+                self._semantic[largest] = (matrix[1:], keys[1:])
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.stats_counters["exact_hits"] + self.stats_counters["sqlite_hits"] + self.stats_counters["semantic_hits"]
+        lookups = hits + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "memory_entries": len(self._memory),
+            "semantic_entries": self._semantic_size,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "sqlite_enabled": bool(self.sqlite_path),
+        }
+
+
+# Singleton instance
+llm_response_cache = LLMResponseCache(
+    max_entries=settings.LLM_RESPONSE_CACHE_MAX_ENTRIES,
+    sqlite_path=settings.LLM_RESPONSE_CACHE_SQLITE_PATH or None,
+    ttl_seconds=settings.LLM_RESPONSE_CACHE_TTL_SECONDS,
+    semantic_threshold=settings.LLM_SEMANTIC_CACHE_THRESHOLD,
+    semantic_max_entries=settings.LLM_SEMANTIC_CACHE_MAX_ENTRIES,
+    max_temperature=settings.LLM_RESPONSE_CACHE_MAX_TEMPERATURE
+)
@@ -0,0 +1,291 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_community.vectorstores import Milvus
+from langchain_core.documents import Document as LangchainDocument
+from langchain_core.embeddings import Embeddings
+from pymilvus import DataType, connections, utility
+from app.services.vector_backend import VectorBackend
+
+
+class MilvusBackend(VectorBackend):
+    """
+    Milvus server backend (docker-compose-milvus.yml), through LangChain's Milvus
+    wrapper for inserts and search and pymilvus for scalar queries and deletes.
+    """
+
+    name = "milvus"
+
+    def __init__(self, embedding_function: Embeddings):
+        super().__init__(embedding_function)
+        self.milvus_host = os.getenv("MILVUS_HOST", "127.0.0.1")
+        self.milvus_port = os.getenv("MILVUS_PORT", "19530")
+        
+        # Connect to Milvus globally for utility functions
+        try:
+            connections.connect(alias="default", host=self.milvus_host, port=self.milvus_port)
+            print(f"Connected to Milvus at {self.milvus_host}:{self.milvus_port}")
+        except Exception as e:
+            print(f"Failed to connect to Milvus: {e}")
+
+        # collection name -> {"store": Milvus wrapper, "metric_type", "loaded"}
+        self._handles: Dict[str, Dict[str, Any]] = {}
+        self._handles_lock = threading.Lock()
+        self.handle_hits = 0
+        self.handle_misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_collections": len(self._handles),
+            "handle_hits": self.handle_hits,
+            "handle_misses": self.handle_misses,
+        }
+
+    def _resolve_metric_type(self, collection_name: str) -> Tuple[bool, str]:
+        """
+        Return (exists, metric_type). Collections created before the switch to IP
+        were indexed with L2, and searching them with IP params fails with
+        "metric type not match", so the index's own metric type is used.
+        """
+        from pymilvus import Collection
+        from pymilvus.exceptions import SchemaNotReadyException
+        
+        try:
+            col = Collection(collection_name)
+        except SchemaNotReadyException:
+            return False, "IP"  # Default for new collections
+        
+        metric_type = "IP"
+        try:
+            for idx in col.indexes:
+                # idx.params is a dict
+                m_type = idx.params.get("metric_type")
+                if m_type:
+                    metric_type = m_type
+                    break
+        except Exception as e:
+            print(f"Error checking index metric type: {e}")
+        return True, metric_type
+
+    def get_collection(self, collection_name: str) -> Milvus:
+        """
+        Return the LangChain wrapper for a collection. Wrappers (and the metric type
+        they were built with) are cached per collection: building one costs several
+        RPCs (existence, schema, index description, load).
+        """
+        entry = self._handles.get(collection_name)
+        # A wrapper built before its collection existed has no collection bound;
+        # rebuild it in case the collection has been created since.
+        if entry is not None and entry["store"].col is not None:
+            self.handle_hits += 1
+            return entry["store"]
+        self.invalidate_collection(collection_name)
+        
+        exists, metric_type = self._resolve_metric_type(collection_name)
+        
+        index_params = {
+            "metric_type": metric_type,
+            "index_type": "HNSW",
+            "params": {"M": 8, "efConstruction": 64}
+        }
+        search_params = {
+            "metric_type": metric_type, 
+            "params": {"ef": 64}
+        }
+
+        store = Milvus(
+            embedding_function=self.embedding_function,
+            collection_name=collection_name,
+            connection_args={"host": self.milvus_host, "port": self.milvus_port},
+            auto_id=True,
+            drop_old=False,
+            index_params=index_params,
+            search_params=search_params
+        )
+        self.handle_misses += 1
+        with self._handles_lock:
+            # The wrapper loads existing collections on init
+            entry = self._handles.setdefault(collection_name, {
+                "store": store,
+                "metric_type": metric_type,
+                "loaded": exists
+            })
+        return entry["store"]
+
+    def _get_pymilvus_collection(self, collection_name: str):
+        """
+        The pymilvus Collection behind a cached wrapper, loaded once.
+        None if the collection doesn't exist (yet).
+        """
+        col = self.get_collection(collection_name).col
+        if col is None:
+            return None
+        entry = self._handles.get(collection_name)
+        if entry is not None and not entry["loaded"]:
+            col.load()
+            entry["loaded"] = True
+        return col
+
+    def invalidate_collection(self, collection_name: str):
+        with self._handles_lock:
+            self._handles.pop(collection_name, None)
+
+    def prepare_collection(self, collection_name: str):
+        # Legacy L2 collections are dropped so the first insert recreates them with IP
+        self.get_collection(collection_name)
+        if self._handles.get(collection_name, {}).get("metric_type") == "L2":
+            try:
+                print(f"Collection {collection_name} is using L2. Dropping to recreate with IP.")
+                self.invalidate_collection(collection_name)
+                utility.drop_collection(collection_name)
+            except Exception as e:
+                print(f"Error checking/dropping collection for reindex: {e}")
+
+    def add_texts(self, collection_name: str, texts: List[str], metadatas: List[Dict[str, Any]]):
+        # The wrapper creates the collection (schema from the metadata keys) on first insert
+        vector_store = self.get_collection(collection_name)
+        vector_store.add_texts(texts=texts, metadatas=metadatas)
+
+    def search(self, collection_name: str, query: str, top_k: int, expr: Optional[str] = None,
+               score_threshold: Optional[float] = None) -> List[Tuple[LangchainDocument, float]]:
+        vector_store = self.get_collection(collection_name)
+
+        # Scores are raw: similarity for IP (higher is closer), squared distance for
+        # legacy L2 collections (lower is closer); callers normalize via metric_type.
+        # Filters go to Milvus as `expr`, and a threshold becomes a range search
+        # (`radius`), so rows that would be discarded never leave the server.
+        param = None
+        if score_threshold is not None:
+            metric_type = self._handles.get(collection_name, {}).get("metric_type", "IP")
+            # IP keeps scores above the radius, L2 distances below it (d = 2 - 2 * cos)
+            radius = 2.0 - 2.0 * score_threshold if metric_type == "L2" else score_threshold
+            param = {"metric_type": metric_type, "params": {"ef": max(64, top_k), "radius": radius}}
+
+        try:
+            return vector_store.similarity_search_with_score(query, k=top_k, param=param, expr=expr)
+        except Exception as e:
+            print(f"Search failed: {e}")
+            # The handle may be stale (collection dropped/recreated elsewhere)
+            self.invalidate_collection(collection_name)
+            return []
+
+    def metric_type(self, collection_name: str) -> str:
+        # Resolved (and cached) with the collection handle: legacy collections are L2
+        self.get_collection(collection_name)
+        return self._handles.get(collection_name, {}).get("metric_type", "IP")
+
+    def query(self, collection_name: str, expr: str) -> List[Dict[str, Any]]:
+        try:
+            # Cached handle; the collection is loaded into memory once, not per query
+            col = self._get_pymilvus_collection(collection_name)
+            if col is None:
+                return []
+            
+            # Query
+            # We need to return output fields. 'text' is where LangChain stores content usually.
+            # And metadata fields.
+            res = col.query(
+                expr=expr, 
+                output_fields=["text", "source", "document_id", "chunk_id", "pk"]
+            )
+            
+            return res
+        except Exception as e:
+            print(f"Query failed: {e}")
+            self.invalidate_collection(collection_name)
+            return []
+
+    def delete(self, collection_name: str, expr: str):
+        try:
+            col = self._get_pymilvus_collection(collection_name)
+            if col is None:
+                return
+            
+            col.delete(expr)
+            print(f"Deleted vectors in {collection_name} matching {expr}")
+        except Exception as e:
+            print(f"Error deleting vectors: {e}")
+
+    def _field_names(self, collection_name: str, col) -> Dict[str, Any]:
+        """
+        Primary, vector and text field names plus all fields of a collection, read
+        from the pymilvus schema. The text field is LangChain's (private)
+        `_text_field`, falling back to its default when the wrapper lacks it.
+        """
+        store = self.get_collection(collection_name)
+        schema_fields = col.schema.fields
+        primary = next((f.name for f in schema_fields if f.is_primary),
+                       getattr(store, "_primary_field", "pk"))
+        vector = next((f.name for f in schema_fields if f.dtype == DataType.FLOAT_VECTOR),
+                      getattr(store, "_vector_field", "vector"))
+        return {
+            "primary": primary,
+            "vector": vector,
+            "text": getattr(store, "_text_field", "text"),
+            "all": [f.name for f in schema_fields],
+        }
+
+    def get_chunk_index(self, collection_name: str, document_id: str) -> Optional[List[Dict[str, Any]]]:
+        col = self._get_pymilvus_collection(collection_name)
+        if col is None or self._handles.get(collection_name, {}).get("metric_type") == "L2":
+            return None
+        fields = self._field_names(collection_name, col)
+        if "content_hash" not in fields["all"]:
+            return None
+
+        rows = []
+        iterator = col.query_iterator(
+            batch_size=1000,
+            expr=f'document_id == "{document_id}"',
+            output_fields=[fields["primary"], "chunk_id", "content_hash"]
+        )
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                rows.extend(batch)
+        finally:
+            iterator.close()
+        # Callers address chunks as "pk" whatever the primary field is called
+        return [{**row, "pk": row[fields["primary"]]} for row in rows]
+
+    def move_chunks(self, collection_name: str, pks: List[int], texts: List[str],
+                    metadatas: List[Dict[str, Any]]):
+        col = self._get_pymilvus_collection(collection_name)
+        fields = self._field_names(collection_name, col)
+        primary, vector, text_field = fields["primary"], fields["vector"], fields["text"]
+        stored = col.query(
+            expr=f"{primary} in {list(pks)}",
+            output_fields=[primary, vector]
+        )
+        vectors = {row[primary]: row[vector] for row in stored}
+
+        rows = []
+        for pk, text, metadata in zip(pks, texts, metadatas):
+            row = {
+                field: metadata.get(field) for field in fields["all"]
+                if field not in (primary, text_field, vector)
+            }
+            row[text_field] = text
+            row[vector] = vectors[pk]
+            rows.append(row)
+        col.insert(rows)
+        col.delete(f"{primary} in {list(pks)}")
+
+    def delete_chunks(self, collection_name: str, pks: List[int]):
+        col = self._get_pymilvus_collection(collection_name)
+        if col is None:
+            return
+        primary = self._field_names(collection_name, col)["primary"]
+        for i in range(0, len(pks), 1000):
+            col.delete(f"{primary} in {list(pks[i:i + 1000])}")
+
+    def delete_collection(self, collection_name: str):
+        self.invalidate_collection(collection_name)
+        try:
+            if utility.has_collection(collection_name):
+                utility.drop_collection(collection_name)
+                print(f"Dropped collection {collection_name}")
+        except Exception as e:
+            print(f"Error deleting collection {collection_name}: {e}")
@@ -1,8 +1,91 @@
 from minio import Minio
 from minio.error import S3Error
 from app.core.config import settings
+import asyncio
 import io
 import os
+import queue
+
+# Smallest part S3/MinIO accepts for multipart uploads
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class StreamingUpload:
+    """
+    Multipart upload fed incrementally from async code.
+
+    put_object runs in a worker thread and reads from a small bounded queue, so
+    only about one part is held in memory no matter how large the object gets.
+    Call write() for each piece, then finish(); abort() cancels the upload.
+    """
+
+    def __init__(self, service: "MinioService", object_name: str, content_type: str,
+                 part_size: int = MIN_PART_SIZE, max_pending: int = 8):
+        self.object_name = object_name
+        self.size = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._pending = bytearray()
+        self._buffer = bytearray()
+        self._flush_size = 256 * 1024
+        self._eof = False
+        loop = asyncio.get_running_loop()
+        self._future = loop.run_in_executor(
+            None,
+            lambda: service.upload_stream(self, object_name, -1, content_type=content_type, part_size=part_size)
+        )
+
+    # Called by put_object in the worker thread
+    def read(self, size: int = -1) -> bytes:
+        while not self._pending and not self._eof:
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                self._pending += item
+        if size < 0:
+            size = len(self._pending)
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        return data
+
+    async def _put(self, item):
+        while True:
+            if self._future.done():
+                # Upload failed; surface its error to the producer
+                self._future.result()
+                raise RuntimeError(f"Upload of {self.object_name} stopped early")
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.01)
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        self._buffer += data
+        if len(self._buffer) >= self._flush_size:
+            await self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+    async def finish(self):
+        if self._buffer:
+            await self._put(bytes(self._buffer))
+            self._buffer.clear()
+        await self._put(None)
+        await self._future
+
+    async def abort(self, error: BaseException = None):
+        if self._future.done():
+            return
+        try:
+            await self._put(error or RuntimeError("Upload aborted"))
+        except Exception:
+            pass
+        # put_object aborts the multipart upload when read() raises
+        await asyncio.gather(self._future, return_exceptions=True)
+
 
 class MinioService:
     def __init__(self):
@@ -24,15 +107,24 @@ class MinioService:
         if not self.client.bucket_exists(self.bucket):
             self.client.make_bucket(self.bucket)
 
-    def upload_stream(self, stream, object_name: str, length: int, content_type: str = "application/octet-stream"):
+    def upload_stream(self, stream, object_name: str, length: int, content_type: str = "application/octet-stream",
+                      part_size: int = 0):
+        # length=-1 uploads a stream of unknown size in part_size parts
         self._ensure_bucket()
         self.client.put_object(
             self.bucket,
             object_name,
             stream,
             length,
-            content_type=content_type
+            content_type=content_type,
+            part_size=part_size
         )
+
+    def open_stream_upload(self, object_name: str, content_type: str = "application/octet-stream") -> StreamingUpload:
+        """
+        Start a streaming upload; must be called from a running event loop.
+        """
+        return StreamingUpload(self, object_name, content_type)
     
     def upload_file(self, file_path: str, object_name: str, content_type: str = "application/octet-stream"):
         self._ensure_bucket()
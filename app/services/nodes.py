@@ -1,11 +1,15 @@
 from typing import Dict, Any, Optional
 import re
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_openai import ChatOpenAI
 from app.services.state import AgentState
-from app.services.vector_service import vector_service
-from app.services.ai_resource_service import AiResourceService
+from app.services.knowledge_search import search_knowledge_bases, collection_name_for, build_filter_expr
+from app.services.condition_compiler import compile_condition
+from app.services.template_engine import compile_template
+from app.services.llm_client_pool import llm_client_pool, normalize_base_url
+from app.services.ai_resource_registry import ai_resource_registry
+from app.services.llm_response_cache import llm_response_cache, resolve_cache_mode
 from app.core.database import get_session
+from app.core.config import settings
 from datetime import datetime
 # Note: We need a way to access DB session inside node functions.
 # Since nodes are stateless functions, we usually pass session in state or config.
@@ -23,92 +27,47 @@ from datetime import datetime
 from app.core.database import async_session_factory
 
 async def get_llm_config(model_name: str):
-    async with async_session_factory() as session:
-        service = AiResourceService(session)
-        # Try to find resource with this name
-        resource = await service.get_resource_by_name(model_name, type_filter="text_llm")
-        if resource:
-            return {
-                "api_key": resource.api_key,
-                "base_url": resource.endpoint,
-                "model": model_name # Or resource specific model name if stored in config
-            }
-        return None
+    # Served from the in-memory registry; no DB round trip on the hot path
+    resource = await ai_resource_registry.get_by_name(model_name, type_filter="text_llm")
+    if resource:
+        return {
+            "api_key": resource.api_key,
+            "base_url": resource.endpoint,
+            "model": model_name, # Or resource specific model name if stored in config
+            "max_connections": (resource.config or {}).get("max_connections")
+        }
+    return None
 
 # Helper to resolve variables like {{node_id.key}}
 def resolve_variables(text: str, state: AgentState) -> str:
     if not text or not isinstance(text, str):
         return text
     
-    node_outputs = state.get("node_outputs", {})
-    
-    def replace_match(match):
-        # match group 1 is the content inside {{ }}
-        var_path = match.group(1).strip()
-        parts = var_path.split('.')
-        
-        # Handle {{start-node.input}} specifically if user input is stored directly
-        # or handle general structure
-        
-        node_id = parts[0]
-        
-        # Check if node exists in outputs
-        if node_id in node_outputs:
-            current_data = node_outputs[node_id]
-            
-            # Navigate through parts
-            if len(parts) > 1:
-                keys = parts[1:]
-                for key in keys:
-                    if isinstance(current_data, dict):
-                        current_data = current_data.get(key, "")
-                        if current_data == "": # Key not found or empty
-                             break
-                    else:
-                        current_data = ""
-                        break
-                
-                val = current_data
-                if isinstance(val, (dict, list)):
-                    import json
-                    return json.dumps(val, ensure_ascii=False)
-                return str(val)
-            else:
-                if isinstance(current_data, (dict, list)):
-                     import json
-                     return json.dumps(current_data, ensure_ascii=False)
-                return str(current_data)
-        
-        return match.group(0)
-
-    return re.sub(r'\{\{(.*?)\}\}', replace_match, text)
+    # Templates are split into segments once (WorkflowBuilder.build warms the cache);
+    # dict/list outputs are serialized once per run when a render memo is active.
+    return compile_template(text).render(state.get("node_outputs", {}))
 
 # Helper to update state with node output
 # We also append a trace log to 'trace_logs' key in state if available
-def update_node_output(state: AgentState, node_id: str, output: Any, inputs: Optional[Dict[str, Any]] = None):
-    outputs = state.get("node_outputs", {}).copy()
-    outputs[node_id] = output
-    
-    # Trace log logic
-    trace_logs = state.get("trace_logs", [])
-    if trace_logs is None:
-        trace_logs = []
-        
-    # Append new log
-    # LangGraph state updates are merges, so we need to return the new list
-    # Annotated[List, operator.add] means we should return a list to be appended
-    # But here we are manually managing the list if we return the full list.
-    # Wait, in state.py: trace_logs: Annotated[List[Dict[str, Any]], operator.add]
-    # This means we should return a LIST of new items to be added.
-    
+def update_node_output(state: AgentState, node_id: str, output: Any, inputs: Optional[Dict[str, Any]] = None,
+                       trace_extra: Optional[Dict[str, Any]] = None):
+    # Only this node's entry is returned; the merge reducer on AgentState.node_outputs
+    # adds it to the run's outputs, so nothing is copied here.
+    # trace_logs is Annotated[List, operator.add], so we return a LIST of new items.
     new_log = {
         "node_id": node_id,
         "inputs": inputs,
-        "output": output,
         "timestamp": str(datetime.now())
     }
+    if settings.TRACE_MODE == "slim":
+        # The output already lives in node_outputs; reference it instead of duplicating it
+        new_log["output_ref"] = node_id
+    else:
+        new_log["output"] = output
+    if trace_extra:
+        new_log.update(trace_extra)
     
-    return {"node_outputs": outputs, "current_node": node_id, "trace_logs": [new_log]}
+    return {"node_outputs": {node_id: output}, "current_node": node_id, "trace_logs": [new_log]}
 
 async def llm_node(state: AgentState, config: Dict[str, Any], node_id: str):
     print(f"Executing LLM Node {node_id} with config: {config}")
@@ -135,17 +94,11 @@ async def llm_node(state: AgentState, config: Dict[str, Any], node_id: str):
     if not model_name:
         # Try to find default resource from DB
         try:
-            async with async_session_factory() as session:
-                from app.models.ai_resource import AiResource
-                from sqlmodel import select
-                
-                # Look for default text_llm
-                stmt = select(AiResource).where(AiResource.type == "text_llm", AiResource.is_default == True)
-                result = await session.execute(stmt)
-                default_res = result.scalars().first()
-                if default_res:
-                    model_name = default_res.name
-                    print(f"Using default system model: {model_name}")
+            # Look for default text_llm
+            default_res = await ai_resource_registry.get_default("text_llm")
+            if default_res:
+                model_name = default_res.name
+                print(f"Using default system model: {model_name}")
         except Exception as e:
             print(f"Error fetching default model: {e}")
 
@@ -160,38 +113,83 @@ async def llm_node(state: AgentState, config: Dict[str, Any], node_id: str):
     
     api_key = None
     base_url = None
+    max_connections = None
     
     if resource_config:
         print(f"Using AI Resource: {model_name}")
         api_key = resource_config.get("api_key")
-        base_url = resource_config.get("base_url")
+        max_connections = resource_config.get("max_connections")
         
         # Sanitize base_url for ChatOpenAI which appends /chat/completions automatically
-        if base_url and base_url.endswith("/chat/completions"):
-            base_url = base_url.replace("/chat/completions", "")
-            # Also strip trailing slash if present after replacement
-            if base_url.endswith("/"):
-                base_url = base_url.rstrip("/")
+        base_url = normalize_base_url(resource_config.get("base_url"))
     else:
         # Fallback to env vars
         print(f"AI Resource {model_name} not found. Falling back to environment variables.")
         api_key = os.getenv("OPENAI_API_KEY")
         base_url = os.getenv("OPENAI_API_BASE")
 
+    message_dicts = [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user",
+            "content": resolved_prompt
+        }
+    ]
+    
+    # Opt-in response cache (node config 'response_cache' or LLM_RESPONSE_CACHE)
+    cache_mode = resolve_cache_mode(config.get("response_cache"))
+    cache_key = None
+    cache_info = None
+    cached_value = None
+    semantic_scope = None
+    prompt_vector = None
+    if api_key and cache_mode != "off" and not llm_response_cache.is_cacheable(temperature):
+        # Sampled (temperature > 0) answers are not cached
+        cache_info = {"hit": False, "mode": cache_mode, "skipped": "temperature"}
+    elif api_key and cache_mode != "off":
+        cache_params = {"temperature": temperature}
+        cache_key = llm_response_cache.make_key(model_name, base_url, message_dicts, cache_params)
+        cached = await llm_response_cache.get(cache_key)
+        if cached:
+            cached_value = cached[0]
+            cache_info = {"hit": True, "tier": cached[1]}
+        elif cache_mode == "semantic":
+            semantic_scope = llm_response_cache.make_scope(model_name, base_url, system_prompt, cache_params)
+            try:
+                cached_value, similarity, prompt_vector = await llm_response_cache.get_semantic(semantic_scope, resolved_prompt)
+                if cached_value is not None:
+                    cache_info = {"hit": True, "tier": "semantic", "similarity": round(similarity, 4)}
+            except Exception as e:
+                print(f"Semantic cache lookup failed: {e}")
+        if cached_value is None:
+            llm_response_cache.record_miss()
+            cache_info = {"hit": False, "mode": cache_mode}
+
     if not api_key:
         print("OPENAI_API_KEY not found. Using Mock LLM response.")
         response_content = f"Mock LLM Response for prompt: {resolved_prompt[:50]}..."
         response = AIMessage(content=response_content)
         token_usage = {"total_tokens": 100}
         error_details = None
+    elif cached_value is not None:
+        print(f"LLM response cache hit ({cache_info['tier']}) for node {node_id}")
+        response_content = cached_value["text"]
+        response = AIMessage(content=response_content)
+        # No tokens were spent; keep the original usage for reference
+        token_usage = {**(cached_value.get("usage") or {}), "cache_hit": True, "cache_tier": cache_info["tier"]}
+        error_details = None
     else:
         try:
-            # Note: ChatOpenAI uses openai_api_key and openai_api_base params
-            llm = ChatOpenAI(
+            # Pooled client: reuses the resource's keep-alive connections across runs
+            llm = llm_client_pool.get_chat_model(
                 model=model_name,
-                openai_api_key=api_key,
-                openai_api_base=base_url,
-                temperature=temperature
+                api_key=api_key,
+                base_url=base_url,
+                temperature=temperature,
+                max_connections=max_connections
             )
             
             messages = [
@@ -212,6 +210,11 @@ async def llm_node(state: AgentState, config: Dict[str, Any], node_id: str):
             response_content = response.content
             token_usage = response.response_metadata.get("token_usage", {})
             error_details = None
+            
+            if cache_key:
+                await llm_response_cache.put(cache_key, {"text": response_content, "usage": token_usage})
+                if prompt_vector is not None:
+                    llm_response_cache.put_semantic(semantic_scope, prompt_vector, cache_key)
         except Exception as e:
              import traceback
              error_trace = traceback.format_exc()
@@ -241,22 +244,14 @@ async def llm_node(state: AgentState, config: Dict[str, Any], node_id: str):
     inputs = {
         "model": model_name,
         "api_endpoint": base_url, # Add endpoint info
-        "messages": [
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user",
-                "content": resolved_prompt
-            }
-        ],
+        "messages": message_dicts,
         "temperature": temperature
     }
     
     # Update messages log
     return {
-        **update_node_output(state, node_id, output, inputs=inputs),
+        **update_node_output(state, node_id, output, inputs=inputs,
+                             trace_extra={"cache": cache_info} if cache_info else None),
         "messages": [response]
     }
 
@@ -280,12 +275,29 @@ async def knowledge_node(state: AgentState, config: Dict[str, Any], node_id: str
     # Default to start node rawQuery if not specified? 
     # Better to rely on explicit config.
     
-    kb_id = config.get('knowledge_id')
-    if kb_id:
-        # Search in vector store
-        # We use the kb_id as collection name (or map it)
-        # Assuming kb_id is the collection name for simplicity
-        results = await vector_service.search(kb_id, query)
+    # One knowledge base or several (knowledge_ids / a list); several are searched
+    # concurrently and merged into one top-k
+    kb_ids = config.get('knowledge_ids') or config.get('knowledge_id') or config.get('knowledge_base_id') or []
+    if isinstance(kb_ids, str):
+        kb_ids = [kb_ids]
+    if kb_ids:
+        # The studio stores knowledge base ids; map them to their collections
+        # (ids that are already collection names are used as is)
+        collection_names = list(dict.fromkeys(
+            str(kb_id) if str(kb_id).startswith("kb_") else collection_name_for(kb_id)
+            for kb_id in kb_ids
+        ))
+        # Filters and the threshold are applied inside the vector engine, so the
+        # node only receives chunks it keeps
+        score_threshold = config.get('score_threshold')
+        results = await search_knowledge_bases(
+            collection_names,
+            query,
+            top_k=int(config.get('top_k') or 5),
+            mode=config.get('search_mode') or settings.KNOWLEDGE_SEARCH_MODE,
+            score_threshold=float(score_threshold) if score_threshold not in (None, "") else None,
+            expr=build_filter_expr(config.get('filters'), config.get('filter_expr'))
+        )
         chunks = [
             {"content": doc.page_content, "score": score, "metadata": doc.metadata} 
             for doc, score in results
@@ -314,6 +326,18 @@ async def start_node(state: AgentState, config: Dict[str, Any], node_id: str):
     
     return update_node_output(state, node_id, output)
 
+async def condition_node(state: AgentState, config: Dict[str, Any], node_id: str):
+    print(f"Executing Condition Node {node_id}")
+    # Routing itself happens on the outgoing edges; the node exposes the result of
+    # its own expression so edges can branch on {{node_id.result}}.
+    expr = config.get('condition')
+    if not expr:
+        return {"current_node": node_id}
+    
+    # compile_condition is memoized, and WorkflowBuilder compiles it at build time
+    result = compile_condition(expr)(state.get("node_outputs", {}))
+    return update_node_output(state, node_id, {"result": result}, inputs={"condition": expr})
+
 async def end_node(state: AgentState, config: Dict[str, Any], node_id: str):
     print(f"Executing End Node {node_id}")
     # End node might aggregate outputs?
@@ -326,5 +350,6 @@ NODE_REGISTRY = {
     "knowledge": knowledge_node,
     "start": start_node,
     "end": end_node,
+    "condition": condition_node,
     "common": llm_node # Fallback
 }
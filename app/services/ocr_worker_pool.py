@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+import json
+import os
+import shlex
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+WORKER_SCRIPT = "scripts/paddleocr_worker.py"
+
+# Worker stdout lines carry whole documents as markdown
+STREAM_LIMIT = 64 * 1024 * 1024
+
+
+class OCRWorkerError(Exception):
+    pass
+
+
+class _OCRWorker:
+    def __init__(self, command: List[str]):
+        self.command = command
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.jobs = 0
+        self._ids = itertools.count(1)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, timeout: float):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            # PaddleOCR logs go to the API's stderr
+            stderr=None,
+            limit=STREAM_LIMIT
+        )
+        hello = await self._read(timeout)
+        if hello.get("status") != "ready":
+            await self.kill()
+            raise OCRWorkerError(hello.get("message", "OCR worker failed to start"))
+
+    async def request(self, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        request_id = next(self._ids)
+        self.process.stdin.write((json.dumps({**payload, "id": request_id}, ensure_ascii=False) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+        response = await self._read(timeout)
+        if response.get("id") != request_id:
+            raise OCRWorkerError("OCR worker protocol out of sync")
+        return response
+
+    async def _read(self, timeout: float) -> Dict[str, Any]:
+        line = await asyncio.wait_for(self.process.stdout.readline(), timeout=timeout)
+        if not line:
+            raise OCRWorkerError("OCR worker exited unexpectedly")
+        return json.loads(line.decode("utf-8"))
+
+    def terminate(self):
+        """
+        Kill without waiting (safe in cleanup paths that may themselves be
+        cancelled); asyncio's child watcher reaps the process.
+        """
+        if self.alive:
+            self.process.kill()
+
+    async def kill(self):
+        if self.alive:
+            self.process.kill()
+            await self.process.wait()
+
+
+class OCRWorkerPool:
+    """
+    Pool of long-lived PaddleOCR worker processes (scripts/paddleocr_worker.py).
+
+    Each worker imports PaddleOCR and builds its pipeline once, then serves jobs
+    over stdin/stdout, so a document no longer pays for conda activation, Python
+    startup and pipeline construction. Workers are started lazily up to `size`,
+    replaced when they die, time out or have served `max_jobs` jobs.
+
+    A job that doesn't complete normally (error, timeout or cancellation, e.g. when
+    pdf_parallel abandons the remaining page ranges) kills its worker without
+    waiting for the reply, since the stdin/stdout protocol is out of sync, and
+    frees the slot. Waiting for a worker is bounded by `acquire_timeout`.
+    """
+
+    def __init__(self, size: int = 1, job_timeout: float = 600, startup_timeout: float = 300,
+                 max_jobs: int = 200, acquire_timeout: float = 1800):
+        self.size = max(1, size)
+        self.job_timeout = job_timeout
+        self.startup_timeout = startup_timeout
+        self.acquire_timeout = acquire_timeout
+        self.max_jobs = max_jobs
+        self._command: Optional[List[str]] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_OCRWorker] = []
+        self._spawn_lock: Optional[asyncio.Lock] = None
+        self.jobs = 0
+        self.failures = 0
+        self.restarts = 0
+
+    async def _resolve_command(self) -> List[str]:
+        """
+        Run the worker with the paddleocr env's interpreter directly: `conda run`
+        costs an activation per start and doesn't reliably forward stdin.
+        """
+        if self._command is None:
+            python = settings.PADDLEOCR_PYTHON
+            if not python:
+                process = await asyncio.create_subprocess_exec(
+                    "conda", "run", "-n", settings.PADDLEOCR_CONDA_ENV,
+                    "python", "-c", "import sys; print(sys.executable)",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                stdout, stderr = await process.communicate()
+                if process.returncode != 0:
+                    raise OCRWorkerError(f"Cannot locate python in conda env {settings.PADDLEOCR_CONDA_ENV}: {stderr.decode()}")
+                python = stdout.decode().strip().splitlines()[-1]
+            self._command = shlex.split(python) + ["-u", os.path.abspath(WORKER_SCRIPT)]
+        return self._command
+
+    async def _acquire(self) -> _OCRWorker:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            self._spawn_lock = asyncio.Lock()
+
+        deadline = asyncio.get_running_loop().time() + self.acquire_timeout
+        while True:
+            if self._idle.empty():
+                async with self._spawn_lock:
+                    if len(self._workers) < self.size:
+                        worker = _OCRWorker(await self._resolve_command())
+                        self._workers.append(worker)
+                        try:
+                            await worker.start(self.startup_timeout)
+                        except BaseException:
+                            self._discard(worker, restart=False)
+                            raise
+                        return worker
+            worker = await self._get_idle(deadline - asyncio.get_running_loop().time())
+            if worker is None:
+                # A replaced worker freed its slot; spawn a new one above
+                continue
+            if worker.alive:
+                return worker
+            # Died while idle
+            self._discard(worker)
+
+    async def _get_idle(self, timeout: float) -> Optional[_OCRWorker]:
+        getter = asyncio.ensure_future(self._idle.get())
+        try:
+            done, _ = await asyncio.wait({getter}, timeout=max(timeout, 0))
+        except BaseException:
+            self._abandon(getter)
+            raise
+        if not done:
+            self._abandon(getter)
+            raise OCRWorkerError(f"No OCR worker became available within {self.acquire_timeout:.0f}s")
+        return getter.result()
+
+    def _abandon(self, getter: asyncio.Future):
+        # cancel() fails only if the get already completed; hand that worker back
+        if not getter.cancel() and not getter.cancelled() and getter.exception() is None:
+            self._idle.put_nowait(getter.result())
+
+    def _release(self, worker: _OCRWorker):
+        self._idle.put_nowait(worker)
+
+    def _discard(self, worker: _OCRWorker, restart: bool = True):
+        """
+        Kill a worker and free its slot. Synchronous, so it also completes when
+        the caller is being cancelled.
+        """
+        worker.terminate()
+        if worker in self._workers:
+            self._workers.remove(worker)
+        if restart:
+            self.restarts += 1
+        # Wake a caller waiting for an idle worker so it can take the free slot
+        if self._idle is not None:
+            self._idle.put_nowait(None)
+
+    async def run(self, server_url: str, file_path: str) -> str:
+        """
+        OCR a file and return its markdown. Raises on OCR errors.
+        """
+        worker = await self._acquire()
+        response = None
+        try:
+            response = await worker.request(
+                {"cmd": "ocr", "server_url": server_url, "file_path": file_path},
+                timeout=self.job_timeout
+            )
+        finally:
+            if response is None:
+                # Timed out, crashed, out of sync or cancelled mid-request: the
+                # reply may still be in flight, so never reuse this process
+                self.failures += 1
+                self._discard(worker)
+
+        worker.jobs += 1
+        self.jobs += 1
+        if worker.jobs >= self.max_jobs:
+            # Recycle long-running workers to cap memory growth
+            self._discard(worker)
+        else:
+            self._release(worker)
+
+        if response.get("status") != "success":
+            raise OCRWorkerError(response.get("message", "Unknown error"))
+        return response.get("markdown", "")
+
+    async def health(self) -> Dict[str, Any]:
+        """
+        Ping idle workers; dead or unresponsive ones are dropped and respawned on demand.
+        """
+        healthy = 0
+        if self._idle is not None:
+            for _ in range(self._idle.qsize()):
+                worker = self._idle.get_nowait()
+                if worker is None:
+                    self._idle.put_nowait(None)
+                    continue
+                ok = False
+                try:
+                    response = await worker.request({"cmd": "ping"}, timeout=10)
+                    ok = response.get("status") == "ok"
+                except Exception:
+                    pass
+                finally:
+                    if ok:
+                        healthy += 1
+                        self._release(worker)
+                    else:
+                        self._discard(worker)
+        return {**self.stats(), "healthy_idle": healthy}
+
+    async def aclose(self):
+        workers = list(self._workers)
+        self._workers = []
+        self._idle = None
+        for worker in workers:
+            await worker.kill()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "workers": len(self._workers),
+            "idle": sum(1 for w in self._idle._queue if w is not None) if self._idle else 0,
+            "jobs": self.jobs,
+            "failures": self.failures,
+            "restarts": self.restarts,
+        }
+
+
+# Singleton instance
+ocr_worker_pool = OCRWorkerPool(
+    size=settings.OCR_WORKER_POOL_SIZE,
+    job_timeout=settings.OCR_JOB_TIMEOUT_SECONDS,
+    startup_timeout=settings.OCR_WORKER_STARTUP_TIMEOUT_SECONDS,
+    max_jobs=settings.OCR_WORKER_MAX_JOBS,
+    acquire_timeout=settings.OCR_ACQUIRE_TIMEOUT_SECONDS
+)
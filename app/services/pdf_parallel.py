@@ -0,0 +1,143 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+import pypdf
+from app.core.config import settings
+from app.services.ocr_worker_pool import ocr_worker_pool
+
+# Large PDFs are split into page ranges that are parsed (text layer) on a process
+# pool or OCR'd concurrently on the OCR worker pool, and streamed back in page order.
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _executor_workers
+    if _executor is None:
+        _executor_workers = settings.PDF_PARSE_PROCESSES or os.cpu_count() or 1
+        _executor = ProcessPoolExecutor(max_workers=_executor_workers)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def page_ranges(total_pages: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    pages_per_task = max(1, pages_per_task)
+    return [(start, min(start + pages_per_task, total_pages)) for start in range(0, total_pages, pages_per_task)]
+
+
+def count_pages(path: str) -> int:
+    return len(pypdf.PdfReader(path).pages)
+
+
+def _extract_page_range(path: str, start: int, end: int) -> List[str]:
+    # Runs in a worker process. Same extraction as PyPDFLoader's default (plain mode).
+    reader = pypdf.PdfReader(path)
+    return [reader.pages[i].extract_text(extraction_mode="plain").strip() for i in range(start, end)]
+
+
+def _write_page_range(path: str, start: int, end: int, target: str):
+    reader = pypdf.PdfReader(path)
+    writer = pypdf.PdfWriter()
+    for i in range(start, end):
+        writer.add_page(reader.pages[i])
+    with open(target, "wb") as f:
+        writer.write(f)
+
+
+async def _in_order(factories: List[Callable[[], Awaitable]], window: int) -> AsyncIterator:
+    """
+    Run range tasks with at most `window` in flight and yield their results in
+    order, so memory is bounded by the window rather than the document.
+    """
+    pending = deque()
+    remaining = iter(factories)
+    try:
+        while True:
+            while len(pending) < max(1, window):
+                factory = next(remaining, None)
+                if factory is None:
+                    break
+                pending.append(asyncio.ensure_future(factory()))
+            if not pending:
+                return
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _zip_ranges(results: AsyncIterator, ranges: List[Tuple[int, int]]) -> AsyncIterator:
+    index = 0
+    async for result in results:
+        yield result, ranges[index]
+        index += 1
+
+
+async def iter_pdf_pages(path: str, progress: Optional[ProgressCallback] = None) -> AsyncIterator[str]:
+    """
+    Yield page texts in order; page ranges are parsed in parallel processes.
+    Same extraction as PyPDFLoader's pages.
+    """
+    loop = asyncio.get_running_loop()
+    total = await loop.run_in_executor(None, count_pages, path)
+    executor = _get_executor()
+    ranges = page_ranges(total, settings.PDF_PAGES_PER_TASK)
+    factories = [
+        partial(loop.run_in_executor, executor, _extract_page_range, path, start, end)
+        for start, end in ranges
+    ]
+    async for pages, (start, end) in _zip_ranges(_in_order(factories, _executor_workers * 2), ranges):
+        for page in pages:
+            yield page
+        if progress:
+            await progress(end, total)
+
+
+async def iter_ocr_pdf(path: str, endpoint: str, progress: Optional[ProgressCallback] = None) -> AsyncIterator[str]:
+    """
+    Yield OCR markdown per page range in order. Ranges are OCR'd concurrently on
+    the OCR worker pool (OCR_WORKER_POOL_SIZE wide).
+    """
+    loop = asyncio.get_running_loop()
+    total = await loop.run_in_executor(None, count_pages, path)
+    ranges = page_ranges(total, settings.OCR_PAGES_PER_TASK)
+    if len(ranges) <= 1:
+        yield await ocr_worker_pool.run(endpoint, path)
+        if progress:
+            await progress(total, total)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="ocr_ranges_")
+
+    async def ocr_range(start: int, end: int) -> str:
+        target = os.path.join(workdir, f"pages_{start:05d}_{end:05d}.pdf")
+        await loop.run_in_executor(None, _write_page_range, path, start, end, target)
+        try:
+            return await ocr_worker_pool.run(endpoint, target)
+        finally:
+            os.remove(target)
+
+    try:
+        factories = [partial(ocr_range, start, end) for start, end in ranges]
+        async for markdown, (start, end) in _zip_ranges(_in_order(factories, ocr_worker_pool.size + 1), ranges):
+            if markdown:
+                yield markdown
+            if progress:
+                await progress(end, total)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
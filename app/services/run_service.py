@@ -0,0 +1,235 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from langchain_core.messages import HumanMessage
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.agent import AgentVersion
+from app.models.workflow import WorkflowRun
+from app.services.workflow_cache import workflow_cache
+
+
+def build_initial_state(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the LangGraph input state for a run. Mutates inputs to add request ids.
+    """
+    # Convert input string to message if needed
+    user_input = inputs.get("input", "")
+
+    # Generate IDs if not present
+    if "request_id" not in inputs:
+        inputs["request_id"] = str(uuid.uuid4())
+    if "conversion_id" not in inputs:
+        inputs["conversion_id"] = str(uuid.uuid4())
+
+    # Initialize node_outputs with start node inputs if possible,
+    # but strictly start_node function logic handles input mapping.
+    # We pass inputs via 'context' so start_node can pick them up.
+    return {
+        "messages": [HumanMessage(content=user_input)],
+        "context": inputs,
+        "node_outputs": {},
+        "trace_logs": []
+    }
+
+
+def build_run_config() -> Dict[str, Any]:
+    """
+    Per-run LangGraph config. render_memo lets prompt templates serialize each
+    dict/list node output (e.g. knowledge chunks) once per run instead of per reference.
+    """
+    return {"configurable": {"render_memo": {}}}
+
+
+def _to_jsonable(value: Any) -> Any:
+    # Node outputs may hold datetimes, UUIDs or LangChain objects; the JSON column can't.
+    return json.loads(json.dumps(value, ensure_ascii=False, default=str))
+
+
+class RunService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_run(self, version: AgentVersion, inputs: Dict[str, Any]) -> WorkflowRun:
+        run = WorkflowRun(agent_version_id=version.id, status="pending", inputs=_to_jsonable(inputs))
+        self.session.add(run)
+        await self.session.commit()
+        await self.session.refresh(run)
+        return run
+
+    async def get_run(self, run_id: uuid.UUID) -> Optional[WorkflowRun]:
+        return await self.session.get(WorkflowRun, run_id)
+
+    async def claim_run(self, run_id: uuid.UUID) -> bool:
+        """
+        Move a run from pending to running with a conditional UPDATE. False if it
+        is no longer pending (another worker or process claimed it first).
+        """
+        result = await self.session.execute(
+            update(WorkflowRun)
+            .where(WorkflowRun.id == run_id, WorkflowRun.status == "pending")
+            .values(status="running")
+        )
+        await self.session.commit()
+        return result.rowcount == 1
+
+    async def fail_runs(self, status: str, error: str, run_id: Optional[uuid.UUID] = None) -> int:
+        """
+        Mark runs (all, or one) still in `status` as failed. Returns how many changed.
+        """
+        statement = update(WorkflowRun).where(WorkflowRun.status == status)
+        if run_id is not None:
+            statement = statement.where(WorkflowRun.id == run_id)
+        result = await self.session.execute(
+            statement.values(status="error", outputs={"error": error}, completed_at=datetime.utcnow())
+        )
+        await self.session.commit()
+        return result.rowcount or 0
+
+    async def list_runs_by_status(self, status: str) -> List[WorkflowRun]:
+        result = await self.session.execute(
+            select(WorkflowRun).where(WorkflowRun.status == status).order_by(WorkflowRun.started_at)
+        )
+        return result.scalars().all()
+
+    async def finish_run(self, run: WorkflowRun, status: str, outputs: Optional[Dict[str, Any]] = None,
+                         logs: Optional[Dict[str, Any]] = None):
+        run.status = status
+        run.outputs = _to_jsonable(outputs) if outputs is not None else None
+        run.logs = _to_jsonable(logs) if logs is not None else None
+        run.completed_at = datetime.utcnow()
+        self.session.add(run)
+        await self.session.commit()
+
+
+class RunQueue:
+    """
+    Bounded in-process queue of WorkflowRun ids drained by a fixed pool of workers.
+    Submissions beyond max_size are rejected so bursts queue up instead of
+    holding open HTTP connections or spawning unbounded concurrent runs.
+    """
+
+    def __init__(self, workers: int = 4, max_size: int = 1000, timeout_seconds: float = 600):
+        self.worker_count = workers
+        self.max_size = max_size
+        self.timeout_seconds = timeout_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+
+    def is_full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        await self._recover()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        print(f"Run queue started with {self.worker_count} workers")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, run_id: uuid.UUID):
+        """
+        Enqueue a persisted run. Raises asyncio.QueueFull when the backlog is at capacity.
+        """
+        if self._queue is None:
+            raise RuntimeError("Run queue is not started")
+        self._queue.put_nowait(run_id)
+
+    async def _recover(self):
+        # Runs that were executing when the process died can't be resumed;
+        # pending ones never started and are simply queued again.
+        async with async_session_factory() as session:
+            service = RunService(session)
+            await service.fail_runs("running", "Interrupted by server restart")
+            for run in await service.list_runs_by_status("pending"):
+                if self._queue.full():
+                    await service.fail_runs("pending", "Run queue full on restart", run_id=run.id)
+                else:
+                    # Queuing a run that is also submitted meanwhile is harmless:
+                    # execute() claims it only once
+                    self._queue.put_nowait(run.id)
+
+    async def _worker(self):
+        while True:
+            run_id = await self._queue.get()
+            self.active += 1
+            try:
+                await self.execute(run_id)
+            except Exception as e:
+                print(f"Run worker error for {run_id}: {e}")
+            finally:
+                self.active -= 1
+                self._queue.task_done()
+
+    async def execute(self, run_id: uuid.UUID):
+        async with async_session_factory() as session:
+            service = RunService(session)
+            # Conditional claim, as for document jobs: a run queued twice (recovery
+            # racing a submit, or several processes) still executes once
+            if not await service.claim_run(run_id):
+                return
+            run = await service.get_run(run_id)
+
+            version = await session.get(AgentVersion, run.agent_version_id)
+            if not version:
+                await service.finish_run(run, "error", outputs={"error": "Agent version not found"})
+                self.failed += 1
+                return
+
+            try:
+                app = workflow_cache.get_or_build(version.agent_id, version.version, version.flow_json)
+                initial_state = build_initial_state(dict(run.inputs or {}))
+                result = await asyncio.wait_for(app.ainvoke(initial_state, config=build_run_config()), timeout=self.timeout_seconds)
+
+                last_message = ""
+                if result["messages"]:
+                    last_message = result["messages"][-1].content
+
+                await service.finish_run(
+                    run,
+                    "completed",
+                    outputs={"output": last_message, "node_outputs": result.get("node_outputs", {})},
+                    # Slim trace entries stay slim in the DB; GET /runs expands them
+                    logs={"trace_logs": result.get("trace_logs", [])}
+                )
+                self.completed += 1
+            except asyncio.TimeoutError:
+                await service.finish_run(run, "error", outputs={"error": f"Run timed out after {self.timeout_seconds}s"})
+                self.failed += 1
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                await service.finish_run(run, "error", outputs={"error": f"Execution failed: {str(e)}"})
+                self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+# Singleton instance
+run_queue = RunQueue(
+    workers=settings.RUN_WORKERS,
+    max_size=settings.RUN_QUEUE_MAX_SIZE,
+    timeout_seconds=settings.RUN_TIMEOUT_SECONDS
+)
@@ -0,0 +1,108 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document as LangchainDocument
+from app.core.config import settings
+
+SearchResults = List[Tuple[LangchainDocument, float]]
+
+
+class SearchResultCache:
+    """
+    Process-wide LRU cache of knowledge search results.
+
+    Every collection has a generation counter that is bumped on each write
+    (inserts, deletes, moves, dropped collections, keyword index flushes). The
+    generation is part of the key, so results computed before a write are never
+    served after it; stale entries simply age out of the LRU. The TTL only
+    matters for writes made by other processes, which can't bump our counters.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (created_at, seconds the search took, results)
+        self._entries: "OrderedDict[Tuple, Tuple[float, float, SearchResults]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        # Whitespace and Unicode width variants only; case can matter for codes
+        return " ".join(unicodedata.normalize("NFKC", query).split())
+
+    def make_key(self, collection_name: str, query: str, **params) -> Tuple:
+        """
+        Key for a search; includes the collection's current generation, so take
+        it before searching.
+        """
+        generation = self._generations.get(collection_name, 0)
+        return (collection_name, generation, self.normalize_query(query), tuple(sorted(params.items())))
+
+    def get(self, key: Tuple) -> Optional[SearchResults]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl_seconds and time.time() - entry[0] > self.ttl_seconds):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+        return self._copy(entry[2])
+
+    def put(self, key: Tuple, results: SearchResults, elapsed_seconds: float):
+        with self._lock:
+            if key[1] != self._generations.get(key[0], 0):
+                return  # Collection changed while searching
+            self._entries[key] = (time.time(), elapsed_seconds, self._copy(results))
+            self._entries.move_to_end(key)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection_name: str):
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _copy(results: SearchResults) -> SearchResults:
+        # Callers annotate metadata (e.g. the source collection); keep entries pristine
+        return [(LangchainDocument(page_content=doc.page_content, metadata=dict(doc.metadata)), score)
+                for doc, score in results]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "latency_saved_ms": round(self.saved_seconds * 1000, 2),
+        }
+
+
+# Singleton instance
+search_cache = SearchResultCache(
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS
+)
@@ -1,11 +1,38 @@
-from typing import Dict, Any, List, Annotated
+from typing import Dict, Any, List, Annotated, Optional
 import operator
 from langchain_core.messages import BaseMessage
 from typing_extensions import TypedDict
 
+def merge_node_outputs(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reducer for node_outputs: each node returns only its own entry and sibling
+    branches finishing in the same step are merged instead of overwriting each other.
+    Reducers must not mutate the previous value (checkpoints and streamed states
+    keep it), so this builds a new dict; it only copies references.
+    """
+    return {**(left or {}), **(right or {})}
+
+def expand_trace_logs(trace_logs: List[Dict[str, Any]], node_outputs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Fill in the output of slim trace entries (TRACE_MODE=slim) from node_outputs,
+    so API responses have the same shape in both modes.
+    """
+    expanded = []
+    for log in trace_logs or []:
+        if "output_ref" in log and "output" not in log:
+            log = {**log, "output": (node_outputs or {}).get(log["output_ref"])}
+        expanded.append(log)
+    return expanded
+
+def last_value(left: Any, right: Any) -> Any:
+    """
+    Reducer that keeps the most recent write (parallel branches may all set it).
+    """
+    return right
+
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], operator.add]
     context: Dict[str, Any]
-    node_outputs: Dict[str, Any]
-    current_node: str
+    node_outputs: Annotated[Dict[str, Any], merge_node_outputs]
+    current_node: Annotated[str, last_value]
     trace_logs: Annotated[List[Dict[str, Any]], operator.add]
@@ -0,0 +1,118 @@
+from typing import List, Tuple
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+class StreamingTextSplitter:
+    """
+    Incremental front end for a RecursiveCharacterTextSplitter.
+
+    Text is fed piece by piece (pages, paragraphs, file blocks). Once the buffer
+    reaches `window_chars`, the text up to its last paragraph break is split and
+    every chunk but the last is emitted; the last one may continue into the next
+    piece, so it is carried over (from its start in the buffer) and split again
+    with what follows.
+
+    If the buffer grows to twice the window without a usable paragraph break
+    (e.g. a long run of single-newline lines), it is cut at the splitter's next
+    separators (line, then word breaks), or anywhere as a last resort, so the
+    carried buffer stays within about two windows plus the latest piece.
+
+    Chunks match splitting the full text in one go as long as every paragraph
+    fits in the window. Chunks of larger paragraphs cover the same text, but
+    their boundaries can differ from a full split.
+    """
+
+    def __init__(self, splitter: RecursiveCharacterTextSplitter, window_chars: int = 64 * 1024):
+        self.splitter = splitter
+        self.window_chars = max(window_chars, splitter._chunk_size * 4)
+        self._parts: List[str] = []
+        self._size = 0
+
+    def feed(self, text: str) -> List[str]:
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size < self.window_chars:
+            return []
+
+        buffer = "".join(self._parts)
+        emitted, tail_start = self._split_at_paragraph(buffer)
+        if not emitted and len(buffer) >= 2 * self.window_chars:
+            emitted, tail_start = self._split_at_fallback(buffer)
+        if not emitted:
+            self._parts = [buffer]
+            return []
+
+        tail = buffer[tail_start:]
+        self._parts = [tail]
+        self._size = len(tail)
+        return emitted
+
+    def _split_at_paragraph(self, buffer: str) -> Tuple[List[str], int]:
+        """
+        Chunks to emit and where the carried-over text starts; no chunks means
+        wait for more text.
+        """
+        separator = self.splitter._separators[0]
+        # Split only up to the last top-level separator (paragraph break), so no
+        # paragraph is cut in half by the window
+        cut = buffer.rfind(separator) if separator else -1
+        if cut <= 0:
+            cut = len(buffer)
+        head = buffer[:cut]
+        chunks = self.splitter.split_text(head)
+        if len(chunks) <= 1:
+            return [], 0
+
+        emitted = chunks[:-1]
+        tail_start = self._chunk_start(head, chunks[-1])
+        if tail_start < 0:
+            tail_start = cut
+        elif separator:
+            # The last chunk may be a piece of an oversized paragraph, which the
+            # splitter splits on its own; restart at that paragraph instead
+            paragraph_start = max(head.rfind(separator, 0, tail_start), 0)
+            paragraph_end = head.find(separator, tail_start)
+            paragraph = head[paragraph_start:paragraph_end if paragraph_end >= 0 else cut]
+            if (self.splitter._length_function(paragraph) >= self.splitter._chunk_size
+                    and len(paragraph) <= self.window_chars):
+                if paragraph_start == 0:
+                    return [], 0
+                emitted = self.splitter.split_text(head[:paragraph_start])
+                tail_start = paragraph_start
+        return emitted, tail_start
+
+    def _split_at_fallback(self, buffer: str) -> Tuple[List[str], int]:
+        # Finer separators first; "" (or running out of separators) is a hard cut
+        for separator in self.splitter._separators[1:] + [""]:
+            cut = buffer.rfind(separator) if separator else len(buffer)
+            if cut <= 0:
+                continue
+            head = buffer[:cut]
+            chunks = self.splitter.split_text(head)
+            if len(chunks) > 1:
+                tail_start = self._chunk_start(head, chunks[-1])
+                return chunks[:-1], tail_start if tail_start >= 0 else cut
+        return [], 0
+
+    def _chunk_start(self, head: str, chunk: str) -> int:
+        """
+        Where `chunk` starts in `head`. Chunks are stripped, but the splitter
+        measured the separator kept in front of their first split; start there so
+        the carried-over text is measured the same way when split again.
+        """
+        start = head.rfind(chunk)
+        if start <= 0 or self.splitter._keep_separator not in (True, "start"):
+            return start
+        whitespace_start = len(head[:start].rstrip())
+        for separator in self.splitter._separators:
+            if separator:
+                found = head.rfind(separator, whitespace_start, start)
+                if found >= 0:
+                    return found
+        return start
+
+    def flush(self) -> List[str]:
+        buffer = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        return self.splitter.split_text(buffer) if buffer else []
@@ -0,0 +1,104 @@
+import json
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Prompt/query templates reference node outputs as {{node_id.key.subkey}}.
+# A template is split once into literal and lookup segments; rendering then only
+# walks the referenced outputs. Unknown node ids are left in the text unchanged.
+
+_VAR_PATTERN = re.compile(r'\{\{(.*?)\}\}')
+
+# Per-run memo of serialized dict/list outputs: id(value) -> (value, json text).
+# The value is kept alongside its text so the id can't be reused within the run.
+_render_memo: ContextVar[Optional[Dict[int, Tuple[Any, str]]]] = ContextVar("render_memo", default=None)
+
+
+class _Ref:
+    __slots__ = ("node_id", "keys", "raw")
+
+    def __init__(self, node_id: str, keys: Tuple[str, ...], raw: str):
+        self.node_id = node_id
+        self.keys = keys
+        self.raw = raw
+
+
+Segment = Union[str, _Ref]
+
+
+class CompiledTemplate:
+    def __init__(self, segments: List[Segment]):
+        self.segments = segments
+        self.has_refs = any(isinstance(s, _Ref) for s in segments)
+
+    def render(self, node_outputs: Dict[str, Any]) -> str:
+        if not self.has_refs:
+            return self.segments[0] if self.segments else ""
+
+        memo = _render_memo.get()
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+            elif segment.node_id in node_outputs:
+                parts.append(_to_text(_lookup(node_outputs[segment.node_id], segment.keys), memo))
+            else:
+                parts.append(segment.raw)
+        return "".join(parts)
+
+
+def _lookup(current_data: Any, keys: Tuple[str, ...]) -> Any:
+    for key in keys:
+        if isinstance(current_data, dict):
+            current_data = current_data.get(key, "")
+            if current_data == "":  # Key not found or empty
+                break
+        else:
+            return ""
+    return current_data
+
+
+def _to_text(value: Any, memo: Optional[Dict[int, Tuple[Any, str]]]) -> str:
+    if not isinstance(value, (dict, list)):
+        return str(value)
+    if memo is None:
+        return json.dumps(value, ensure_ascii=False)
+    entry = memo.get(id(value))
+    if entry is None or entry[0] is not value:
+        entry = (value, json.dumps(value, ensure_ascii=False))
+        memo[id(value)] = entry
+    return entry[1]
+
+
+@lru_cache(maxsize=2048)
+def compile_template(text: str) -> CompiledTemplate:
+    """
+    Split a template into literal and {{node_id.path}} lookup segments.
+    Memoized, so WorkflowBuilder compiling templates at build time makes
+    every later render skip the regex scan.
+    """
+    segments: List[Segment] = []
+    position = 0
+    for match in _VAR_PATTERN.finditer(text):
+        if match.start() > position:
+            segments.append(text[position:match.start()])
+        parts = match.group(1).strip().split('.')
+        segments.append(_Ref(parts[0], tuple(parts[1:]), match.group(0)))
+        position = match.end()
+    if position < len(text) or not segments:
+        segments.append(text[position:])
+    return CompiledTemplate(segments)
+
+
+@contextmanager
+def render_memo_scope(memo: Optional[Dict[int, Tuple[Any, str]]]):
+    """
+    Make renders inside the block share a run's serialization memo.
+    """
+    token = _render_memo.set(memo)
+    try:
+        yield
+    finally:
+        _render_memo.reset(token)
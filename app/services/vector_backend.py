@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document as LangchainDocument
+from langchain_core.embeddings import Embeddings
+
+
+class VectorBackend:
+    """
+    Storage behind VectorService. Methods are synchronous; VectorService runs them
+    on its executor. Filter expressions use Milvus' boolean expression syntax
+    (e.g. `document_id == "..."`, `pk in [1, 2]`).
+    """
+
+    name = "base"
+
+    def __init__(self, embedding_function: Embeddings):
+        self.embedding_function = embedding_function
+
+    def prepare_collection(self, collection_name: str):
+        """
+        Get a collection ready for inserts. Collections are created on first insert.
+        """
+
+    def add_texts(self, collection_name: str, texts: List[str], metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def search(self, collection_name: str, query: str, top_k: int, expr: Optional[str] = None,
+               score_threshold: Optional[float] = None) -> List[Tuple[LangchainDocument, float]]:
+        """
+        Top-k by raw metric score, restricted to rows matching `expr`. A threshold is
+        a cosine similarity (see metric_type) and is applied by the engine.
+        """
+        raise NotImplementedError
+
+    def metric_type(self, collection_name: str) -> str:
+        """
+        Metric of the collection's search scores: "IP"/"COSINE" (higher is closer)
+        or "L2" (squared distance, lower is closer).
+        """
+        return "IP"
+
+    def query(self, collection_name: str, expr: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete(self, collection_name: str, expr: str):
+        raise NotImplementedError
+
+    def delete_collection(self, collection_name: str):
+        raise NotImplementedError
+
+    def get_chunk_index(self, collection_name: str, document_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        pk, chunk_id and content_hash of a document's stored chunks; None when the
+        document must be fully reindexed.
+        """
+        return None
+
+    def move_chunks(self, collection_name: str, pks: List[int], texts: List[str],
+                    metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def delete_chunks(self, collection_name: str, pks: List[int]):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+def create_vector_backend(backend: str, embedding_function: Embeddings) -> VectorBackend:
+    """
+    Build the configured backend (settings.VECTOR_BACKEND). Imports are deferred so
+    the embedded backend doesn't need pymilvus or a Milvus server.
+    """
+    if backend == "embedded":
+        from app.core.config import settings
+        from app.services.embedded_vector_backend import EmbeddedVectorBackend
+        return EmbeddedVectorBackend(
+            embedding_function,
+            path=settings.EMBEDDED_VECTOR_PATH,
+            ann_threshold=settings.EMBEDDED_VECTOR_ANN_THRESHOLD,
+            nprobe=settings.EMBEDDED_VECTOR_NPROBE
+        )
+    if backend == "milvus":
+        from app.services.milvus_backend import MilvusBackend
+        return MilvusBackend(embedding_function)
+    raise ValueError(f"Unknown vector backend: {backend}")
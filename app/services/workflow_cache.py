@@ -0,0 +1,93 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+from app.core.config import settings
+from app.schemas.agent_schema import AgentGraph
+from app.services.workflow_engine import WorkflowBuilder
+
+
+class WorkflowCache:
+    """
+    Process-wide LRU cache of compiled LangGraph runnables.
+
+    Entries are keyed by (agent_id, version). AgentVersion rows are immutable once
+    written, so a cached runnable stays valid until the agent gets a newer version
+    or is deleted.
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[uuid.UUID, int], Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.evictions = 0
+        self.total_build_time_ms = 0.0
+        self.last_build_time_ms = 0.0
+
+    def get_or_build(self, agent_id: uuid.UUID, version: int, flow_json: Dict[str, Any]):
+        """
+        Return the compiled runnable for this agent version, building it on a miss.
+        Raises ValueError if the stored flow_json is not a valid graph definition.
+        """
+        key = (agent_id, version)
+        runnable = self._entries.get(key)
+        if runnable is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return runnable
+
+        self.misses += 1
+        try:
+            graph_def = AgentGraph(**flow_json)
+        except Exception as e:
+            raise ValueError(f"Invalid graph definition: {str(e)}")
+
+        start = time.perf_counter()
+        runnable = WorkflowBuilder(graph_def).build()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.builds += 1
+        self.last_build_time_ms = elapsed_ms
+        self.total_build_time_ms += elapsed_ms
+
+        # A newer version supersedes every older one of the same agent
+        self._drop_agent(agent_id, keep_version=version)
+
+        self._entries[key] = runnable
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return runnable
+
+    def invalidate(self, agent_id: uuid.UUID):
+        """
+        Drop every cached version of an agent (e.g. on delete or new version).
+        """
+        self._drop_agent(agent_id)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _drop_agent(self, agent_id: uuid.UUID, keep_version: int = None):
+        stale = [k for k in self._entries if k[0] == agent_id and k[1] != keep_version]
+        for k in stale:
+            del self._entries[k]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "builds": self.builds,
+            "evictions": self.evictions,
+            "last_build_time_ms": round(self.last_build_time_ms, 2),
+            "avg_build_time_ms": round(self.total_build_time_ms / self.builds, 2) if self.builds else 0.0,
+        }
+
+
+# Singleton instance
+workflow_cache = WorkflowCache(max_size=settings.WORKFLOW_CACHE_SIZE)
@@ -3,7 +3,11 @@ from app.schemas.agent_schema import AgentGraph
 from app.services.state import AgentState
 from app.services.nodes import NODE_REGISTRY
 from app.services.parameter_convertor import ParameterConvertor
+from app.services.condition_compiler import compile_condition, is_default_condition, ConditionError
+from app.services.template_engine import compile_template, render_memo_scope
+from langchain_core.runnables import RunnableConfig
 from functools import partial
+import re
 
 class WorkflowBuilder:
     def __init__(self, graph_def: AgentGraph):
@@ -33,6 +37,17 @@ class WorkflowBuilder:
             # --- Apply ParameterConvertor Logic ---
             # Map default connection parameters if config is missing
             node_edges = incoming_edges.get(node.id, [])
+            
+            # Predecessors grouped by type: a join node fed by several branches of
+            # the same type (e.g. two knowledge nodes) references all of them.
+            sources_by_type = {}
+            for edge in node_edges:
+                source_node = node_map.get(edge.source)
+                if source_node:
+                    s_type = 'start' if source_node.type == 'input' else source_node.type
+                    if source_node.id not in sources_by_type.setdefault(s_type, []):
+                        sources_by_type[s_type].append(source_node.id)
+            
             for edge in node_edges:
                 source_node = node_map.get(edge.source)
                 if not source_node:
@@ -64,9 +79,14 @@ class WorkflowBuilder:
                             }
                             alias = alias_map.get(source_type, source_type)
                             
-                            # Replace alias with actual source node ID
+                            # Replace alias with actual source node ID(s)
                             # e.g. {{start_node.rawQuery}} -> {{uuid.rawQuery}}
-                            resolved_template = template.replace(f"{{{{{alias}.", f"{{{{{source_node.id}.")
+                            source_ids = sources_by_type.get(source_type, [source_node.id])
+                            resolved_template = re.sub(
+                                r"\{\{" + re.escape(alias) + r"\.([^}]*)\}\}",
+                                lambda m: "\n\n".join(f"{{{{{sid}.{m.group(1)}}}}}" for sid in source_ids),
+                                template
+                            )
                             n_config[field] = resolved_template
             
             # --- Global Template Replacement ---
@@ -76,10 +96,25 @@ class WorkflowBuilder:
                     if isinstance(v, str) and "{{start_node." in v:
                         n_config[k] = v.replace("{{start_node.", f"{{{{{start_node_id}.")
 
+            # Compile node-level conditions up front so bad expressions fail the build
+            if node.type == 'condition' and n_config.get('condition'):
+                try:
+                    compile_condition(n_config['condition'])
+                except ConditionError as e:
+                    raise ValueError(f"Node {node.id}: {e}")
+
+            # Pre-compile prompt/query templates; renders at run time hit the cache
+            for v in n_config.values():
+                if isinstance(v, str) and "{{" in v:
+                    compile_template(v)
+
             # Helper wrapper to isolate signature
             def create_node_wrapper(n_type, n_config, n_id):
-                async def node_wrapper(state):
-                    return await NODE_REGISTRY[n_type](state, n_config, n_id)
+                async def node_wrapper(state, config: RunnableConfig):
+                    # Runs started with build_run_config() share one serialization memo
+                    memo = (config or {}).get("configurable", {}).get("render_memo")
+                    with render_memo_scope(memo):
+                        return await NODE_REGISTRY[n_type](state, n_config, n_id)
                 return node_wrapper
 
             if node.type in NODE_REGISTRY:
@@ -101,13 +136,81 @@ class WorkflowBuilder:
         if start_node_id:
             self.workflow.set_entry_point(start_node_id)
         
+        # Group simple edges by target so fan-in (join) nodes can be detected.
+        # Sibling branches leaving the same node run concurrently in one LangGraph
+        # step; their node_outputs are merged by the reducer in AgentState.
+        simple_sources = {}
+        conditional_edges = {}
         for edge in self.graph_def.edges:
             # Simple edge
             if not edge.condition:
-                self.workflow.add_edge(edge.source, edge.target)
+                simple_sources.setdefault(edge.target, [])
+                if edge.source not in simple_sources[edge.target]:
+                    simple_sources[edge.target].append(edge.source)
             else:
-                # Conditional edge logic would go here
-                # self.workflow.add_conditional_edges(...)
-                pass
-        
+                conditional_edges.setdefault(edge.source, []).append(edge)
+
+        # Nodes only reachable through a conditional edge may never run, so a
+        # join waiting on them would stall; such joins fire per arriving branch.
+        conditionally_reached = self._downstream_of(
+            [e.target for edges in conditional_edges.values() for e in edges]
+        )
+
+        for target, sources in simple_sources.items():
+            if len(sources) > 1 and not conditionally_reached.intersection(sources):
+                # Join node: a multi-source edge makes it wait until every
+                # predecessor branch has finished, then run exactly once.
+                self.workflow.add_edge(sources, target)
+            else:
+                for source in sources:
+                    self.workflow.add_edge(source, target)
+
+        for source, edges in conditional_edges.items():
+            router, destinations = self._create_router(edges, start_node_id)
+            self.workflow.add_conditional_edges(source, router, destinations)
+
         return self.workflow.compile()
+
+    def _create_router(self, edges, start_node_id=None):
+        """
+        Compile the conditions of a node's outgoing edges into a routing function.
+        Every edge whose condition holds is taken (fan-out); 'default'/'else' edges
+        are taken only when nothing else matched. No match ends that branch.
+        """
+        routes = []
+        default_targets = []
+        for edge in edges:
+            if is_default_condition(edge.condition):
+                default_targets.append(edge.target)
+            else:
+                condition = edge.condition
+                if start_node_id:
+                    condition = condition.replace("{{start_node.", f"{{{{{start_node_id}.")
+                try:
+                    routes.append((compile_condition(condition), edge.target))
+                except ConditionError as e:
+                    raise ValueError(f"Edge {edge.id}: {e}")
+
+        def router(state):
+            node_outputs = state.get("node_outputs", {})
+            targets = [target for predicate, target in routes if predicate(node_outputs)]
+            if not targets:
+                targets = default_targets
+            return list(dict.fromkeys(targets)) or END
+
+        destinations = list(dict.fromkeys([e.target for e in edges])) + [END]
+        return router, destinations
+
+    def _downstream_of(self, node_ids):
+        successors = {}
+        for edge in self.graph_def.edges:
+            successors.setdefault(edge.source, []).append(edge.target)
+        seen = set()
+        stack = list(node_ids)
+        while stack:
+            node_id = stack.pop()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            stack.extend(successors.get(node_id, []))
+        return seen
@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+from app.core.database import init_db
+from app.services.document_job_queue import document_job_queue
+from app.services import pdf_parallel
+
+# Standalone document-processing worker, so ingestion scales independently of the API:
+#   python -m app.worker --workers 4
+# Run the API with DOC_JOB_WORKERS=0 to leave all processing to these workers.
+
+async def main(workers: int):
+    await init_db()
+    document_job_queue.worker_count = workers
+    await document_job_queue.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await document_job_queue.stop()
+        pdf_parallel.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AgentFlow document processing worker")
+    parser.add_argument("--workers", type=int, default=max(document_job_queue.worker_count, 1))
+    args = parser.parse_args()
+    asyncio.run(main(args.workers))
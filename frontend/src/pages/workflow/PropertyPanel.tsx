@@ -321,13 +321,28 @@ export const PropertyPanel: React.FC<PropertyPanelProps> = ({ node, nodes = [],
         );
       case 'knowledge':
         return (
-          <Form.Item name="knowledge_base_id" label="关联知识库">
-            <Select placeholder="选择知识库" loading={knowledgeBases.length === 0}>
-                {knowledgeBases.map(kb => (
-                    <Option key={kb.id} value={kb.id}>{kb.name}</Option>
-                ))}
-            </Select>
-          </Form.Item>
+          <>
+            <Form.Item name="knowledge_base_id" label="关联知识库">
+              <Select mode="multiple" placeholder="选择知识库 (可多选)" loading={knowledgeBases.length === 0}>
+                  {knowledgeBases.map(kb => (
+                      <Option key={kb.id} value={kb.id}>{kb.name}</Option>
+                  ))}
+              </Select>
+            </Form.Item>
+            <Form.Item name="search_mode" label="检索模式" initialValue="vector">
+              <Select>
+                <Option value="vector">向量检索</Option>
+                <Option value="keyword">关键词检索 (BM25)</Option>
+                <Option value="hybrid">混合检索 (向量 + BM25)</Option>
+              </Select>
+            </Form.Item>
+            <Form.Item name="score_threshold" label="相似度阈值">
+              <Input type="number" step="0.05" min="0" max="1" placeholder="不限" />
+            </Form.Item>
+            <Form.Item name="filter_expr" label="过滤表达式">
+              <Input placeholder='如 source == "manual.pdf"' />
+            </Form.Item>
+          </>
         );
       case 'tool':
         return (
@@ -0,0 +1,77 @@
+import sys
+import os
+import json
+
+# Long-lived PaddleOCR worker used by app/services/ocr_worker_pool.py.
+# Speaks JSON lines: one request per stdin line, one response per stdout line.
+#   {"id": 1, "cmd": "ocr", "server_url": "...", "file_path": "..."}
+#     -> {"id": 1, "status": "success", "markdown": "..."}
+#   {"id": 2, "cmd": "ping"} -> {"id": 2, "status": "ok"}
+# Pipelines are built once per server_url and reused for every file.
+
+# Keep the protocol channel private: anything PaddleOCR prints goes to stderr
+protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1, encoding="utf-8")
+os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+sys.stdout = sys.stderr
+
+
+def send(message):
+    protocol.write(json.dumps(message, ensure_ascii=False) + "\n")
+    protocol.flush()
+
+
+try:
+    from paddleocr import PaddleOCRVL
+except ImportError:
+    send({"status": "error", "message": "paddleocr module not found. Ensure running in paddleocr_vlm environment."})
+    sys.exit(1)
+
+pipelines = {}
+
+
+def get_pipeline(server_url):
+    pipeline = pipelines.get(server_url)
+    if pipeline is None:
+        # Initialize pipeline with vllm backend
+        pipeline = PaddleOCRVL(vl_rec_backend="vllm-server", vl_rec_server_url=server_url)
+        pipelines[server_url] = pipeline
+    return pipeline
+
+
+def run_ocr(server_url, file_path):
+    if not os.path.exists(file_path):
+        return {"status": "error", "message": f"File not found: {file_path}"}
+
+    pipeline = get_pipeline(server_url)
+    output = pipeline.predict(file_path)
+
+    markdown_list = []
+    for res in output:
+        markdown_list.append(res._to_markdown())
+
+    return {"status": "success", "markdown": pipeline.concatenate_markdown_pages(markdown_list)}
+
+
+def main():
+    send({"status": "ready", "pid": os.getpid()})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if request.get("cmd") == "ping":
+                result = {"status": "ok", "pipelines": len(pipelines)}
+            else:
+                result = run_ocr(request["server_url"], request["file_path"])
+        except Exception as e:
+            # Capture any exception and report it; the worker stays alive
+            result = {"status": "error", "message": str(e)}
+        result["id"] = request_id
+        send(result)
+
+
+if __name__ == "__main__":
+    main()
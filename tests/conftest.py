@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Point settings at throwaway storage before anything under app/ is imported
+_tmp = tempfile.mkdtemp(prefix="agentflow_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(_tmp, 'test.db')}")
+os.environ.setdefault("VECTOR_BACKEND", "embedded")
+os.environ.setdefault("EMBEDDED_VECTOR_PATH", os.path.join(_tmp, "vector_data"))
+os.environ.setdefault("KEYWORD_INDEX_PATH", os.path.join(_tmp, "keyword_index"))
+os.environ.setdefault("DOC_JOB_WORKERS", "0")
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+import pytest
+from app.services.condition_compiler import ConditionError, compile_condition, is_default_condition
+
+OUTPUTS = {
+    "llm_1": {"text": "yes"},
+    "start": {"rawQuery": "I want a refund", "fileNames": ["a.pdf", "b.pdf"]},
+    "kb_1": {"chunks": [{"content": "x"}]},
+    "intent": {"result": False, "score": 0.8},
+}
+
+
+@pytest.mark.parametrize("expr, expected", [
+    ('{{llm_1.text}} == "yes"', True),
+    ('{{llm_1.text}} != "yes"', False),
+    ('"refund" in {{start.rawQuery}} and len({{kb_1.chunks}}) > 0', True),
+    ('not {{intent.result}}', True),
+    ('{{intent.score}} >= 0.5 or {{intent.result}}', True),
+    ('0 < {{intent.score}} < 0.5', False),
+    ('{{start.fileNames.1}} == "b.pdf"', True),
+    ('lower({{llm_1.text}}) in ["yes", "y"]', True),
+    ('{{intent.result}} == false', True),
+    ('{{missing.key}} is null', True),
+])
+def test_conditions_evaluate(expr, expected):
+    assert compile_condition(expr)(OUTPUTS) is expected
+
+
+def test_runtime_errors_evaluate_false():
+    # len(None) raises; the predicate swallows it
+    assert compile_condition("len({{missing.items}}) > 0")(OUTPUTS) is False
+    assert compile_condition("{{start.fileNames.9}} == 'x'")(OUTPUTS) is False
+
+
+@pytest.mark.parametrize("expr", [
+    "__import__('os')",
+    "{{llm_1.text}}.upper()",
+    "open('x')",
+    "foo == 1",
+    "{{llm_1.text}} ==",
+    "lambda: 1",
+])
+def test_unsafe_or_invalid_conditions_are_rejected(expr):
+    with pytest.raises(ConditionError):
+        compile_condition(expr)
+
+
+def test_default_conditions():
+    assert is_default_condition(" Else ")
+    assert is_default_condition("default")
+    assert not is_default_condition("{{a.b}}")
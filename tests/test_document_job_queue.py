@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.core.database import async_session_factory, init_db
+from app.models.knowledge import Document, DocumentJob, KnowledgeBase
+from app.services import document_job_queue as queue_module
+from app.services.document_job_queue import DocumentJobQueue
+
+
+async def _make_job(queue: DocumentJobQueue):
+    await init_db()
+    async with async_session_factory() as session:
+        kb = KnowledgeBase(name="jobs")
+        session.add(kb)
+        await session.commit()
+        doc = Document(knowledge_base_id=kb.id, filename="a.txt", file_path="kb/a.txt", file_type="txt")
+        session.add(doc)
+        await session.commit()
+        job = await queue.enqueue(session, doc)
+    return job.id
+
+
+async def _claim_job(queue: DocumentJobQueue, job_id):
+    # Claim exactly this job (other tests may have left due jobs behind)
+    while True:
+        claimed = await queue._claim()
+        assert claimed is not None
+        if claimed[0] == job_id:
+            return claimed
+        async with async_session_factory() as session:
+            await session.execute(update(DocumentJob).where(DocumentJob.id == claimed[0]).values(status="completed"))
+            await session.commit()
+
+
+async def _job(job_id) -> DocumentJob:
+    async with async_session_factory() as session:
+        return await session.get(DocumentJob, job_id)
+
+
+def _queue(**kwargs) -> DocumentJobQueue:
+    queue = DocumentJobQueue(workers=1, **kwargs)
+    queue._claim_lock = asyncio.Lock()
+    return queue
+
+
+def test_heartbeat_survives_transient_errors(monkeypatch):
+    async def run():
+        queue = _queue(heartbeat_interval=0.02)
+        job_id = await _make_job(queue)
+        _, _, token = await _claim_job(queue, job_id)
+        before = (await _job(job_id)).heartbeat_at
+
+        calls = {"n": 0}
+        real_factory = queue_module.async_session_factory
+
+        def flaky_factory():
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise RuntimeError("database is locked")
+            return real_factory()
+        monkeypatch.setattr(queue_module, "async_session_factory", flaky_factory)
+
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(queue._heartbeat(job_id, token, lost))
+        await asyncio.sleep(0.15)
+        assert not heartbeat.done()
+        assert not lost.is_set()
+        heartbeat.cancel()
+        assert calls["n"] >= 2
+        assert (await _job(job_id)).heartbeat_at > before
+
+    asyncio.run(run())
+
+
+def test_reclaimed_job_cannot_be_finished_by_stale_worker():
+    async def run():
+        queue = _queue(heartbeat_interval=0.01)
+        job_id = await _make_job(queue)
+        _, _, stale_token = await _claim_job(queue, job_id)
+
+        # Heartbeat goes stale; recovery requeues and another worker claims it
+        async with async_session_factory() as session:
+            await session.execute(update(DocumentJob).where(DocumentJob.id == job_id)
+                                  .values(heartbeat_at=datetime.utcnow() - timedelta(minutes=5)))
+            await session.commit()
+        await queue.recover()
+        _, _, new_token = await _claim_job(queue, job_id)
+        assert new_token != stale_token
+
+        async with async_session_factory() as session:
+            assert not await queue._finish(session, job_id, stale_token, status="completed", claim_token=None)
+        job = await _job(job_id)
+        assert job.status == "running" and job.claim_token == new_token
+
+        lost = asyncio.Event()
+        await asyncio.wait_for(queue._heartbeat(job_id, stale_token, lost), timeout=1)
+        assert lost.is_set()
+
+    asyncio.run(run())
+
+
+def test_worker_stops_processing_when_claim_is_lost(monkeypatch):
+    async def run():
+        queue = _queue(heartbeat_interval=0.02)
+        job_id = await _make_job(queue)
+        _, _, token = await _claim_job(queue, job_id)
+        cancelled = asyncio.Event()
+
+        async def slow_process(doc, session):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        monkeypatch.setattr(queue_module.document_service, "process_document", slow_process)
+
+        execute = asyncio.create_task(queue._execute(job_id, token))
+        await asyncio.sleep(0.05)
+        async with async_session_factory() as session:
+            await session.execute(update(DocumentJob).where(DocumentJob.id == job_id).values(claim_token="other"))
+            await session.commit()
+        await asyncio.wait_for(execute, timeout=2)
+        assert cancelled.is_set()
+        assert queue.lost_claims == 1 and queue.completed == 0
+        assert (await _job(job_id)).claim_token == "other"
+
+    asyncio.run(run())
+
+
+def test_completed_job_clears_claim(monkeypatch):
+    async def run():
+        queue = _queue(heartbeat_interval=1)
+        job_id = await _make_job(queue)
+        _, _, token = await _claim_job(queue, job_id)
+
+        async def process(doc, session):
+            return 7
+        monkeypatch.setattr(queue_module.document_service, "process_document", process)
+        await queue._execute(job_id, token)
+        job = await _job(job_id)
+        assert job.status == "completed" and job.claim_token is None
+        async with async_session_factory() as session:
+            doc = await session.get(Document, job.document_id)
+            assert doc.status == "completed" and doc.chunk_count == 7
+
+    asyncio.run(run())
+
+
+def test_stopping_the_worker_cancels_processing(monkeypatch):
+    async def run():
+        queue = _queue(heartbeat_interval=1)
+        job_id = await _make_job(queue)
+        _, _, token = await _claim_job(queue, job_id)
+        started, finished = asyncio.Event(), asyncio.Event()
+
+        async def slow_process(doc, session):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            finally:
+                finished.set()
+        monkeypatch.setattr(queue_module.document_service, "process_document", slow_process)
+
+        execute = asyncio.create_task(queue._execute(job_id, token))
+        await asyncio.wait_for(started.wait(), timeout=2)
+        execute.cancel()
+        await asyncio.gather(execute, return_exceptions=True)
+        # Processing ended before _execute returned, not later on a closed session
+        assert finished.is_set()
+        assert execute.cancelled()
+
+    asyncio.run(run())
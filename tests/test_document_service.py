@@ -0,0 +1,89 @@
+import asyncio
+import time
+import uuid
+import pytest
+from app.services import document_service as document_service_module
+from app.services.document_service import document_service
+
+
+def _slow_download(content: str):
+    def download_file(object_name, path):
+        time.sleep(0.3)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return download_file
+
+
+def test_download_does_not_block_the_event_loop(monkeypatch):
+    monkeypatch.setattr(document_service_module.minio_service, "download_file", _slow_download("hello\n\nworld"))
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        pieces = [piece async for piece in document_service._iter_file_content("kb/a.txt", "txt")]
+        task.cancel()
+        assert "".join(pieces) == "hello\n\nworld"
+        # The loop kept serving other tasks during the 0.3s download
+        assert ticks >= 10
+
+    asyncio.run(run())
+
+
+class _FakeUpload:
+    def __init__(self):
+        self.written = []
+        self.finished = False
+        self.aborted = None
+
+    async def write(self, data: bytes):
+        self.written.append(data)
+
+    async def finish(self):
+        self.finished = True
+
+    async def abort(self, error=None):
+        self.aborted = error
+
+
+class _NoOcr:
+    def __init__(self, session):
+        pass
+
+    async def list_resources(self, **kwargs):
+        return []
+
+
+def test_cancelled_processing_aborts_the_parsed_upload(monkeypatch):
+    upload = _FakeUpload()
+    started = asyncio.Event()
+
+    async def reindex_stream(collection_name, document_id, chunks):
+        async for _ in chunks:
+            started.set()
+            await asyncio.sleep(3600)
+
+    monkeypatch.setattr(document_service_module, "AiResourceService", _NoOcr)
+    monkeypatch.setattr(document_service_module.minio_service, "download_file", _slow_download("hello\n\nworld"))
+    monkeypatch.setattr(document_service_module.minio_service, "open_stream_upload", lambda *args, **kwargs: upload)
+    monkeypatch.setattr(document_service_module.ingestion_pipeline, "reindex_stream", reindex_stream)
+
+    async def run():
+        document = document_service_module.Document(
+            knowledge_base_id=uuid.uuid4(), filename="a.txt", file_path="kb/a.txt", file_type="txt")
+        task = asyncio.create_task(document_service.process_document(document, session=None))
+        await started.wait()
+        # As the job worker does when its claim is lost or it is stopped
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert upload.written and not upload.finished
+        assert isinstance(upload.aborted, asyncio.CancelledError)
+
+    asyncio.run(run())
@@ -0,0 +1,167 @@
+import threading
+import zlib
+from typing import List
+import numpy as np
+import pytest
+from app.services import embedded_vector_backend
+from app.services.embedded_vector_backend import EmbeddedVectorBackend
+from app.services.knowledge_search import build_filter_expr
+
+DIM = 32
+
+
+class HashEmbeddings:
+    """Deterministic unit vectors per text."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.random.default_rng(zlib.crc32(text.encode())).normal(size=DIM)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _vectors(rng: np.random.Generator, n: int) -> np.ndarray:
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _collection(tmp_path, n: int = 500, ann_threshold: int = 200):
+    backend = EmbeddedVectorBackend(HashEmbeddings(), str(tmp_path), ann_threshold=ann_threshold, nprobe=4)
+    collection = backend._get("kb_test", create=True)
+    rng = np.random.default_rng(0)
+    collection.insert(_vectors(rng, n), [f"t{i}" for i in range(n)], [{"chunk_id": f"c{i}"} for i in range(n)])
+    return backend, collection, rng
+
+
+def test_ann_search_ignores_rows_inserted_after_its_snapshot(tmp_path, monkeypatch):
+    _, collection, rng = _collection(tmp_path)
+    query = _vectors(rng, 1)[0]
+    assert collection.search(query, 5)
+    assert collection.index is not None
+
+    # Insert between the snapshot and the candidate scan, as a concurrent writer would
+    candidates = embedded_vector_backend._IVFIndex.candidates
+
+    def racing_candidates(index, *args):
+        collection.insert(_vectors(rng, 50), ["new"] * 50, [{"chunk_id": "new"}] * 50)
+        return candidates(index, *args)
+
+    monkeypatch.setattr(embedded_vector_backend._IVFIndex, "candidates", racing_candidates)
+    hits = collection.search(query, 5)
+    assert len(hits) == 5 and all(pk > 0 for pk, _ in hits)
+
+
+def test_concurrent_inserts_deletes_and_searches(tmp_path):
+    _, collection, rng = _collection(tmp_path)
+    queries = _vectors(rng, 20)
+    errors = []
+    stop = threading.Event()
+
+    def write():
+        writer_rng = np.random.default_rng(1)
+        try:
+            for _ in range(40):
+                pks = collection.insert(_vectors(writer_rng, 25), ["w"] * 25, [{"chunk_id": "w"}] * 25)
+                collection.delete(pks[:10])
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stop.set()
+
+    def search():
+        try:
+            while not stop.is_set():
+                for query in queries:
+                    for pk, _ in collection.search(query, 10):
+                        assert pk > 0
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=search) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert collection.count == 500 + 40 * 15
+
+
+def _backend_with_texts(tmp_path, ann_threshold: int = 20000):
+    backend = EmbeddedVectorBackend(HashEmbeddings(), str(tmp_path), ann_threshold=ann_threshold, nprobe=4)
+    texts = [f"chunk {i}" for i in range(300)]
+    metadatas = [{"source": f"{i % 3}.pdf", "document_id": f"d{i % 10}", "chunk_id": f"c{i}"} for i in range(300)]
+    backend.add_texts("kb_test", texts, metadatas)
+    return backend, texts, metadatas
+
+
+def _exact(texts, metadatas, query: str, keep, top_k: int, threshold=None):
+    """Brute-force reference: (text, score) over rows passing `keep`."""
+    embeddings = HashEmbeddings()
+    vector = np.asarray(embeddings.embed_query(query))
+    scored = [
+        (text, float(np.asarray(embeddings.embed_query(text)) @ vector))
+        for text, metadata in zip(texts, metadatas) if keep(metadata)
+    ]
+    scored = [(text, score) for text, score in scored if threshold is None or score >= threshold]
+    return sorted(scored, key=lambda hit: -hit[1])[:top_k]
+
+
+def _hits(results):
+    return [(doc.page_content, score) for doc, score in results]
+
+
+def test_filters_select_rows_before_ranking(tmp_path):
+    backend, texts, metadatas = _backend_with_texts(tmp_path)
+    expr = build_filter_expr({"source": "1.pdf", "document_id": ["d1", "d4", "d7"]})
+    results = backend.search("kb_test", "query", 10, expr=expr)
+
+    expected = _exact(texts, metadatas, "query",
+                      lambda m: m["source"] == "1.pdf" and m["document_id"] in ("d1", "d4", "d7"), 10)
+    assert [text for text, _ in _hits(results)] == [text for text, _ in expected]
+    assert [score for _, score in _hits(results)] == pytest.approx([score for _, score in expected], abs=1e-5)
+    # Raw expressions combine with metadata filters
+    results = backend.search("kb_test", "query", 50, expr=build_filter_expr({"source": "0.pdf"}, 'chunk_id == "c3"'))
+    assert [doc.metadata["chunk_id"] for doc, _ in results] == ["c3"]
+
+
+def test_score_threshold_is_applied_in_the_engine(tmp_path):
+    backend, texts, metadatas = _backend_with_texts(tmp_path)
+    results = backend.search("kb_test", "query", 300, score_threshold=0.2)
+    expected = _exact(texts, metadatas, "query", lambda m: True, 300, threshold=0.2)
+    assert 0 < len(results) < 300
+    assert [text for text, _ in _hits(results)] == [text for text, _ in expected]
+
+    filtered = backend.search("kb_test", "query", 300, expr='source == "2.pdf"', score_threshold=0.2)
+    assert [text for text, _ in _hits(filtered)] == [
+        text for text, _ in _exact(texts, metadatas, "query", lambda m: m["source"] == "2.pdf", 300, threshold=0.2)
+    ]
+    assert backend.search("kb_test", "query", 10, score_threshold=1.01) == []
+
+
+def test_ann_search_applies_threshold(tmp_path):
+    backend, _, _ = _backend_with_texts(tmp_path, ann_threshold=100)
+    results = backend.search("kb_test", "query", 50, score_threshold=0.1)
+    assert backend._get("kb_test").index is not None
+    assert results and all(score >= 0.1 for _, score in results)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_invalid_filters_are_rejected(tmp_path):
+    backend, _, _ = _backend_with_texts(tmp_path)
+    for expr in ['source.lower() == "a"', "__import__('os')", "source =="]:
+        with pytest.raises(ValueError):
+            backend.search("kb_test", "query", 5, expr=expr)
+    with pytest.raises(ValueError):
+        build_filter_expr({"source; drop": "x"})
+
+
+def test_operator_spellings_are_not_rewritten_inside_strings():
+    predicate = embedded_vector_backend.compile_expr('source == "R&&D AND IN" && chunk_id IN ["c1", "c||2"]')
+    assert predicate({"source": "R&&D AND IN", "chunk_id": "c||2"})
+    assert not predicate({"source": "R and D and in", "chunk_id": "c1"})
+    assert not predicate({"source": "R&&D AND IN", "chunk_id": "c or 2"})
+    either = embedded_vector_backend.compile_expr("source == 'NOT IN' || NOT chunk_id == 'c1'")
+    assert either({"source": "NOT IN", "chunk_id": "c1"})
+    assert either({"source": "x", "chunk_id": "c2"})
+    assert not either({"source": "not in", "chunk_id": "c1"})
@@ -0,0 +1,68 @@
+import threading
+from typing import List
+from app.services.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+
+def test_vectors_survive_restarts(tmp_path):
+    path = str(tmp_path / "cache" / "embeddings.db")
+    cache = CachedEmbeddings(CountingEmbeddings(), model_id="m", sqlite_path=path)
+    vectors = cache.embed_documents(["a", "bb", "a"])
+    assert vectors[0] == vectors[2] and cache.misses == 2
+
+    underlying = CountingEmbeddings()
+    reopened = CachedEmbeddings(underlying, model_id="m", sqlite_path=path)
+    assert reopened.embed_documents(["bb", "a"]) == [vectors[1], vectors[0]]
+    assert underlying.calls == 0 and reopened.disk_hits == 2
+
+
+def test_sqlite_io_runs_outside_the_lock(tmp_path, monkeypatch):
+    cache = CachedEmbeddings(CountingEmbeddings(), model_id="m", sqlite_path=str(tmp_path / "e.db"))
+    connect = cache._connect
+    held = []
+
+    def checked_connect():
+        held.append(cache._lock.locked())
+        return connect()
+
+    monkeypatch.setattr(cache, "_connect", checked_connect)
+    cache.embed_documents(["x", "y"])
+    cache.embed_query("z")
+    assert held and not any(held)
+
+
+def test_concurrent_threads_share_the_cache(tmp_path):
+    path = str(tmp_path / "e.db")
+    cache = CachedEmbeddings(CountingEmbeddings(), model_id="m", max_entries=50, sqlite_path=path)
+    texts = [f"text {i}" for i in range(200)]
+    errors = []
+
+    def work(offset):
+        try:
+            for i in range(0, 200, 10):
+                batch = texts[(i + offset) % 200:(i + offset) % 200 + 10]
+                assert cache.embed_documents(batch) == [cache.underlying.embed_query(t) for t in batch]
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(offset,)) for offset in (0, 50, 100, 150)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    # Everything reached disk, though the LRU only keeps 50
+    reopened = CachedEmbeddings(CountingEmbeddings(), model_id="m", sqlite_path=path)
+    reopened.embed_documents(texts)
+    assert reopened.disk_hits == 200 and reopened.misses == 0
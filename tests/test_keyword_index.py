@@ -0,0 +1,152 @@
+import math
+import random
+import threading
+from collections import Counter
+from typing import Dict, Tuple
+import pytest
+from app.services.keyword_index import KeywordIndex, tokenize
+
+WORDS = ["alpha", "beta", "gamma", "delta", "omega", "sigma", "ERR-4012", "v2.3.1", "知识库检索"]
+
+
+def _reference(docs: Dict[str, Tuple[str, str]], query: str) -> Dict[str, float]:
+    """Brute-force BM25 over the live chunks."""
+    counts = {chunk_id: Counter(tokenize(text)) for chunk_id, (text, _) in docs.items()}
+    avg_len = sum(sum(c.values()) for c in counts.values()) / len(counts) or 1.0
+    scores: Dict[str, float] = {}
+    for term in set(tokenize(query)):
+        matching = [chunk_id for chunk_id, c in counts.items() if term in c]
+        idf = math.log(1 + (len(counts) - len(matching) + 0.5) / (len(matching) + 0.5))
+        for chunk_id in matching:
+            tf = counts[chunk_id][term]
+            norm = KeywordIndex.k1 * (1 - KeywordIndex.b + KeywordIndex.b * sum(counts[chunk_id].values()) / avg_len)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (KeywordIndex.k1 + 1) / (tf + norm)
+    return scores
+
+
+def _assert_matches(index: KeywordIndex, docs: Dict[str, Tuple[str, str]]):
+    for query in ["alpha", "gamma omega", "err-4012", "4012", "v2.3.1", "检索", "missing"]:
+        hits = index.search(query, top_k=len(docs) + 1)
+        expected = _reference(docs, query)
+        assert dict(hits) == pytest.approx(expected, rel=1e-4)
+        assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def _random_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 30)))
+
+
+def test_tokenize_keeps_codes_whole_and_splits_cjk():
+    assert tokenize("See ERR-4012 in v2.3.1") == ["see", "err-4012", "err", "4012", "in", "v2.3.1", "v2", "3", "1"]
+    assert tokenize("知识库") == ["知识", "识库"]
+
+
+def test_add_remove_merge_and_reload_match_reference(tmp_path):
+    rng = random.Random(0)
+    directory = str(tmp_path / "kb")
+    index = KeywordIndex(directory, merge_threshold=500, snapshot_every=300)
+    docs: Dict[str, Tuple[str, str]] = {}
+
+    for round_ in range(8):
+        for document in range(round_ * 10, round_ * 10 + 10):
+            # Reindexing a document replaces its chunks
+            index.remove_document(f"d{document % 25}")
+            docs = {key: value for key, value in docs.items() if value[1] != f"d{document % 25}"}
+            for chunk in range(rng.randint(1, 8)):
+                chunk_id, text = f"d{document % 25}_{chunk}", _random_text(rng)
+                index.add(chunk_id, text, f"d{document % 25}")
+                docs[chunk_id] = (text, f"d{document % 25}")
+        index.flush()
+        _assert_matches(index, docs)
+
+    # Reload replays the log on top of the snapshot
+    assert (tmp_path / "kb" / "snapshot.npz").exists()
+    assert (tmp_path / "kb" / "log.jsonl").stat().st_size > 0
+    reloaded = KeywordIndex(directory, merge_threshold=500, snapshot_every=300)
+    _assert_matches(reloaded, docs)
+    assert reloaded.live_count == len(docs)
+
+
+def test_dead_chunks_are_dropped_on_merge(tmp_path):
+    rng = random.Random(1)
+    directory = str(tmp_path / "kb")
+    index = KeywordIndex(directory, merge_threshold=1, snapshot_every=10 ** 9)
+    docs: Dict[str, Tuple[str, str]] = {}
+    for document in range(300):
+        for chunk in range(5):
+            chunk_id, text = f"d{document}_{chunk}", _random_text(rng)
+            index.add(chunk_id, text, f"d{document}")
+            docs[chunk_id] = (text, f"d{document}")
+    index.flush()
+    for document in range(250):
+        index.remove_document(f"d{document}")
+        docs = {key: value for key, value in docs.items() if value[1] != f"d{document}"}
+    index.add("late", "alpha beta", "late")
+    docs["late"] = ("alpha beta", "late")
+    index.flush()
+
+    # 1250 dead slots outnumber the 251 live ones, so the merge renumbered slots
+    assert len(index.doc_keys) == len(docs)
+    _assert_matches(index, docs)
+    _assert_matches(KeywordIndex(directory), docs)
+
+
+def test_indexes_sharing_a_directory_see_each_others_flushes(tmp_path):
+    rng = random.Random(2)
+    directory = str(tmp_path / "kb")
+    # e.g. the API process and a standalone worker
+    writer = KeywordIndex(directory, snapshot_every=25)
+    reader = KeywordIndex(directory, snapshot_every=25)
+    docs: Dict[str, Tuple[str, str]] = {}
+
+    for document in range(12):
+        writer.remove_document(f"d{document}")
+        for chunk in range(3):
+            chunk_id, text = f"d{document}_{chunk}", _random_text(rng)
+            writer.add(chunk_id, text, f"d{document}")
+            docs[chunk_id] = (text, f"d{document}")
+        writer.flush()
+        # Appends are replayed as a tail; snapshots (every 25 ops) trigger a reload
+        _assert_matches(reader, docs)
+
+    # Unflushed local changes survive a reload caused by another process's snapshot
+    reader.add("local", "alpha gamma", "local")
+    for chunk in range(30):
+        writer.add(f"late_{chunk}", "omega sigma", "late")
+        docs[f"late_{chunk}"] = ("omega sigma", "late")
+    writer.flush()
+    docs["local"] = ("alpha gamma", "local")
+    _assert_matches(reader, docs)
+    reader.flush()
+    _assert_matches(writer, docs)
+    _assert_matches(KeywordIndex(directory), docs)
+
+
+def test_concurrent_writers_do_not_lose_ops(tmp_path):
+    directory = str(tmp_path / "kb")
+    indexes = [KeywordIndex(directory, snapshot_every=40) for _ in range(3)]
+    docs: Dict[str, Tuple[str, str]] = {}
+    errors = []
+
+    def write(worker: int):
+        rng = random.Random(worker)
+        try:
+            for document in range(30):
+                document_id = f"w{worker}_d{document}"
+                for chunk in range(3):
+                    text = _random_text(rng)
+                    indexes[worker].add(f"{document_id}_{chunk}", text, document_id)
+                    docs[f"{document_id}_{chunk}"] = (text, document_id)
+                indexes[worker].flush()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    for index in indexes + [KeywordIndex(directory)]:
+        _assert_matches(index, docs)
+        assert index.live_count == len(docs)
@@ -0,0 +1,57 @@
+import asyncio
+import numpy as np
+from app.services.llm_response_cache import LLMResponseCache
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_closest_scores_scope_with_one_matmul_and_matches_python():
+    cache = LLMResponseCache(semantic_max_entries=100)
+    rng = np.random.default_rng(0)
+    vectors = [unit(rng.normal(size=64)) for _ in range(50)]
+    for i, vector in enumerate(vectors):
+        cache.put_semantic("scope", vector, f"k{i}")
+    query = unit(vectors[17] + 0.01 * rng.normal(size=64))
+    key, score = cache.closest("scope", query)
+    expected = max(range(50), key=lambda i: float(np.dot(vectors[i], query)))
+    assert key == f"k{expected}" == "k17"
+    assert abs(score - float(np.dot(vectors[17], query))) < 1e-5
+    assert cache.closest("other", query) == (None, -1.0)
+
+
+def test_semantic_eviction_keeps_budget_and_drops_oldest():
+    cache = LLMResponseCache(semantic_max_entries=3)
+    for i in range(5):
+        cache.put_semantic("a", unit([1, i + 1]), f"k{i}")
+    assert cache.stats()["semantic_entries"] == 3
+    assert cache._semantic["a"][1] == ["k2", "k3", "k4"]
+    assert cache._semantic["a"][0].shape == (3, 2)
+
+
+def test_semantic_hit_returns_cached_value():
+    cache = LLMResponseCache()
+    vector = unit([1, 0, 0])
+
+    async def embed(text):
+        return vector
+    cache._embed = embed
+
+    async def run():
+        await cache.put("key", {"text": "hi"})
+        cache.put_semantic("scope", vector, "key")
+        return await cache.get_semantic("scope", "hello")
+
+    value, score, _ = asyncio.run(run())
+    assert value == {"text": "hi"} and score > 0.99
+
+
+def test_only_deterministic_calls_are_cacheable():
+    cache = LLMResponseCache()
+    assert cache.is_cacheable(0)
+    assert cache.is_cacheable("0.0")
+    assert not cache.is_cacheable(0.7)
+    assert not cache.is_cacheable(None)
+    assert LLMResponseCache(max_temperature=0.2).is_cacheable(0.1)
@@ -0,0 +1,69 @@
+import asyncio
+import sys
+import pytest
+from app.services.ocr_worker_pool import OCRWorkerError, OCRWorkerPool
+
+# Speaks the paddleocr_worker.py protocol; "slow" files take a while to OCR
+FAKE_WORKER = r'''
+import json, sys, time
+print(json.dumps({"status": "ready"}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["cmd"] == "ping":
+        response = {"status": "ok"}
+    else:
+        if "slow" in request["file_path"]:
+            time.sleep(2)
+        response = {"status": "success", "markdown": "# " + request["file_path"]}
+    print(json.dumps({**response, "id": request["id"]}), flush=True)
+'''
+
+
+def _pool(tmp_path, **kwargs) -> OCRWorkerPool:
+    script = tmp_path / "fake_worker.py"
+    script.write_text(FAKE_WORKER)
+    pool = OCRWorkerPool(**{"size": 2, "job_timeout": 10, "startup_timeout": 10, **kwargs})
+    pool._command = [sys.executable, "-u", str(script)]
+    return pool
+
+
+def test_cancelled_jobs_free_their_workers(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path, acquire_timeout=5)
+        try:
+            # Cancel more in-flight jobs than there are workers
+            for _ in range(pool.size + 1):
+                task = asyncio.ensure_future(pool.run("url", "slow.pdf"))
+                await asyncio.sleep(0.5)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+            assert pool.failures == pool.size + 1
+            assert len(pool._workers) == 0
+
+            # Fresh workers take the freed slots, and never see the stale replies
+            results = await asyncio.gather(*[pool.run("url", f"{i}.pdf") for i in range(4)])
+            assert results == [f"# {i}.pdf" for i in range(4)]
+            assert 1 <= len(pool._workers) <= pool.size
+        finally:
+            await pool.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_acquire_times_out_when_pool_is_busy(tmp_path):
+    async def scenario():
+        pool = _pool(tmp_path, size=1, acquire_timeout=0.5)
+        try:
+            busy = asyncio.ensure_future(pool.run("url", "slow.pdf"))
+            await asyncio.sleep(0.3)
+            with pytest.raises(OCRWorkerError):
+                await pool.run("url", "a.pdf")
+            assert await busy == "# slow.pdf"
+            # The timed-out waiter didn't swallow the worker
+            assert await pool.run("url", "a.pdf") == "# a.pdf"
+            assert pool.restarts == 0
+        finally:
+            await pool.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+import asyncio
+import sys
+import pypdf
+import pytest
+from app.core.config import settings
+from app.services import pdf_parallel
+from app.services.ocr_worker_pool import OCRWorkerError, OCRWorkerPool
+
+# Fails the second page range; the others take a moment so they are in flight
+FAKE_WORKER = r'''
+import json, sys, time
+print(json.dumps({"status": "ready"}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["cmd"] == "ping":
+        response = {"status": "ok"}
+    elif "pages_00010_" in request["file_path"]:
+        response = {"status": "error", "message": "bad range"}
+    else:
+        time.sleep(0.5)
+        response = {"status": "success", "markdown": request["file_path"]}
+    print(json.dumps({**response, "id": request["id"]}), flush=True)
+'''
+
+
+def _pdf(path, pages: int) -> str:
+    writer = pypdf.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_failed_ocr_range_does_not_shrink_the_pool(tmp_path, monkeypatch):
+    script = tmp_path / "fake_worker.py"
+    script.write_text(FAKE_WORKER)
+    pool = OCRWorkerPool(size=2, job_timeout=10, startup_timeout=10, acquire_timeout=5)
+    pool._command = [sys.executable, "-u", str(script)]
+    monkeypatch.setattr(pdf_parallel, "ocr_worker_pool", pool)
+    monkeypatch.setattr(settings, "OCR_PAGES_PER_TASK", 10)
+    path = _pdf(tmp_path / "doc.pdf", 60)
+
+    async def scenario():
+        try:
+            for _ in range(pool.size + 1):
+                with pytest.raises(OCRWorkerError):
+                    async for _ in pdf_parallel.iter_ocr_pdf(path, "url"):
+                        pass
+            # Ranges cancelled by the failure gave their slots back
+            assert len(pool._workers) <= pool.size
+            results = await asyncio.wait_for(
+                asyncio.gather(*[pool.run("url", f"{i}.pdf") for i in range(pool.size)]), timeout=10
+            )
+            assert results == [f"{i}.pdf" for i in range(pool.size)]
+        finally:
+            await pool.aclose()
+
+    asyncio.run(scenario())
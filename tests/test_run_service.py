@@ -0,0 +1,71 @@
+import asyncio
+from langchain_core.messages import AIMessage
+from app.core.database import async_session_factory, init_db
+from app.models.agent import Agent, AgentVersion
+from app.models.workflow import WorkflowRun
+from app.services import run_service as run_service_module
+from app.services.run_service import RunQueue, RunService
+
+
+class _CountingApp:
+    def __init__(self):
+        self.invocations = 0
+
+    async def ainvoke(self, state, config=None):
+        self.invocations += 1
+        await asyncio.sleep(0.05)
+        return {"messages": [AIMessage(content="done")], "node_outputs": {}, "trace_logs": []}
+
+
+async def _make_run(status: str = "pending") -> WorkflowRun:
+    await init_db()
+    async with async_session_factory() as session:
+        agent = Agent(name="runs")
+        session.add(agent)
+        await session.commit()
+        version = AgentVersion(agent_id=agent.id, version=1, flow_json={})
+        session.add(version)
+        await session.commit()
+        run = WorkflowRun(agent_version_id=version.id, status=status, inputs={"input": "hi"})
+        session.add(run)
+        await session.commit()
+        return run
+
+
+async def _status(run_id):
+    async with async_session_factory() as session:
+        return await session.get(WorkflowRun, run_id)
+
+
+def test_run_queued_twice_executes_once(monkeypatch):
+    app = _CountingApp()
+    monkeypatch.setattr(run_service_module.workflow_cache, "get_or_build", lambda *args: app)
+
+    async def scenario():
+        run = await _make_run()
+        # Two queues stand in for recovery racing a submit, or two processes
+        await asyncio.gather(RunQueue().execute(run.id), RunQueue().execute(run.id))
+        assert app.invocations == 1
+        stored = await _status(run.id)
+        assert stored.status == "completed" and stored.outputs["output"] == "done"
+
+    asyncio.run(scenario())
+
+
+def test_recover_fails_interrupted_runs_and_requeues_pending():
+    async def scenario():
+        running = await _make_run("running")
+        pending = await _make_run("pending")
+        queue = RunQueue(max_size=1000)
+        queue._queue = asyncio.Queue()
+        await queue._recover()
+
+        stored = await _status(running.id)
+        assert stored.status == "error" and stored.outputs == {"error": "Interrupted by server restart"}
+        queued = [queue._queue.get_nowait() for _ in range(queue._queue.qsize())]
+        assert pending.id in queued
+        async with async_session_factory() as session:
+            # A run that is no longer pending can't be claimed again
+            assert not await RunService(session).claim_run(running.id)
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from langchain_core.documents import Document as LangchainDocument
+from app.services.keyword_index import keyword_index_service
+from app.services.knowledge_search import search_knowledge
+from app.services.search_cache import SearchResultCache, search_cache
+from app.services.vector_service import vector_service
+
+
+def _results(*texts):
+    return [(LangchainDocument(page_content=text, metadata={"chunk_id": text}), 1.0) for text in texts]
+
+
+def test_writes_invalidate_by_generation():
+    cache = SearchResultCache(max_entries=10, ttl_seconds=0)
+    key = cache.make_key("kb_a", "error  code", top_k=5)
+    cache.put(key, _results("a"), 0.01)
+    # Whitespace and width variants share an entry
+    assert cache.get(cache.make_key("kb_a", "ｅｒｒｏｒ code", top_k=5))[0][0].page_content == "a"
+
+    cache.invalidate("kb_a")
+    assert cache.get(cache.make_key("kb_a", "error code", top_k=5)) is None
+    # A search that started before the write must not be stored under the new generation
+    cache.put(key, _results("stale"), 0.01)
+    assert cache.get(cache.make_key("kb_a", "error code", top_k=5)) is None
+    # Other collections are unaffected
+    other = cache.make_key("kb_b", "error code", top_k=5)
+    cache.put(other, _results("b"), 0.01)
+    cache.invalidate("kb_a")
+    assert cache.get(other) is not None
+
+
+def test_lru_ttl_and_copies():
+    cache = SearchResultCache(max_entries=2, ttl_seconds=0.05)
+    keys = [cache.make_key("kb", query) for query in ("q1", "q2", "q3")]
+    cache.put(keys[0], _results("1"), 0.01)
+    cache.put(keys[1], _results("2"), 0.01)
+    cache.get(keys[0])
+    cache.put(keys[2], _results("3"), 0.01)
+    assert cache.get(keys[1]) is None  # Least recently used
+    assert cache.stats()["evictions"] == 1
+
+    hit = cache.get(keys[0])
+    hit[0][0].metadata["collection"] = "kb"
+    assert "collection" not in cache.get(keys[0])[0][0].metadata
+
+    time.sleep(0.06)
+    assert cache.get(keys[0]) is None
+
+
+def test_knowledge_search_sees_every_write():
+    collection = "kb_search_cache_test"
+
+    async def texts(mode="vector"):
+        return sorted(doc.page_content for doc, _ in await search_knowledge(collection, "alpha", top_k=50, mode=mode))
+
+    async def scenario():
+        await vector_service.add_texts(collection, ["alpha one"], [{"document_id": "d1"}], ["c1"])
+        assert await texts() == ["alpha one"]
+        hits = search_cache.hits
+        assert await texts() == ["alpha one"]
+        assert search_cache.hits == hits + 1
+
+        await vector_service.add_texts(collection, ["alpha two"], [{"document_id": "d2"}], ["c2"])
+        assert await texts() == ["alpha one", "alpha two"]
+
+        await vector_service.delete_vectors(collection, 'document_id == "d1"')
+        assert await texts() == ["alpha two"]
+
+        # Keyword results change on index flushes
+        index = keyword_index_service.get(collection)
+        assert await texts("keyword") == []
+        index.add("c2", "alpha two", "d2")
+        await keyword_index_service.flush(collection)
+        assert await texts("keyword") == ["alpha two"]
+
+        await vector_service.delete_collection(collection)
+        assert await texts() == []
+
+    asyncio.run(scenario())
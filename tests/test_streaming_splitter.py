@@ -0,0 +1,71 @@
+import random
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.services.streaming_splitter import StreamingTextSplitter
+
+WINDOW = 4000
+
+
+def _splitter(chunk_overlap: int = 200) -> RecursiveCharacterTextSplitter:
+    # Same settings as document processing
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=chunk_overlap, length_function=len)
+
+
+def _stream(text: str, piece: int, chunk_overlap: int = 200):
+    streaming = StreamingTextSplitter(_splitter(chunk_overlap), window_chars=WINDOW)
+    chunks, peak = [], 0
+    for start in range(0, len(text), piece):
+        chunks.extend(streaming.feed(text[start:start + piece]))
+        peak = max(peak, len("".join(streaming._parts)))
+    return chunks + streaming.flush(), peak
+
+
+def _words(rng: random.Random, chars: int, line_breaks: float = 0.15) -> str:
+    words, size = [], 0
+    while size < chars:
+        word = "".join(rng.choice("abcdefgh") for _ in range(rng.randint(1, 12)))
+        words.append(word + ("\n" if rng.random() < line_breaks else " "))
+        size += len(word) + 1
+    return "".join(words).strip()
+
+
+def _document(rng: random.Random, max_paragraph: int) -> str:
+    return "\n\n".join(_words(rng, rng.randint(1, max_paragraph)) for _ in range(rng.randint(20, 80)))
+
+
+def test_matches_full_split_when_paragraphs_fit_the_window():
+    rng = random.Random(0)
+    for _ in range(30):
+        text = _document(rng, max_paragraph=WINDOW - 1000)
+        chunks, _ = _stream(text, piece=rng.randint(50, 5000))
+        assert chunks == _splitter().split_text(text)
+
+
+def test_carried_chunk_is_measured_with_its_separator():
+    # A full split counts the "\n\n" kept in front of the 398-char paragraph, so
+    # the 141-char one no longer fits in that chunk (400 + 458 + 143 > 1000)
+    def paragraph(chars):
+        return ("word " * chars)[:chars - 1] + "."
+
+    first = "\n\n".join([paragraph(990)] * 4 + [paragraph(398), paragraph(456)]) + "\n\n"
+    second = paragraph(141) + "\n\n" + paragraph(299)
+    streaming = StreamingTextSplitter(_splitter(), window_chars=WINDOW)
+    chunks = streaming.feed(first) + streaming.feed(second) + streaming.flush()
+    assert chunks == _splitter().split_text(first + second)
+
+
+def test_oversized_paragraphs_keep_all_content():
+    rng = random.Random(1)
+    for _ in range(20):
+        text = _document(rng, max_paragraph=5 * WINDOW)
+        chunks, _ = _stream(text, piece=rng.randint(50, 5000), chunk_overlap=0)
+        assert "".join("".join(chunks).split()) == "".join(text.split())
+        assert all(len(chunk) <= 1000 for chunk in chunks)
+
+
+def test_buffer_is_bounded_without_paragraph_breaks():
+    lines = "".join(f"line {i} with a few words\n" for i in range(50000))
+    piece = 4096
+    for text in ("Title\n\n" + lines, lines, "x" * len(lines)):
+        chunks, peak = _stream(text, piece=piece, chunk_overlap=0)
+        assert peak <= 2 * WINDOW + piece
+        assert "".join("".join(chunks).split()) == "".join(text.split())
@@ -0,0 +1,93 @@
+import asyncio
+from app.schemas.agent_schema import AgentGraph
+from app.services import nodes
+from app.services.run_service import build_initial_state, build_run_config
+from app.services.state import merge_node_outputs
+from app.services.workflow_engine import WorkflowBuilder
+
+
+def _graph(nodes_, edges) -> AgentGraph:
+    return AgentGraph(
+        nodes=[{"id": node_id, "type": node_type, "data": data} for node_id, node_type, data in nodes_],
+        edges=[{"id": f"e{i}", "source": source, "target": target, "condition": condition}
+               for i, (source, target, condition) in enumerate(edges)]
+    )
+
+
+def _run(graph: AgentGraph, query: str, stream: bool = False):
+    app = WorkflowBuilder(graph).build()
+    state = build_initial_state({"input": query})
+
+    async def invoke():
+        if stream:
+            return [snapshot async for snapshot in app.astream(state, config=build_run_config(), stream_mode="values")]
+        return await app.ainvoke(state, config=build_run_config())
+
+    return asyncio.run(invoke())
+
+
+def _counting_end(monkeypatch):
+    calls = []
+
+    async def end_node(state, config, node_id):
+        calls.append(sorted(state["node_outputs"]))
+        return {"current_node": node_id}
+
+    monkeypatch.setitem(nodes.NODE_REGISTRY, "end", end_node)
+    return calls
+
+
+def test_merge_node_outputs_does_not_mutate_previous_value():
+    left = {"a": 1}
+    merged = merge_node_outputs(left, {"b": 2})
+    assert merged == {"a": 1, "b": 2} and left == {"a": 1}
+    assert merge_node_outputs(None, {"a": 1}) == {"a": 1}
+    assert merge_node_outputs({"a": 1}, None) == {"a": 1}
+
+
+def test_fan_out_branches_join_once(monkeypatch):
+    calls = _counting_end(monkeypatch)
+    graph = _graph(
+        [("start", "start", {}),
+         ("left", "condition", {"condition": '"refund" in {{start.rawQuery}}'}),
+         ("right", "condition", {"condition": "len({{start.rawQuery}}) > 100"}),
+         ("join", "end", {})],
+        [("start", "left", None), ("start", "right", None), ("left", "join", None), ("right", "join", None)]
+    )
+    result = _run(graph, "I want a refund")
+    assert result["node_outputs"]["left"] == {"result": True}
+    assert result["node_outputs"]["right"] == {"result": False}
+    # The join waits for both branches and runs exactly once
+    assert calls == [["left", "right", "start"]]
+
+
+def test_conditional_edges_route_and_fall_back_to_default(monkeypatch):
+    calls = _counting_end(monkeypatch)
+    graph = _graph(
+        [("start", "start", {}),
+         ("refund", "condition", {"condition": "true"}),
+         ("other", "condition", {"condition": "true"}),
+         ("done", "end", {})],
+        [("start", "refund", '"refund" in {{start.rawQuery}}'),
+         ("start", "other", "default"),
+         ("refund", "done", None), ("other", "done", None)]
+    )
+    assert "refund" in _run(graph, "refund please")["node_outputs"]
+    routed = _run(graph, "hello")["node_outputs"]
+    assert "other" in routed and "refund" not in routed
+    # Conditionally reached joins fire per arriving branch
+    assert len(calls) == 2
+
+
+def test_streamed_states_are_not_rewritten_by_later_nodes():
+    graph = _graph(
+        [("start", "start", {}),
+         ("check", "condition", {"condition": "true"}),
+         ("done", "end", {})],
+        [("start", "check", None), ("check", "done", None)]
+    )
+    snapshots = _run(graph, "hi", stream=True)
+    outputs = [sorted(snapshot["node_outputs"]) for snapshot in snapshots]
+    assert outputs[0] == []
+    assert outputs[1] == ["start"]
+    assert outputs[-1] == ["check", "start"]